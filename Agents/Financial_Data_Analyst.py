@@ -1,6 +1,6 @@
 from agents import ModelSettings
 from agents import Agent
-from tools.custom_stock_retriever import get_stock_fundamentals,get_stock_financial_metrics,check_stock_risk_indicators
+from tools.custom_stock_retriever import get_stock_fundamentals,get_stock_fundamentals_batch,get_stock_financial_metrics,check_stock_risk_indicators
 
 prompt_INSTRUCTIONS=""" 
 **ROLE:** Chief Investment Risk Officer with Research Access
@@ -18,14 +18,19 @@ prompt_INSTRUCTIONS="""
    - Companies with established track records
    - Stocks that align with the client's risk profile
 
-3. **Targeted Research:** For EACH candidate, make ONE focused web search to check:
+3. **Batch Quantitative Check:** Call `get_stock_fundamentals_batch` ONCE with ALL candidate tickers 
+   comma-separated (e.g., 'AAPL,MSFT,NVDA,AVGO,AMD'). Do NOT call `get_stock_fundamentals` one ticker at a time.
+   Only use `get_stock_financial_metrics` or `check_stock_risk_indicators` for a candidate whose batch row is 
+   missing data or looks questionable.
+
+4. **Targeted Research:** For EACH candidate, make ONE focused web search to check:
    - Recent regulatory issues or litigation
    - Major news in the past 6 months
    - Corporate governance concerns
    
    Search query format: "[Company Name] litigation regulatory news 2025"
 
-4. **Risk Scoring:** Assign a qualitative risk score (1-10) where:
+5. **Risk Scoring:** Assign a qualitative risk score (1-10) where:
    - 1-3: Minimal known risks
    - 4-6: Moderate risks identified
    - 7-10: Significant risks or red flags
@@ -71,7 +76,8 @@ chief_risk_officer_agent=Agent(
     model_settings=ModelSettings(tool_choice="auto"), 
     
     output_type=str,
-    tools=[get_stock_fundamentals,
+    tools=[get_stock_fundamentals_batch,
+        get_stock_fundamentals,
         get_stock_financial_metrics,
         check_stock_risk_indicators], 
     )
\ No newline at end of file
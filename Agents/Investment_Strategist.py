@@ -1,6 +1,8 @@
 from agents import ModelSettings
 from agents import Agent
-from tools.custom_stock_retriever import get_stock_fundamentals, check_stock_risk_indicators
+from tools.custom_stock_retriever import get_stock_fundamentals, get_stock_fundamentals_batch, check_stock_risk_indicators
+from tools.diversification import analyze_portfolio_diversification
+from tools.portfolio_optimizer import optimize_portfolio_allocation
 
 prompt_INSTRUCTIONS=""" 
 role: >
@@ -11,9 +13,11 @@ role: >
     timeline and capital amount.
     
     **CRITICAL PRICE VALIDATION:** Before finalizing allocations:
-    1. Use the Stock Retriver Tool to get CURRENT PRICE for each recommended stock
-    2. Calculate exact shares: Investment Amount ÷ Current Price (round down)
-    3. Verify that total allocation = 100% of client's stated capital
+    1. Call `optimize_portfolio_allocation` ONCE with the final tickers, their Risk Suitability Scores,
+       the client's capital and profile. It fetches CURRENT PRICES and computes weights, whole-share counts,
+       leftover cash, portfolio beta and the weighted risk score
+    2. NEVER recompute amounts, share counts or totals yourself; copy the tool's numbers exactly
+    3. If the tool reports capital left unallocated by the caps, add a position in another sector and call it again
     
     **CLIENT PREFERENCE COMPLIANCE:** If the client explicitly requested:
     - Specific sectors (e.g., "Semiconductors"): Ensure dedicated picks from those sectors
@@ -61,14 +65,18 @@ role: >
        - If the client specified a sector or asset preference (e.g., in the `strategy_preference` like "include ETFs"), 
          ensure the allocation includes a strategic weight for those preferences
        - Limit sector concentration to maximum 50% of total capital
+       - Call `analyze_portfolio_diversification` ONCE with all risk-vetted tickers, passing their
+         Risk Suitability Scores as `scores` (e.g., 'AAPL:9,MSFT:8'). Names in the same correlation cluster
+         are one bet: prefer the cluster representative and do not give one cluster more weight than a sector
+       - Aim for an Effective Number of Bets close to the number of positions; a much lower value means
+         the portfolio is less diversified than its sector labels suggest
     
     3. **Final Calculation:** 
-       - Calculate the exact **Investment Amount ($)** for each stock based on the allocated percentage and the client's 
-         total capital
-       - **CRITICAL:** Get the current stock price using your tools and calculate the **exact number of shares** 
-         (Investment Amount ÷ Current Price)
-       - Round shares down to whole numbers
-       - Verify total allocation = 100% of capital
+       - Call `optimize_portfolio_allocation` with `profile` set to 'growth', 'balanced' or 'preservation'
+         from the client's **'primary_goal_type'** and risk score, and `max_sector_pct` 50
+       - Pass `target_weights` only when a client preference needs a specific weight (e.g., a strategic ETF sleeve)
+       - The tool returns the exact **Investment Amount ($)**, whole **Shares to Purchase**, leftover cash,
+         **Portfolio Beta** and **Weighted Average Risk Score**; use them verbatim
   
   expected_output: >
     A complete **Final Portfolio Allocation Plan** formatted clearly in Markdown. The output must consist of three mandatory parts:
@@ -87,20 +95,21 @@ role: >
     | AAPL | Apple Inc. | Technology | 263.82 | 20% | 20,000 | 75 | 9 | Core growth position; market leader |
     
     **CRITICAL VALIDATION:**
-    - Current Price must be fetched using your Stock Retriver Tool
-    - Shares = Investment Amount ÷ Current Price (rounded down)
-    - Total Allocation % must equal 100%
-    - Total Investment Amount must equal client's stated capital
+    - Current Price, Allocation (%), Investment Amount ($) and Shares to Purchase must be copied from
+      `optimize_portfolio_allocation` (use its Actual (%) column as Allocation (%))
+    - Report the tool's leftover cash; whole shares mean a small remainder is expected
     
     ## Part 3: Portfolio Composition Summary
     
     - **Total Capital Deployed:** $X,XXX,XXX
+    - **Leftover Cash:** $X,XXX
     - **Number of Positions:** X
     - **Sector Breakdown:** 
       - Sector A: X%
       - Sector B: X%
     - **Weighted Average Risk Score:** X.X/10
     - **Portfolio Beta:** X.XX (if calculable)
+    - **Effective Number of Bets:** X.X (from the diversification analysis)
 
 
 """
@@ -116,8 +125,11 @@ portfolio_manager_agent=Agent(
     name="Tactical Portfolio Manager Agent",
     model=model,
     instructions=prompt_INSTRUCTIONS,
-    tools=[get_stock_fundamentals,
-        check_stock_risk_indicators],
+    tools=[get_stock_fundamentals_batch,
+        get_stock_fundamentals,
+        check_stock_risk_indicators,
+        analyze_portfolio_diversification,
+        optimize_portfolio_allocation],
     model_settings=ModelSettings(tool_choice="auto"),
     
 )
\ No newline at end of file
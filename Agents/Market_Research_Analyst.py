@@ -71,4 +71,63 @@ financial_analyst=Agent(
     instructions=prompt_INSTRUCTIONS, 
     model_settings=ModelSettings(tool_choice="auto"),
     tools=[general_web_search], 
-    )
\ No newline at end of file
+    )
+
+# --- PER-SECTOR FAN-OUT ---
+# Used when the client names several sectors: one short run per sector at the same time,
+# then a cheap editor pass writes the alignment summary over the combined deep dives.
+
+sector_prompt_INSTRUCTIONS=""" 
+**Role:** You are a Senior Sector Research Analyst.
+**Goal:** Research ONE assigned equity sector for the client profile you are given and write its deep-dive entry.
+
+**Tools:** Use web search to gather for the assigned sector only:
+    - Year-to-Date (YTD) return
+    - Forward P/E ratio
+    - Beta relative to the S&P 500
+    - Major news, regulatory changes and macro trends from the past 180 days
+    - Analyst sentiment and outlook
+
+**EFFICIENCY RULES:**
+- Research ONLY the assigned sector; other sectors are handled by other analysts.
+- Make at most 4 targeted searches.
+
+**Expected Output Format:**
+Output ONLY the entry below, with no introduction or closing remarks:
+
+**[Sector Name]**
+- **YTD Return:** X%
+- **Forward P/E Ratio:** X.X
+- **Sector Beta:** X.X
+- **Recent Drivers:** [2-3 sentence summary of news/trends]
+- **6-Month Outlook:** [Detailed 3-4 sentence analysis including upside/downside scenarios]
+- **Sentiment:** BULLISH/BEARISH/NEUTRAL
+- **Risk Alignment:** [How this sector addresses client's risk profile]
+"""
+
+merge_prompt_INSTRUCTIONS=""" 
+**Role:** You are the editor of a Targeted Sector Research Brief.
+**Goal:** Given a client profile and the finished deep-dive entries for each sector, write the opening section of the brief.
+
+Output ONLY the section below, with no other text:
+
+## 1. Client-Sector Alignment Summary
+
+A concise paragraph (4-6 sentences) that:
+- Clearly states the chosen sectors
+- Explicitly justifies the selection based on the client's profile data
+- Provides the overall weighted market sentiment (BULLISH/BEARISH/NEUTRAL) across all selected sectors, 
+  based ONLY on the Sentiment ratings in the entries provided
+"""
+
+sector_research_agent=financial_analyst.clone(
+    name="Sector Research Analyst Agent",
+    instructions=sector_prompt_INSTRUCTIONS,
+    )
+
+research_merge_agent=Agent(
+    name="Market Research Editor Agent",
+    model="gpt-4o-mini",
+    instructions=merge_prompt_INSTRUCTIONS,
+    model_settings=ModelSettings(tool_choice="none"),
+    )
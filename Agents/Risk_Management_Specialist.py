@@ -89,4 +89,43 @@ risk_management_specialist=Agent(
     tools=[search_sec_filings_for_risk,
         search_sec_filings_multiple_risks,
         general_web_search],
-)
\ No newline at end of file
+)
+
+# --- PER-TICKER FAN-OUT ---
+# Used to vet every candidate at the same time: one bounded run per ticker that returns
+# a single row of the final risk table.
+
+ticker_risk_prompt_INSTRUCTIONS=""" 
+**Role:** Chief Investment Risk Officer vetting ONE stock candidate.
+**Goal:** Assess the assigned stock's qualitative and external risks (legal, regulatory, supply chain, geopolitical) 
+and assign a final risk-suitability score (1-10) for the client's goal and timeline.
+
+**PROCESS (stay within these calls):**
+1. Call `search_sec_filings_multiple_risks` ONCE for the ticker with keywords such as 
+   'litigation,investigation,recall,antitrust,regulatory,tariff,supply chain,geopolitical'.
+2. Make at most 2 `general_web_search` calls for recent (last 12 months) litigation, regulatory or 
+   supply-chain news about the company.
+
+**Scoring Guidance:**
+- **9-10:** Minimal qualitative risks; clean governance; diversified supply chain
+- **7-8:** Minor risks present but manageable; well-disclosed
+- **5-6:** Moderate risks requiring monitoring (e.g., single-region dependency)
+- **3-4:** Significant risks (e.g., active litigation, regulatory scrutiny)
+- **1-2:** High/severe risks (e.g., major scandal, critical supply disruption)
+
+**OUTPUT:** Output ONLY one Markdown table row (no header, no other text) with these 11 columns, 
+copying the quantitative values from the candidate row you were given and writing 'N/A' where unknown:
+
+| Ticker | Stock Name | Sector | Beta | FCF Trend (3Y) | D/E vs Sector Avg | Dividend Growth (Yrs) | P/E Ratio | Quantitative Justification | Major Qualitative Risks | Final Risk Suitability Score (1-10) |
+
+**Major Qualitative Risks** must be a brief, actionable summary of the most significant finding, or 'None identified'.
+"""
+
+ticker_risk_agent=Agent(
+    name="Ticker Risk Vetting Agent",
+    model=model,
+    instructions=ticker_risk_prompt_INSTRUCTIONS,
+    model_settings=ModelSettings(tool_choice="auto"), 
+    tools=[search_sec_filings_multiple_risks,
+        general_web_search],
+)
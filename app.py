@@ -1,31 +1,25 @@
 from dotenv import load_dotenv
-from agents import Runner, trace
+
+# Load environment variables first: pipeline and tool modules read their settings at import
+load_dotenv()
+
+import json
+import logging
 import os
-import asyncio
+import subprocess
+import sys
+import time
 import streamlit as st
-from Agents.client_recipt import Financial_Profiler_Agent
-from Agents.Market_Research_Analyst import financial_analyst
-from Agents.Financial_Data_Analyst import chief_risk_officer_agent
-from Agents.Risk_Management_Specialist import risk_management_specialist
-from Agents.Investment_Strategist import portfolio_manager_agent
-from Agents.Final_Report_Generator import final_report_agent
-import logging
-
-# Setup logging for verbose output
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
+from pipeline.jobs import QUEUED, SUCCEEDED, job_queue, replay_event
+from pipeline.logs import configure_logging
+from pipeline.stages import (
+    AGENT_STAGES, CLIENT_PROFILE, MARKET_RESEARCH, STOCK_CANDIDATES, RISK_ASSESSMENT,
+    PORTFOLIO_ALLOCATION, FINAL_REPORT, PipelineReporter,
 )
 
-# Enable agents SDK logging
-logging.getLogger("agents").setLevel(logging.DEBUG)
-logging.getLogger("openai").setLevel(logging.DEBUG)
-
-# Load environment variables
-load_dotenv()
+# Structured, queue-based logging; levels per module via LOG_LEVEL / LOG_LEVELS
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Set API keys
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
@@ -55,296 +49,227 @@ query = st.text_area(
 col1, col2 = st.columns([1, 5])
 with col1:
     start_button = st.button("🚀 Start Analysis", type="primary")
+with col2:
+    bypass_stage_cache = st.checkbox(
+        "Bypass stage cache (force fresh market research and stock selection)",
+        help="By default, recent results for an equivalent client profile are reused.",
+    )
+    trace_logging = st.checkbox(
+        "Trace requests for this run (verbose logging)",
+        help="Logs every OpenAI and HTTP request of this analysis at DEBUG level, tagged with its job ID.",
+    )
 
 st.markdown("---")
 
+# Streamed output is redrawn at most this often per stage; each redraw resends the whole placeholder
+STREAM_UI_INTERVAL_SECONDS = float(os.getenv("STREAM_UI_INTERVAL_SECONDS", "0.25"))
+MAX_TOOL_LOG_LINES = 8
+# Analyses run in worker processes (python -m pipeline.worker); the page polls the job's events
+JOB_UI_POLL_SECONDS = float(os.getenv("JOB_UI_POLL_SECONDS", "0.5"))
+JOB_AUTOSTART_WORKERS = os.getenv("JOB_AUTOSTART_WORKERS", "true").lower() in ("1", "true", "yes")
+
+class StreamlitReporter(PipelineReporter):
+    """
+    Renders each agent stage into its own expander. Containers are created up front because
+    independent stages may now finish out of order. While a stage runs, its streamed text and
+    tool calls are shown in placeholders that are replaced by the final output.
+    """
+
+    def __init__(self):
+        self.progress_bar = st.progress(0)
+        self.status_text = st.empty()
+        self.containers = {}
+        for stage in AGENT_STAGES:
+            title = STAGE_DISPLAY[stage][0]
+            self.containers[stage] = st.expander(title, expanded=(stage == FINAL_REPORT)).container()
+        self.completed = 0
+        self.tool_boxes = {}
+        self.stream_boxes = {}
+        self.streams = {}
+        self.tool_logs = {}
+        self.last_render = {}
+
+    def stage_started(self, stage):
+        _, status, info, _ = STAGE_DISPLAY[stage]
+        self.status_text.text(status)
+        container = self.containers[stage]
+        container.info(info)
+        self.tool_boxes[stage] = container.empty()
+        self.stream_boxes[stage] = container.empty()
+        self.streams[stage] = {}
+        self.tool_logs[stage] = []
+        self.last_render[stage] = 0.0
+
+    def _render_stream(self, stage, force=False):
+        now = time.monotonic()
+        if stage not in self.stream_boxes or (not force and now - self.last_render[stage] < STREAM_UI_INTERVAL_SECONDS):
+            return
+        self.last_render[stage] = now
+        tools = self.tool_logs[stage][-MAX_TOOL_LOG_LINES:]
+        if tools:
+            self.tool_boxes[stage].text("\n".join(tools))
+        parts = [f"**{label}**\n\n{text}" if label else text for label, text in self.streams[stage].items()]
+        if parts:
+            if stage == CLIENT_PROFILE:
+                self.stream_boxes[stage].code("".join(parts), language="json")
+            else:
+                self.stream_boxes[stage].markdown("\n\n".join(parts) + " ▌")
+
+    def flush_streams(self):
+        """
+        Draws any streamed text the throttle held back (called after each batch of replayed events).
+        """
+        for stage in list(self.stream_boxes):
+            self._render_stream(stage, force=True)
+
+    def stage_stream(self, stage, text, label=""):
+        if stage not in self.streams:
+            return
+        self.streams[stage][label] = self.streams[stage].get(label, "") + text
+        self._render_stream(stage)
+
+    def stage_tool_call(self, stage, description, label=""):
+        if stage not in self.tool_logs:
+            return
+        self.tool_logs[stage].append(f"[{label}] {description}" if label else description)
+        self.status_text.text(f"{STAGE_DISPLAY[stage][1]} {description}")
+        self._render_stream(stage)
+
+    def stage_reused(self, stage, age_seconds):
+        self.containers[stage].info(
+            f"♻️ Reused a result from {age_seconds / 60:.0f} min ago for an equivalent profile"
+        )
+
+    def stage_resumed(self, stage):
+        self.containers[stage].info("♻️ Resumed from the checkpoint of an earlier attempt")
+
+    def stage_completed(self, stage, output):
+        container = self.containers[stage]
+        if stage in self.stream_boxes:
+            # The streamed text gives way to the final output; the tool log stays
+            if self.tool_logs[stage]:
+                self.tool_boxes[stage].text("\n".join(self.tool_logs[stage][-MAX_TOOL_LOG_LINES:]))
+            self.stream_boxes.pop(stage).empty()
+        container.success(STAGE_DISPLAY[stage][3])
+
+        if stage == CLIENT_PROFILE:
+            # Replayed from the job queue as a dict
+            container.json(output if isinstance(output, dict) else str(output))
+        elif stage == STOCK_CANDIDATES and isinstance(output, list):
+            # Display as table if it's a list
+            import pandas as pd
+            df = pd.DataFrame([item.dict() if hasattr(item, 'dict') else item for item in output])
+            container.dataframe(df, use_container_width=True)
+        else:
+            container.markdown(output)
+
+        self.completed += 1
+        self.progress_bar.progress(int(100 * self.completed / len(AGENT_STAGES)))
+
+
+# Expander title, status line, in-progress note and completion message per stage
+STAGE_DISPLAY = {
+    CLIENT_PROFILE: ("📋 Step 1: Client Profile Extraction", "Step 1/6: Analyzing client profile...",
+                     "Extracting and validating investment parameters...", "✅ Client profile extracted successfully"),
+    MARKET_RESEARCH: ("🔍 Step 2: Market Research & Sector Analysis", "Step 2/6: Conducting market research...",
+                      "Analyzing market trends and sector performance...", "✅ Market research completed"),
+    STOCK_CANDIDATES: ("📈 Step 3: Stock Candidate Analysis", "Step 3/6: Analyzing stock candidates...",
+                       "Vetting stock candidates with quantitative metrics...", "✅ Stock candidate analysis completed"),
+    RISK_ASSESSMENT: ("⚠️ Step 4: Qualitative Risk Assessment", "Step 4/6: Conducting risk assessment...",
+                      "Evaluating regulatory, legal, and geopolitical risks...", "✅ Risk assessment completed"),
+    PORTFOLIO_ALLOCATION: ("💼 Step 5: Portfolio Allocation Strategy", "Step 5/6: Building portfolio allocation...",
+                           "Creating optimized portfolio allocation...", "✅ Portfolio allocation completed"),
+    FINAL_REPORT: ("📄 Step 6: Final Investment Report", "Step 6/6: Generating final investment report...",
+                   "Compiling comprehensive investment recommendation report...", "✅ Final report generated successfully"),
+}
+
+
+@st.cache_resource
+def start_local_workers():
+    """
+    Starts a worker pool beside the Streamlit server when no worker is running (once per server).
+    """
+    if not JOB_AUTOSTART_WORKERS or job_queue.live_workers() > 0:
+        return None
+    logger.info("No analysis workers running; starting a local pool (python -m pipeline.worker)")
+    return subprocess.Popen([sys.executable, "-m", "pipeline.worker"])
+
+
+def show_job(job_id):
+    """
+    Rebuilds the job's progress from its event log, then follows new events until it finishes.
+    Reruns and browser refreshes land here again, so the run itself is never interrupted.
+    Only the latest attempt is shown; when a retry starts, the page is redrawn for it.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        st.warning(f"⚠️ Analysis job {job_id} was not found.")
+        return
+
+    attempt = job.attempts
+    st.caption(f"🆔 Job `{job_id}`" + (f" · attempt {attempt}" if attempt > 1 else ""))
+    reporter = StreamlitReporter()
+    last_seq = 0
+    while True:
+        if job.attempts != attempt:
+            st.rerun()
+        finished = job.finished
+        for event in job_queue.events(job_id, last_seq, attempt=attempt):
+            replay_event(reporter, event)
+            last_seq = event.seq
+        reporter.flush_streams()
+        if finished:
+            break
+        if job.status == QUEUED:
+            waiting = "🔁 Retrying from the first incomplete stage" if attempt > 0 else "⏳ Queued"
+            reporter.status_text.text(
+                f"{waiting}: {job_queue.queue_position(job_id)} analyses ahead, "
+                f"{job_queue.live_workers()} workers online"
+            )
+        time.sleep(JOB_UI_POLL_SECONDS)
+        job = job_queue.get(job_id)
+
+    if job.status == SUCCEEDED:
+        result = job.result or {}
+        reporter.progress_bar.progress(100)
+        reporter.status_text.text("✅ Analysis Complete!")
+        st.caption(f"⏱️ Completed in {result.get('wall_time', 0.0):.1f}s · Critical path: {result.get('critical_path', '')}")
+        if result.get('token_report'):
+            with st.expander("🧮 Token Accounting"):
+                st.markdown(result['token_report'])
+        if result.get('timeline'):
+            with st.expander("⏱️ Run Timeline"):
+                # Slowest stage first: agent runs, turns, tokens and tool calls per stage
+                st.dataframe(result['timeline']['stages'], use_container_width=True)
+                st.download_button(
+                    "Download timeline (JSON)", json.dumps(result['timeline'], indent=2),
+                    file_name=f"timeline-{job_id}.json", mime="application/json",
+                )
+    else:
+        reporter.status_text.text("❌ Analysis failed")
+        st.error(f"❌ An error occurred: {job.error}")
+        if st.button(
+            "🔁 Resume Analysis", key=f"resume_{job_id}",
+            help="Completed stages are restored from checkpoints; only the failed stage and those after it run again.",
+        ):
+            job_queue.requeue(job_id)
+            st.rerun()
+
+
 if start_button and query:
-    async def main():
-        try:
-            with trace("investment_analysis_trace"):
-                
-                # Progress tracking
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # ============================================================
-                # STEP 1: Financial Profiler Agent
-                # ============================================================
-                status_text.text("Step 1/6: Analyzing client profile...")
-                progress_bar.progress(10)
-                
-                with st.expander("📋 Step 1: Client Profile Extraction", expanded=False):
-                    st.info("Extracting and validating investment parameters...")
-                    
-                    print(f"\n{'='*70}")
-                    print(f"STEP 1: FINANCIAL PROFILER AGENT")
-                    print(f"Query: {query}")
-                    print(f"{'='*70}\n")
-                    
-                    client_profile_result = await Runner.run(
-                        Financial_Profiler_Agent, 
-                        f"Client Investment Goal: {query}",
-                        max_turns=20
-                    )
-                    
-                    client_profile = client_profile_result.final_output
-                    
-                    print(f"\n{'='*70}")
-                    print(f"CLIENT PROFILE OUTPUT:")
-                    print(client_profile)
-                    print(f"{'='*70}\n")
-                    
-                    st.success("✅ Client profile extracted successfully")
-                    st.json(client_profile.dict() if hasattr(client_profile, 'dict') else str(client_profile))
-                
-                progress_bar.progress(20)
-                
-                # ============================================================
-                # STEP 2: Market Research Analyst Agent
-                # ============================================================
-                status_text.text("Step 2/6: Conducting market research...")
-                progress_bar.progress(30)
-                
-                with st.expander("🔍 Step 2: Market Research & Sector Analysis", expanded=False):
-                    st.info("Analyzing market trends and sector performance...")
-                    
-                    print(f"\n{'='*70}")
-                    print(f"STEP 2: MARKET RESEARCH ANALYST AGENT")
-                    print(f"{'='*70}\n")
-                    
-                    market_research_prompt = f"""
-                    Based on the following client profile, conduct comprehensive market research:
-                    
-                    {client_profile}
-                    
-                    Analyze the requested sectors and provide a detailed market research brief.
-                    """
-                    
-                    market_research_result = await Runner.run(
-                        financial_analyst, 
-                        market_research_prompt,
-                        max_turns=40
-                    )
-                    
-                    market_research = market_research_result.final_output
-                    
-                    print(f"\n{'='*70}")
-                    print(f"MARKET RESEARCH OUTPUT:")
-                    print(market_research[:500] + "..." if len(str(market_research)) > 500 else market_research)
-                    print(f"{'='*70}\n")
-                    
-                    st.success("✅ Market research completed")
-                    st.markdown(market_research)
-                
-                progress_bar.progress(40)
-                
-                # ============================================================
-                # STEP 3: Financial Data Analyst Agent
-                # ============================================================
-                status_text.text("Step 3/6: Analyzing stock candidates...")
-                progress_bar.progress(50)
-                
-                with st.expander("📈 Step 3: Stock Candidate Analysis", expanded=False):
-                    st.info("Vetting stock candidates with quantitative metrics...")
-                    
-                    print(f"\n{'='*70}")
-                    print(f"STEP 3: FINANCIAL DATA ANALYST AGENT")
-                    print(f"{'='*70}\n")
-                    
-                    stock_analysis_prompt = f"""
-                    Client Profile:
-                    {client_profile}
-                    
-                    Market Research Brief:
-                    {market_research}
-                    
-                    Based on the market research, select 5-7 stock candidates and perform quantitative analysis.
-                    """
-                    
-                    stock_analysis_result = await Runner.run(
-                        chief_risk_officer_agent, 
-                        stock_analysis_prompt,
-                        max_turns=100  # Increased for multiple stock lookups
-                    )
-                    
-                    stock_candidates = stock_analysis_result.final_output
-                    
-                    print(f"\n{'='*70}")
-                    print(f"STOCK CANDIDATES OUTPUT:")
-                    print(stock_candidates)
-                    print(f"{'='*70}\n")
-                    
-                    st.success("✅ Stock candidate analysis completed")
-                    
-                    # Display as table if it's a list
-                    if isinstance(stock_candidates, list):
-                        import pandas as pd
-                        df = pd.DataFrame([item.dict() if hasattr(item, 'dict') else item for item in stock_candidates])
-                        st.dataframe(df, use_container_width=True)
-                    else:
-                        st.markdown(stock_candidates)
-                
-                progress_bar.progress(60)
-                
-                # ============================================================
-                # STEP 4: Risk Management Specialist Agent
-                # ============================================================
-                status_text.text("Step 4/6: Conducting risk assessment...")
-                progress_bar.progress(70)
-                
-                with st.expander("⚠️ Step 4: Qualitative Risk Assessment", expanded=False):
-                    st.info("Evaluating regulatory, legal, and geopolitical risks...")
-                    
-                    print(f"\n{'='*70}")
-                    print(f"STEP 4: RISK MANAGEMENT SPECIALIST AGENT")
-                    print(f"{'='*70}\n")
-                    
-                    risk_assessment_prompt = f"""
-                    Client Profile:
-                    {client_profile}
-                    
-                    Stock Candidates:
-                    {stock_candidates}
-                    
-                    Perform comprehensive qualitative risk vetting on each stock candidate.
-                    Use SEC filings and web search to identify litigation, regulatory, and geopolitical risks.
-                    """
-                    
-                    risk_assessment_result = await Runner.run(
-                        risk_management_specialist, 
-                        risk_assessment_prompt,
-                        max_turns=100  # Increased for SEC filing searches per stock
-                    )
-                    
-                    risk_vetted_stocks = risk_assessment_result.final_output
-                    
-                    print(f"\n{'='*70}")
-                    print(f"RISK ASSESSMENT OUTPUT:")
-                    print(risk_vetted_stocks)
-                    print(f"{'='*70}\n")
-                    
-                    st.success("✅ Risk assessment completed")
-                    st.markdown(risk_vetted_stocks)
-                
-                progress_bar.progress(80)
-                
-                # ============================================================
-                # STEP 5: Investment Strategist Agent
-                # ============================================================
-                status_text.text("Step 5/6: Building portfolio allocation...")
-                progress_bar.progress(85)
-                
-                with st.expander("💼 Step 5: Portfolio Allocation Strategy", expanded=False):
-                    st.info("Creating optimized portfolio allocation...")
-                    
-                    print(f"\n{'='*70}")
-                    print(f"STEP 5: INVESTMENT STRATEGIST AGENT")
-                    print(f"{'='*70}\n")
-                    
-                    portfolio_allocation_prompt = f"""
-                    Client Profile:
-                    {client_profile}
-                    
-                    Market Research:
-                    {market_research}
-                    
-                    Risk-Vetted Stock Candidates:
-                    {risk_vetted_stocks}
-                    
-                    Create a final portfolio allocation plan with exact percentages, investment amounts, 
-                    and share calculations using current market prices.
-                    """
-                    
-                    portfolio_result = await Runner.run(
-                        portfolio_manager_agent, 
-                        portfolio_allocation_prompt,
-                        max_turns=60
-                    )
-                    
-                    portfolio_allocation = portfolio_result.final_output
-                    
-                    print(f"\n{'='*70}")
-                    print(f"PORTFOLIO ALLOCATION OUTPUT:")
-                    print(portfolio_allocation)
-                    print(f"{'='*70}\n")
-                    
-                    st.success("✅ Portfolio allocation completed")
-                    st.markdown(portfolio_allocation)
-                
-                progress_bar.progress(90)
-                
-                # ============================================================
-                # STEP 6: Final Report Generator Agent
-                # ============================================================
-                status_text.text("Step 6/6: Generating final investment report...")
-                progress_bar.progress(95)
-                
-                with st.expander("📄 Step 6: Final Investment Report", expanded=True):
-                    st.info("Compiling comprehensive investment recommendation report...")
-                    
-                    print(f"\n{'='*70}")
-                    print(f"STEP 6: FINAL REPORT GENERATOR AGENT")
-                    print(f"{'='*70}\n")
-                    
-                    final_report_prompt = f"""
-                    Compile a professional, client-ready investment report using:
-                    
-                    Client Profile:
-                    {client_profile}
-                    
-                    Market Research Brief:
-                    {market_research}
-                    
-                    Risk Assessment:
-                    {risk_vetted_stocks}
-                    
-                    Portfolio Allocation:
-                    {portfolio_allocation}
-                    
-                    Generate a complete, polished report following all formatting requirements.
-                    """
-                    
-                    final_report_result = await Runner.run(
-                        final_report_agent, 
-                        final_report_prompt,
-                        max_turns=30
-                    )
-                    
-                    final_report = final_report_result.final_output
-                    
-                    print(f"\n{'='*70}")
-                    print(f"FINAL REPORT GENERATED")
-                    print(f"{'='*70}\n")
-                    
-                    st.success("✅ Final report generated successfully")
-                    st.markdown(final_report)
-                
-                progress_bar.progress(100)
-                status_text.text("✅ Analysis Complete!")
-                
-                # ============================================================
-                # Download Report Option
-                # ============================================================
-                
-                
-                print(f"\n{'='*70}")
-                print(f"ANALYSIS PIPELINE COMPLETED SUCCESSFULLY")
-                print(f"{'='*70}\n")
-                
-        except Exception as e:
-            print(f"\n{'='*70}")
-            print(f"ERROR OCCURRED: {str(e)}")
-            print(f"{'='*70}\n")
-            st.error(f"❌ An error occurred: {str(e)}")
-            import traceback
-            st.code(traceback.format_exc())
-    
-    # Run the async pipeline
-    asyncio.run(main())
+    job_id = job_queue.submit(query, {'use_stage_cache': not bypass_stage_cache, 'trace_logging': trace_logging})
+    st.session_state['job_id'] = job_id
+    # In the URL too, so a refreshed or reopened page reattaches to the same run
+    st.query_params['job'] = job_id
 
 elif start_button and not query:
     st.warning("⚠️ Please enter your investment goal before starting the analysis.")
 
+active_job = st.session_state.get('job_id') or st.query_params.get('job')
+if active_job:
+    start_local_workers()
+    show_job(active_job)
+
 # Sidebar information
 with st.sidebar:
     st.header("ℹ️ How It Works")
@@ -0,0 +1,259 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Sequence
+import re
+from pipeline.markdown import TICKER_PATTERN, NON_TICKER_CELLS, parse_markdown_table
+
+# Stage outputs stay Markdown for display; these typed artifacts are what later stages read.
+# Each one serializes to a compact form that drops Markdown padding, alignment rows and the
+# narrative fields a consumer does not need.
+
+SECTOR_FIELD_LABELS = {
+    'ytd return': 'ytd_return',
+    'forward p/e ratio': 'forward_pe',
+    'forward p/e': 'forward_pe',
+    'sector beta': 'beta',
+    'beta': 'beta',
+    'recent drivers': 'drivers',
+    '6-month outlook': 'outlook',
+    'sentiment': 'sentiment',
+    'risk alignment': 'risk_alignment',
+}
+BRIEF_FIELD = re.compile(r"^\s*[-*]\s*\*\*(.+?):?\*\*:?\s*(.*)$")
+SECTOR_HEADING = re.compile(r"^\s*(?:#{3,4}\s*)?\*{0,2}\[?([^*\[\]#:]{2,60}?)\]?\*{0,2}\s*$")
+SECTION_HEADING = re.compile(r"^\s*#{1,2}\s")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _first_sentence(text: Optional[str]) -> str:
+    return SENTENCE_END.split((text or "").strip(), maxsplit=1)[0]
+
+
+def _header_key(cell: str) -> str:
+    return re.sub(r"\s*\([^)]*\)", "", cell.strip("*` ")).strip().lower()
+
+
+class SectorBrief(BaseModel):
+    sector: str
+    ytd_return: Optional[str] = None
+    forward_pe: Optional[str] = None
+    beta: Optional[str] = None
+    sentiment: Optional[str] = None
+    drivers: Optional[str] = None
+    outlook: Optional[str] = None
+    risk_alignment: Optional[str] = None
+
+
+class MarketBrief(BaseModel):
+    """
+    Step 2 output: the alignment summary plus one entry per researched sector.
+    """
+    summary: str = ""
+    sectors: List[SectorBrief] = Field(default_factory=list)
+    source: str = Field("", exclude=True)
+
+    def compact(self) -> str:
+        """
+        Summary and one line of metrics per sector, with the first sentence of its drivers and outlook.
+        Falls back to the full brief when the agent did not follow the expected format.
+        """
+        if not self.sectors:
+            return self.source
+        lines = [self.summary, "", "sector | ytd | fwd_pe | beta | sentiment | drivers | outlook"]
+        for brief in self.sectors:
+            lines.append(" | ".join((
+                brief.sector, brief.ytd_return or "", brief.forward_pe or "", brief.beta or "",
+                brief.sentiment or "", _first_sentence(brief.drivers), _first_sentence(brief.outlook),
+            )))
+        return "\n".join(lines).strip()
+
+
+def parse_market_brief(text: str) -> MarketBrief:
+    """
+    Reads the 'Client-Sector Alignment Summary + Sector Deep Dive' brief written by step 2.
+    """
+    summary_lines = []
+    sectors: List[SectorBrief] = []
+    in_deep_dive = False
+    for line in str(text or "").splitlines():
+        if SECTION_HEADING.match(line):
+            in_deep_dive = "deep dive" in line.lower()
+            continue
+        field = BRIEF_FIELD.match(line)
+        if field and sectors:
+            name = SECTOR_FIELD_LABELS.get(field.group(1).strip().lower())
+            if name:
+                setattr(sectors[-1], name, field.group(2).strip())
+            continue
+        heading = SECTOR_HEADING.match(line) if line.strip().startswith(("**", "###")) else None
+        if heading:
+            in_deep_dive = True
+            sectors.append(SectorBrief(sector=heading.group(1).strip()))
+        elif not in_deep_dive and line.strip():
+            summary_lines.append(line.strip())
+    return MarketBrief(summary=" ".join(summary_lines), sectors=sectors, source=str(text or ""))
+
+
+class CandidateRow(BaseModel):
+    """
+    One stock from the step 3 candidate table or its step 4 risk-vetted revision.
+    """
+    ticker: str
+    name: Optional[str] = None
+    sector: Optional[str] = None
+    beta: Optional[str] = None
+    fcf_trend: Optional[str] = None
+    de_vs_sector: Optional[str] = None
+    dividend_growth_years: Optional[str] = None
+    pe_ratio: Optional[str] = None
+    quantitative_justification: Optional[str] = None
+    qualitative_risks: Optional[str] = None
+    risk_summary: Optional[str] = None
+    alignment: Optional[str] = None
+    risk_score: Optional[str] = None
+    extra: Dict[str, str] = Field(default_factory=dict)
+
+
+class AllocationRow(BaseModel):
+    """
+    One position from the step 5 allocation table.
+    """
+    ticker: str
+    name: Optional[str] = None
+    sector: Optional[str] = None
+    price: Optional[str] = None
+    allocation_pct: Optional[str] = None
+    amount: Optional[str] = None
+    shares: Optional[str] = None
+    risk_score: Optional[str] = None
+    rationale: Optional[str] = None
+    extra: Dict[str, str] = Field(default_factory=dict)
+
+
+# Normalized table header (lowercase, parenthetical removed) -> row field
+TABLE_COLUMNS = {
+    'ticker': 'ticker',
+    'stock name': 'name',
+    'name': 'name',
+    'company': 'name',
+    'sector': 'sector',
+    'beta': 'beta',
+    'fcf trend': 'fcf_trend',
+    'd/e vs sector avg': 'de_vs_sector',
+    'dividend growth': 'dividend_growth_years',
+    'p/e ratio': 'pe_ratio',
+    'quantitative justification': 'quantitative_justification',
+    'major qualitative risks': 'qualitative_risks',
+    'risk summary': 'risk_summary',
+    'alignment justification': 'alignment',
+    'qualitative risk score': 'risk_score',
+    'final risk suitability score': 'risk_score',
+    'risk suitability score': 'risk_score',
+    'current price': 'price',
+    'allocation': 'allocation_pct',
+    'investment amount': 'amount',
+    'shares to purchase': 'shares',
+    'allocation rationale': 'rationale',
+}
+
+
+def _parse_rows(text: str, model):
+    header, rows = parse_markdown_table(text)
+    fields = [TABLE_COLUMNS.get(_header_key(cell)) for cell in header]
+    parsed = []
+    for row in rows:
+        values: Dict[str, str] = {}
+        extra: Dict[str, str] = {}
+        for cell_header, field, cell in zip(header, fields, row):
+            if field in model.model_fields:
+                values[field] = cell.strip()
+            elif cell.strip():
+                extra[_header_key(cell_header)] = cell.strip()
+        ticker = values.get('ticker', '').strip("*` ").upper()
+        if not TICKER_PATTERN.match(ticker) or ticker in NON_TICKER_CELLS:
+            continue
+        parsed.append(model(**{**values, 'ticker': ticker, 'extra': extra}))
+    return parsed
+
+
+def parse_candidate_rows(text: str) -> List[CandidateRow]:
+    return _parse_rows(text, CandidateRow)
+
+
+def _cell(row: BaseModel, field: str) -> str:
+    if field in type(row).model_fields and field != 'extra':
+        return str(getattr(row, field) or "")
+    return getattr(row, 'extra', {}).get(field, "")
+
+
+def compact_rows(rows: Sequence[BaseModel], fields: Optional[Sequence[str]] = None, fallback: str = "") -> str:
+    """
+    Serializes rows as a header of field names and one pipe-separated line per row, keeping only
+    the fields the consuming stage needs (every populated column when fields is None).
+    Returns `fallback` when there are no rows.
+    """
+    if not rows:
+        return fallback
+    if fields is None:
+        fields = []
+        for row in rows:
+            for field in [*type(row).model_fields, *getattr(row, 'extra', {})]:
+                if field not in fields and field != 'extra' and _cell(row, field):
+                    fields.append(field)
+    lines = [" | ".join(fields)]
+    for row in rows:
+        lines.append(" | ".join(_cell(row, field) for field in fields))
+    return "\n".join(lines)
+
+
+class AllocationPlan(BaseModel):
+    """
+    Step 5 output: strategy summary, allocation rows and the composition summary bullets.
+    """
+    summary: str = ""
+    rows: List[AllocationRow] = Field(default_factory=list)
+    composition: List[str] = Field(default_factory=list)
+    source: str = Field("", exclude=True)
+
+    def compact(self) -> str:
+        if not self.rows:
+            return self.source
+        table = compact_rows(self.rows, (
+            'ticker', 'name', 'sector', 'price', 'allocation_pct', 'amount', 'shares', 'risk_score', 'rationale',
+        ))
+        return "\n\n".join(part for part in (self.summary, table, "\n".join(self.composition)) if part)
+
+
+def parse_allocation_plan(text: str) -> AllocationPlan:
+    """
+    Reads the three-part Final Portfolio Allocation Plan written by step 5.
+    """
+    summary_lines = []
+    composition = []
+    part = 0
+    for line in str(text or "").splitlines():
+        stripped = line.strip()
+        if SECTION_HEADING.match(line):
+            match = re.search(r"part\s*(\d)", stripped.lower())
+            part = int(match.group(1)) if match else part
+            continue
+        if stripped.startswith("|") or not stripped:
+            continue
+        if part <= 1:
+            summary_lines.append(stripped)
+        elif part >= 3:
+            composition.append(line.rstrip())
+    return AllocationPlan(
+        summary=" ".join(summary_lines),
+        rows=_parse_rows(text, AllocationRow),
+        composition=composition,
+        source=str(text or ""),
+    )
+
+
+def compact_profile(client_profile) -> str:
+    """
+    The client profile as 'field: value' pairs, without the quoting of its repr or JSON.
+    """
+    if hasattr(client_profile, 'model_dump'):
+        return "; ".join(f"{field}: {value}" for field, value in client_profile.model_dump().items())
+    return str(client_profile)
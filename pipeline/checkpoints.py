@@ -0,0 +1,94 @@
+from contextlib import closing
+from typing import Any, Optional, Tuple
+import json
+import os
+import sqlite3
+import time
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./.cache/checkpoints.sqlite")
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() in ("1", "true", "yes")
+CHECKPOINT_RETENTION_SECONDS = float(os.getenv("CHECKPOINT_RETENTION_SECONDS", str(7 * 24 * 60 * 60)))
+
+
+def _jsonable(output: Any) -> Any:
+    return output.model_dump() if hasattr(output, 'model_dump') else output
+
+
+class CheckpointStore:
+    """
+    Completed stage outputs of each run, so a retried or resumed run starts at its first incomplete
+    stage instead of paying for the earlier agent stages again.
+
+    Unlike the stage cache, checkpoints are private to one run (keyed by run ID and stage name) and
+    never expire while the run can still be resumed.
+
+    Args:
+        path: SQLite database file.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "run_id TEXT, stage TEXT, value TEXT, created_at REAL, PRIMARY KEY (run_id, stage))"
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def get(self, run_id: str, stage: str) -> Optional[Tuple[Any, float]]:
+        """
+        Returns (output, age_seconds) of the stage's checkpoint for this run, or None.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT value, created_at FROM checkpoints WHERE run_id = ? AND stage = ?", (run_id, stage)
+            ).fetchone()
+        return (json.loads(row[0]), time.time() - row[1]) if row is not None else None
+
+    def put(self, run_id: str, stage: str, output: Any) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, stage, value, created_at) VALUES (?, ?, ?, ?)",
+                (run_id, stage, json.dumps(_jsonable(output)), time.time()),
+            )
+            connection.commit()
+
+    def completed_stages(self, run_id: str) -> list:
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT stage FROM checkpoints WHERE run_id = ? ORDER BY created_at", (run_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def clear(self, run_id: str) -> None:
+        """
+        Drops a run's checkpoints (once it has succeeded there is nothing left to resume).
+        """
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            connection.commit()
+
+    def prune(self, older_than: float = CHECKPOINT_RETENTION_SECONDS) -> int:
+        """
+        Deletes checkpoints of runs that were abandoned more than `older_than` seconds ago.
+        """
+        with closing(self._connect()) as connection:
+            removed = connection.execute(
+                "DELETE FROM checkpoints WHERE run_id IN "
+                "(SELECT run_id FROM checkpoints GROUP BY run_id HAVING MAX(created_at) < ?)",
+                (time.time() - older_than,),
+            ).rowcount
+            connection.commit()
+        return removed
+
+
+checkpoint_store = CheckpointStore()
@@ -0,0 +1,188 @@
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    """
+    One node of the analysis pipeline.
+
+    Attributes:
+        name: Unique stage name.
+        run: Coroutine function called with the declared inputs as keyword arguments.
+             It must return a dict containing every declared output.
+        inputs: Names of the values this stage needs before it can start.
+        outputs: Names of the values this stage produces.
+        critical: When False, a failure is recorded and its outputs are set to None instead of
+                  aborting the pipeline (used for best-effort prefetch stages).
+    """
+    name: str
+    run: Callable[..., Awaitable[Dict[str, Any]]]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    critical: bool = True
+
+
+@dataclass
+class StageTiming:
+    name: str
+    started: float
+    finished: float
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+@dataclass
+class DagResult:
+    values: Dict[str, Any]
+    timings: Dict[str, StageTiming]
+    critical_path: List[str]
+    wall_time: float
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def describe_critical_path(self) -> str:
+        """
+        Formats the critical path as 'stage (12.3s) -> stage (4.5s)' for logs and the UI.
+        """
+        return " -> ".join(
+            f"{name} ({self.timings[name].duration:.1f}s)" for name in self.critical_path
+        )
+
+
+class DagScheduler:
+    """
+    Runs pipeline stages as an asyncio dependency graph: each stage starts as soon as all of its
+    inputs exist, so independent stages overlap instead of running in declaration order.
+
+    Args:
+        stages: The pipeline's stages.
+        on_stage_finished: Called with each stage's StageTiming as soon as it finishes or fails.
+    """
+
+    def __init__(self, stages: List[Stage], on_stage_finished: Optional[Callable[[StageTiming], None]] = None):
+        self.on_stage_finished = on_stage_finished
+        self.stages = {}
+        self.producers = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.stages[stage.name] = stage
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"Output '{output}' is produced by both {self.producers[output]} and {stage.name}")
+                self.producers[output] = stage.name
+
+    async def _run_stage(self, stage: Stage, values: Dict[str, Any]) -> Dict[str, Any]:
+        outputs = await stage.run(**{name: values[name] for name in stage.inputs})
+        missing = [name for name in stage.outputs if name not in (outputs or {})]
+        if missing:
+            raise ValueError(f"Stage {stage.name} did not produce: {', '.join(missing)}")
+        return outputs
+
+    async def run(self, initial: Optional[Dict[str, Any]] = None) -> DagResult:
+        """
+        Executes every stage once.
+
+        Args:
+            initial: Values available before any stage runs (e.g., the client query).
+
+        Returns:
+            A DagResult with all produced values, per-stage timings and the critical path.
+
+        Raises:
+            The first exception raised by a critical stage; every other running stage is cancelled.
+        """
+        values = dict(initial or {})
+        pending = dict(self.stages)
+        running = {}
+        timings = {}
+        errors = {}
+        origin = time.monotonic()
+
+        def start_ready():
+            for name, stage in list(pending.items()):
+                if all(inp in values for inp in stage.inputs):
+                    del pending[name]
+                    task = asyncio.ensure_future(self._run_stage(stage, values))
+                    running[task] = (stage, time.monotonic() - origin)
+
+        def critical_work_left():
+            return any(stage.critical for stage in pending.values()) or any(
+                stage.critical for stage, _ in running.values()
+            )
+
+        start_ready()
+        try:
+            # Best-effort stages still running once every critical stage is done are cancelled
+            while running and critical_work_left():
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage, started = running.pop(task)
+                    finished = time.monotonic() - origin
+                    try:
+                        outputs = task.result()
+                    except Exception as e:
+                        timings[stage.name] = StageTiming(stage.name, started, finished, error=str(e))
+                        self._finished(timings[stage.name])
+                        if stage.critical:
+                            raise
+                        errors[stage.name] = str(e)
+                        outputs = {name: None for name in stage.outputs}
+                    else:
+                        timings[stage.name] = StageTiming(stage.name, started, finished)
+                        self._finished(timings[stage.name])
+                    values.update(outputs)
+                start_ready()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        if any(stage.critical for stage in pending.values()):
+            raise ValueError(f"Stages with unsatisfiable inputs: {', '.join(sorted(pending))}")
+
+        return DagResult(
+            values=values,
+            timings=timings,
+            critical_path=self._critical_path(timings),
+            wall_time=time.monotonic() - origin,
+            errors=errors,
+        )
+
+    def _finished(self, timing: StageTiming) -> None:
+        if self.on_stage_finished is None:
+            return
+        try:
+            self.on_stage_finished(timing)
+        except Exception as e:
+            logger.warning(f"Stage callback failed for {timing.name}: {e}")
+
+    def _critical_path(self, timings: Dict[str, StageTiming]) -> List[str]:
+        """
+        Walks back from the last critical stage to finish, following whichever input arrived last.
+        """
+        finished = [t for t in timings.values() if self.stages[t.name].critical] or list(timings.values())
+        if not finished:
+            return []
+        current = max(finished, key=lambda t: t.finished).name
+        path = [current]
+        while True:
+            parents = {
+                self.producers[inp]
+                for inp in self.stages[current].inputs
+                if inp in self.producers and self.producers[inp] in timings
+            }
+            if not parents:
+                break
+            current = max(parents, key=lambda name: timings[name].finished)
+            path.append(current)
+        return list(reversed(path))
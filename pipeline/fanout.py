@@ -0,0 +1,255 @@
+from agents import Runner
+from typing import Any, Awaitable, Callable, List, Optional
+import asyncio
+import logging
+import os
+import re
+from Agents.Market_Research_Analyst import sector_research_agent, research_merge_agent
+from Agents.Risk_Management_Specialist import ticker_risk_agent
+from pipeline.markdown import parse_markdown_table
+from pipeline.profile import is_sector_phrase
+from pipeline.token_accounting import TokenLedger
+
+logger = logging.getLogger(__name__)
+
+MARKET_RESEARCH_FANOUT = os.getenv("MARKET_RESEARCH_FANOUT", "true").lower() in ("1", "true", "yes")
+MARKET_RESEARCH_CONCURRENCY = int(os.getenv("MARKET_RESEARCH_CONCURRENCY", "3"))
+MAX_FANOUT_SECTORS = 6
+SECTOR_MAX_TURNS = 15
+
+RISK_VETTING_FANOUT = os.getenv("RISK_VETTING_FANOUT", "true").lower() in ("1", "true", "yes")
+RISK_VETTING_CONCURRENCY = int(os.getenv("RISK_VETTING_CONCURRENCY", "4"))
+RISK_VETTING_MAX_TURNS = int(os.getenv("RISK_VETTING_MAX_TURNS", "12"))
+MAX_FANOUT_TICKERS = 10
+
+RISK_TABLE_COLUMNS = (
+    "Ticker", "Stock Name", "Sector", "Beta", "FCF Trend (3Y)", "D/E vs Sector Avg", "Dividend Growth (Yrs)",
+    "P/E Ratio", "Quantitative Justification", "Major Qualitative Risks", "Final Risk Suitability Score (1-10)",
+)
+RISK_TABLE_ALIGNMENT = "| :--- | :--- | :--- | :---: | :---: | :---: | :---: | :---: | :--- | :--- | :---: |"
+
+# Runs one sub-agent: (agent, prompt, max_turns, label) -> run result. The label names the sector or
+# ticker so a streaming UI can tell concurrent sub-runs apart.
+AgentRunner = Callable[[Any, str, int, str], Awaitable[Any]]
+
+
+async def _run_agent(agent, prompt: str, max_turns: int, label: str):
+    return await Runner.run(agent, prompt, max_turns=max_turns)
+
+
+SECTOR_SEPARATORS = re.compile(r"\s*(?:,|;|\n)\s*")
+SECTOR_CONJUNCTION = re.compile(r"\s+and\s+", re.IGNORECASE)
+LEADING_CONJUNCTION = re.compile(r"^(?:and|&)\s+", re.IGNORECASE)
+
+
+def _split_conjunction(part: str) -> List[str]:
+    """
+    'AI and Semiconductors' names two sectors but 'Oil and Gas' or 'Aerospace and Defense' only one,
+    so a part is split on 'and' only when every piece is itself a known sector.
+    """
+    if is_sector_phrase(part):
+        return [part]
+    pieces = [piece.strip(" .-*") for piece in SECTOR_CONJUNCTION.split(part)]
+    if len(pieces) > 1 and all(is_sector_phrase(piece) for piece in pieces):
+        return pieces
+    return [part]
+
+
+def split_sectors(sector_preferences: str) -> List[str]:
+    """
+    Splits the profiler's free-text sector list ('Technology, AI and Semiconductors') into sectors.
+    '&' is kept because it is part of sector names such as 'Oil & Gas'.
+    """
+    sectors = []
+    seen = set()
+    for part in SECTOR_SEPARATORS.split(str(sector_preferences or "")):
+        for sector in _split_conjunction(LEADING_CONJUNCTION.sub("", part.strip(" .-*"))):
+            if sector and sector.lower() not in seen:
+                seen.add(sector.lower())
+                sectors.append(sector)
+    return sectors
+
+
+def fanout_sectors(client_profile: Any) -> List[str]:
+    """
+    Returns the sectors to research in parallel, or an empty list when the single-agent run should be used.
+    """
+    if not MARKET_RESEARCH_FANOUT:
+        return []
+    sectors = split_sectors(getattr(client_profile, 'sector_preferences', ''))
+    if len(sectors) < 2 or len(sectors) > MAX_FANOUT_SECTORS:
+        return []
+    return sectors
+
+
+def _handoff(ledger: Optional[TokenLedger], stage: str, template: str, client_profile: Any,
+             full_profile: Any, **fields) -> str:
+    """
+    Renders a sub-run prompt and records its size next to the size it would have with the full profile.
+    """
+    prompt = template.format(client_profile=client_profile, **fields)
+    if ledger is not None:
+        full_prompt = template.format(
+            client_profile=full_profile if full_profile is not None else client_profile, **fields,
+        )
+        ledger.record_handoff(stage, full_prompt, prompt)
+    return prompt
+
+
+def _record_usage(ledger: Optional[TokenLedger], stage: str, result) -> None:
+    if ledger is not None:
+        ledger.record_usage(stage, result)
+
+
+async def run_sector_fanout(client_profile: Any, sectors: List[str], run_agent: Optional[AgentRunner] = None,
+                            ledger: Optional[TokenLedger] = None, stage: str = "",
+                            full_profile: Any = None) -> str:
+    """
+    Researches each sector in its own bounded agent run, at most MARKET_RESEARCH_CONCURRENCY at a time,
+    and merges the results into the 'Client-Sector Alignment Summary + Sector Deep Dive' brief format.
+
+    Args:
+        client_profile: Profile text sent to every sub-run (the compact form when compact hand-off is on).
+        sectors: Sectors to research.
+        run_agent: Runs one agent; defaults to Runner.run.
+        ledger: Records each sub-run's and the merge run's prompt size and usage under `stage`.
+        stage: Pipeline stage the sub-runs belong to.
+        full_profile: The uncompacted profile, to measure what the compact hand-off saved.
+    """
+    run_agent = run_agent or _run_agent
+    semaphore = asyncio.Semaphore(MARKET_RESEARCH_CONCURRENCY)
+
+    async def research(sector):
+        async with semaphore:
+            logger.info("Researching sector: %s", sector)
+            prompt = _handoff(
+                ledger, stage,
+                """
+                Client Profile:
+                {client_profile}
+
+                Assigned Sector: {sector}
+
+                Research this sector only and write its deep-dive entry.
+                """,
+                client_profile, full_profile, sector=sector,
+            )
+            result = await run_agent(sector_research_agent, prompt, SECTOR_MAX_TURNS, sector)
+            _record_usage(ledger, stage, result)
+            return str(result.final_output).strip()
+
+    results = await asyncio.gather(*(research(sector) for sector in sectors), return_exceptions=True)
+
+    entries = []
+    for sector, result in zip(sectors, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Sector research failed for {sector}: {result}")
+            entries.append(f"**{sector}**\n- Research unavailable for this sector in this run.")
+        else:
+            entries.append(result)
+    if all(isinstance(result, Exception) for result in results):
+        raise results[0]
+
+    deep_dive = "\n\n".join(entries)
+    merge_prompt = _handoff(
+        ledger, stage,
+        """
+        Client Profile:
+        {client_profile}
+
+        Sector Deep-Dive Entries:
+        {deep_dive}
+        """,
+        client_profile, full_profile, deep_dive=deep_dive,
+    )
+    merge_result = await run_agent(research_merge_agent, merge_prompt, 3, "Alignment Summary")
+    _record_usage(ledger, stage, merge_result)
+    summary = str(merge_result.final_output).strip()
+    if not summary.lstrip("# ").startswith("1."):
+        summary = f"## 1. Client-Sector Alignment Summary\n\n{summary}"
+
+    return f"{summary}\n\n## 2. Sector Deep Dive\n\n{deep_dive}"
+
+
+def _candidate_row(stock_candidates: str, ticker: str) -> str:
+    """
+    Returns the step-3 table header plus the row for one ticker, so each sub-agent sees only its own candidate.
+    """
+    header, rows = parse_markdown_table(stock_candidates)
+    for row in rows:
+        if row and row[0].strip("*` ").upper() == ticker:
+            return f"| {' | '.join(header)} |\n| {' | '.join(row)} |"
+    return f"Ticker: {ticker}"
+
+
+def _risk_row(output: str, ticker: str) -> Optional[str]:
+    """
+    Picks the table row for `ticker` out of a sub-agent's reply.
+    """
+    for line in str(output).splitlines():
+        cells = [cell.strip() for cell in line.strip().strip("|").split("|")]
+        if line.strip().startswith("|") and cells and cells[0].strip("*` ").upper() == ticker:
+            return line.strip()
+    return None
+
+
+def _unvetted_row(ticker: str, reason: str) -> str:
+    cells = [ticker] + ["N/A"] * (len(RISK_TABLE_COLUMNS) - 3) + [f"Risk vetting incomplete ({reason})", "N/A"]
+    return f"| {' | '.join(cells)} |"
+
+
+async def run_risk_fanout(client_profile: Any, stock_candidates: str, tickers: List[str],
+                          run_agent: Optional[AgentRunner] = None, ledger: Optional[TokenLedger] = None,
+                          stage: str = "", full_profile: Any = None) -> str:
+    """
+    Vets each candidate in its own bounded agent run, at most RISK_VETTING_CONCURRENCY at a time,
+    and reassembles the rows into the risk table the Investment Strategist expects.
+    `ledger`, `stage` and `full_profile` are as for run_sector_fanout.
+    """
+    run_agent = run_agent or _run_agent
+    semaphore = asyncio.Semaphore(RISK_VETTING_CONCURRENCY)
+
+    async def vet(ticker):
+        async with semaphore:
+            logger.info("Vetting risk for: %s", ticker)
+            prompt = _handoff(
+                ledger, stage,
+                """
+                Client Profile:
+                {client_profile}
+
+                Assigned Stock Candidate:
+                {candidate}
+
+                Vet this stock only and output its single table row.
+                """,
+                client_profile, full_profile, candidate=_candidate_row(stock_candidates, ticker),
+            )
+            result = await run_agent(ticker_risk_agent, prompt, RISK_VETTING_MAX_TURNS, ticker)
+            _record_usage(ledger, stage, result)
+            return result.final_output
+
+    results = await asyncio.gather(*(vet(ticker) for ticker in tickers), return_exceptions=True)
+    if all(isinstance(result, Exception) for result in results):
+        raise results[0]
+
+    rows = []
+    for ticker, result in zip(tickers, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Risk vetting failed for {ticker}: {result}")
+            rows.append(_unvetted_row(ticker, "agent error"))
+            continue
+        row = _risk_row(result, ticker)
+        rows.append(row if row is not None else _unvetted_row(ticker, "no table row returned"))
+
+    header = f"| {' | '.join(RISK_TABLE_COLUMNS)} |"
+    return "\n".join([header, RISK_TABLE_ALIGNMENT, *rows])
+
+
+def fanout_tickers(candidate_tickers: List[str]) -> List[str]:
+    """
+    Returns the tickers to vet in parallel, or an empty list when the single-agent run should be used.
+    """
+    if not RISK_VETTING_FANOUT or len(candidate_tickers or []) > MAX_FANOUT_TICKERS:
+        return []
+    return list(candidate_tickers or [])
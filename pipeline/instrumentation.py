@@ -0,0 +1,348 @@
+from agents import RunHooks
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Each worker process serves /metrics on METRICS_PORT + its index; 0 disables the endpoint
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Directory for one JSON timeline file per run (empty: timelines are only kept in the job result)
+TIMELINE_DIR = os.getenv("TIMELINE_DIR", "")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TURN_BUCKETS = (1, 2, 3, 5, 10, 20, 40, 60, 100)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+# Tool results starting with one of these are failed calls: the repo's tools return "ERROR: ..." strings,
+# and the SDK turns a raised exception into "An error occurred while running the tool..."
+TOOL_ERROR_PREFIXES = ("ERROR", "An error occurred")
+
+METRICS = {
+    'pipeline_stage_seconds': ('histogram', "Wall time of each pipeline stage", LATENCY_BUCKETS),
+    'agent_run_seconds': ('histogram', "Wall time of each Runner.run", LATENCY_BUCKETS),
+    'agent_runs_total': ('counter', "Agent runs by outcome", None),
+    'agent_tokens_total': ('counter', "Model tokens used by agent runs", None),
+    'agent_turns': ('histogram', "Model turns used per agent run", TURN_BUCKETS),
+    'agent_turn_budget_ratio': ('histogram', "Turns used as a fraction of max_turns", RATIO_BUCKETS),
+    'tool_calls_total': ('counter', "Function tool calls by outcome", None),
+    'tool_call_seconds': ('histogram', "Function tool call latency", LATENCY_BUCKETS),
+    'stage_cache_lookups_total': ('counter', "Stage cache lookups by outcome", None),
+    'checkpoint_restores_total': ('counter', "Stages restored from a run checkpoint", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, str, str, Dict[str, Any], float]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms rendered in the Prometheus text exposition format.
+
+    Collectors are called at scrape time for values other modules already keep (cache and
+    request coalescing statistics), so those modules need no metrics code of their own.
+    """
+
+    def __init__(self, metrics: Dict[str, tuple] = METRICS):
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], list] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def inc(self, name: str, labels: Dict[str, Any], value: float = 1.0) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: Dict[str, Any], value: float) -> None:
+        buckets = self.metrics[name][2]
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Adds a callable returning (name, type, help, labels, value) samples at each scrape.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: [list(value[0]), value[1], value[2]] for key, value in self._histograms.items()}
+
+        for name, (kind, description, buckets) in self.metrics.items():
+            if kind == 'counter':
+                samples = [(labels, value) for (metric, labels), value in counters.items() if metric == name]
+            else:
+                samples = [(labels, value) for (metric, labels), value in histograms.items() if metric == name]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(samples):
+                if kind == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}' if bound != '+Inf' else bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        described = set()
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, description, labels, value in samples:
+                if name not in described:
+                    lines.append(f"# HELP {name} {description}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(_labels(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _tool_cache_samples() -> Iterable[Sample]:
+    """
+    Cache and request coalescing counters kept by the tool modules.
+    """
+    from tools.market_data_cache import ticker_info_cache
+    from tools.search_cache import search_cache
+    from tools.single_flight import single_flight
+
+    for source, counters in single_flight.stats().items():
+        for outcome in ('executed', 'coalesced', 'errors'):
+            yield ('external_requests_total', 'counter', "yfinance, Alpha Vantage and SEC requests by outcome",
+                   {'source': source, 'outcome': outcome}, counters.get(outcome, 0))
+    info = ticker_info_cache.stats()
+    search = search_cache.stats()
+    for cache, stats in (('ticker_info', info), ('web_search', search)):
+        for outcome in ('hits', 'misses'):
+            yield ('tool_cache_lookups_total', 'counter', "Tool-level cache lookups by outcome",
+                   {'cache': cache, 'outcome': outcome}, stats[outcome])
+
+
+metrics = MetricsRegistry()
+metrics.register_collector(_tool_cache_samples)
+
+
+class RunTimeline:
+    """
+    Spans of one pipeline run (stages, agent runs and tool calls) with offsets from the run start,
+    exported as JSON so a slow run can be broken down after the fact.
+
+    Args:
+        run_id: ID of the run (the job ID).
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.origin = time.monotonic()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def offset(self) -> float:
+        return time.monotonic() - self.origin
+
+    def add(self, kind: str, name: str, start: float, end: float, **attributes) -> None:
+        span = {'kind': kind, 'name': name, 'start': round(start, 3), 'duration': round(end - start, 3), **attributes}
+        with self._lock:
+            self.spans.append(span)
+
+    def record_stage(self, timing) -> None:
+        """
+        DagScheduler callback: records a finished stage (a dag.StageTiming) as a span and a metric.
+        Both clocks start together, so the stage offsets line up with the other spans.
+        """
+        status = "error" if timing.error else "ok"
+        self.add('stage', timing.name, timing.started, timing.finished, status=status, error=timing.error)
+        metrics.observe('pipeline_stage_seconds', {'stage': timing.name, 'status': status}, timing.duration)
+
+    def stage_summary(self) -> List[Dict[str, Any]]:
+        """
+        One row per stage: duration, agent runs, turns, tokens, tool calls and failed tool calls.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        rows = {}
+        for span in spans:
+            if span['kind'] == 'stage':
+                rows.setdefault(span['name'], {'stage': span['name']})['seconds'] = span['duration']
+        for span in spans:
+            if span['kind'] == 'stage' or span.get('stage') not in rows:
+                continue
+            row = rows[span['stage']]
+            if span['kind'] == 'agent':
+                row['agent_runs'] = row.get('agent_runs', 0) + 1
+                row['turns'] = row.get('turns', 0) + span.get('turns', 0)
+                row['input_tokens'] = row.get('input_tokens', 0) + span.get('input_tokens', 0)
+                row['output_tokens'] = row.get('output_tokens', 0) + span.get('output_tokens', 0)
+            elif span['kind'] == 'tool':
+                row['tool_calls'] = row.get('tool_calls', 0) + 1
+                row['tool_errors'] = row.get('tool_errors', 0) + (span['status'] == "error")
+        return sorted(rows.values(), key=lambda row: -row.get('seconds', 0.0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['start'])
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'wall_time': round(self.offset(), 3),
+            'stages': self.stage_summary(),
+            'spans': spans,
+        }
+
+    def save(self, directory: str = TIMELINE_DIR) -> Optional[str]:
+        """
+        Writes the timeline to <directory>/<run_id>.json when a directory is configured.
+        """
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+
+class InstrumentationHooks(RunHooks):
+    """
+    SDK run hooks for one Runner.run: counts model turns and times each tool call, recording
+    tool spans on the run's timeline and tool metrics.
+
+    Args:
+        timeline: Timeline of the pipeline run (None records metrics only).
+        stage: Pipeline stage the agent run belongs to.
+        label: Sector or ticker of a fan-out sub-run.
+    """
+
+    def __init__(self, timeline: Optional[RunTimeline], stage: str, label: str = ""):
+        self.timeline = timeline
+        self.stage = stage
+        self.label = label
+        self.turns = 0
+        self._clock = timeline.offset if timeline is not None else time.monotonic
+        self._tool_starts: Dict[str, float] = {}
+
+    def _call_key(self, context, tool) -> str:
+        # Parallel calls of the same tool are told apart by the call ID the SDK puts on the ToolContext
+        return getattr(context, 'tool_call_id', None) or getattr(tool, 'name', '')
+
+    async def on_llm_end(self, context, agent, response) -> None:
+        self.turns += 1
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self._tool_starts[self._call_key(context, tool)] = self._clock()
+
+    async def on_tool_end(self, context, agent, tool, result) -> None:
+        end = self._clock()
+        start = self._tool_starts.pop(self._call_key(context, tool), end)
+        name = getattr(tool, 'name', type(tool).__name__)
+        status = "error" if str(result).lstrip().startswith(TOOL_ERROR_PREFIXES) else "ok"
+        metrics.inc('tool_calls_total', {'tool': name, 'stage': self.stage, 'status': status})
+        metrics.observe('tool_call_seconds', {'tool': name}, end - start)
+        if self.timeline is not None:
+            attributes = {'stage': self.stage, 'label': self.label, 'status': status}
+            if status == "error":
+                attributes['error'] = str(result)[:200]
+            self.timeline.add('tool', name, start, end, **attributes)
+
+
+async def instrumented_run(run: Callable, agent, stage: str, max_turns: int, label: str = "",
+                           timeline: Optional[RunTimeline] = None):
+    """
+    Calls `run(hooks)` (an agent run that passes the hooks to the SDK) and records its wall time,
+    model, token usage, turns used against max_turns and outcome.
+
+    Returns:
+        The run result.
+    """
+    hooks = InstrumentationHooks(timeline, stage, label)
+    clock = timeline.offset if timeline is not None else time.monotonic
+    agent_name = getattr(agent, 'name', 'agent')
+    model = str(getattr(agent, 'model', None) or "default")
+    start = clock()
+    status = "ok"
+    input_tokens = output_tokens = 0
+    try:
+        result = await run(hooks)
+        usage = getattr(getattr(result, 'context_wrapper', None), 'usage', None)
+        if usage is not None:
+            input_tokens, output_tokens = usage.input_tokens, usage.output_tokens
+        return result
+    except BaseException as e:
+        # MaxTurnsExceeded, RateLimitError, cancellation, ...
+        status = type(e).__name__
+        raise
+    finally:
+        end = clock()
+        metrics.observe('agent_run_seconds', {'stage': stage, 'agent': agent_name, 'model': model}, end - start)
+        metrics.inc('agent_runs_total', {'stage': stage, 'agent': agent_name, 'status': status})
+        metrics.inc('agent_tokens_total', {'stage': stage, 'model': model, 'direction': 'input'}, input_tokens)
+        metrics.inc('agent_tokens_total', {'stage': stage, 'model': model, 'direction': 'output'}, output_tokens)
+        metrics.observe('agent_turns', {'stage': stage, 'agent': agent_name}, hooks.turns)
+        metrics.observe('agent_turn_budget_ratio', {'stage': stage}, hooks.turns / max_turns if max_turns else 0.0)
+        if timeline is not None:
+            timeline.add(
+                'agent', agent_name, start, end, stage=stage, label=label, model=model, status=status,
+                turns=hooks.turns, max_turns=max_turns, input_tokens=input_tokens, output_tokens=output_tokens,
+            )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """
+    Serves the registry at http://host:port/metrics from a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
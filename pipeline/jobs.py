@@ -0,0 +1,275 @@
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./.cache/jobs.sqlite")
+# A running job whose worker has not heartbeat for this long is handed to another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "90"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 60 * 60)))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+@dataclass
+class Job:
+    id: str
+    query: str
+    options: Dict[str, Any]
+    status: str
+    attempts: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    worker_id: Optional[str] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+
+@dataclass
+class JobEvent:
+    seq: int
+    kind: str
+    stage: str
+    payload: Dict[str, Any]
+    attempt: int = 1
+
+
+JOB_COLUMNS = "id, query, options, status, attempts, created_at, started_at, finished_at, worker_id, error, result"
+
+
+def _job(row) -> Job:
+    return Job(
+        id=row[0], query=row[1], options=json.loads(row[2] or "{}"), status=row[3], attempts=row[4],
+        created_at=row[5], started_at=row[6], finished_at=row[7], worker_id=row[8], error=row[9],
+        result=json.loads(row[10]) if row[10] else None,
+    )
+
+
+class JobQueue:
+    """
+    Persistent analysis queue shared by the Streamlit UI and the worker processes.
+
+    The UI submits jobs and polls their events; workers claim queued jobs, append progress events
+    while the pipeline runs and store the result. Jobs outlive UI sessions, so a browser refresh
+    or widget rerun reattaches to the run instead of killing it.
+
+    Args:
+        path: SQLite database file.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, query TEXT, options TEXT, status TEXT, attempts INTEGER, "
+                "created_at REAL, started_at REAL, finished_at REAL, worker_id TEXT, heartbeat_at REAL, "
+                "error TEXT, result TEXT)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "job_id TEXT, seq INTEGER, kind TEXT, stage TEXT, payload TEXT, created_at REAL, "
+                "attempt INTEGER DEFAULT 1, PRIMARY KEY (job_id, seq))"
+            )
+            if 'attempt' not in {row[1] for row in connection.execute("PRAGMA table_info(job_events)")}:
+                connection.execute("ALTER TABLE job_events ADD COLUMN attempt INTEGER DEFAULT 1")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, pid INTEGER, heartbeat_at REAL)"
+            )
+            self._initialized = True
+        return connection
+
+    def submit(self, query: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Queues an analysis and returns its job ID.
+        """
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, query, options, status, attempts, created_at) VALUES (?, ?, ?, ?, 0, ?)",
+                (job_id, query, json.dumps(options or {}), QUEUED, time.time()),
+            )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """
+        Atomically takes the oldest queued job, or a running job whose worker stopped heartbeating.
+        Jobs that already used JOB_MAX_ATTEMPTS are marked failed instead of being retried.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ? "
+                    "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                    (FAILED, now, "Worker stopped responding", RUNNING, now - JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS),
+                )
+                row = connection.execute(
+                    "SELECT id, status FROM jobs WHERE status = ? OR (status = ? AND heartbeat_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now - JOB_LEASE_SECONDS),
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                # A reclaimed job resumes from the checkpoints of its abandoned attempt
+                connection.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, worker_id = ?, "
+                    "heartbeat_at = ? WHERE id = ?",
+                    (RUNNING, now, worker_id, now, row[0]),
+                )
+                job = _job(connection.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (row[0],)).fetchone())
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return job
+
+    def heartbeat(self, worker_id: str, job_id: Optional[str] = None) -> None:
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO workers (id, pid, heartbeat_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (worker_id, os.getpid(), now),
+            )
+            if job_id is not None:
+                connection.execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker_id = ?", (now, job_id, worker_id)
+                )
+
+    def unregister(self, worker_id: str) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def live_workers(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat_at >= ?", (time.time() - JOB_LEASE_SECONDS,)
+            ).fetchone()[0]
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = NULL WHERE id = ?",
+                (SUCCEEDED, time.time(), json.dumps(result, default=str), job_id),
+            )
+
+    def requeue(self, job_id: str, error: Optional[str] = None) -> bool:
+        """
+        Puts a running or failed job back in the queue. Its next attempt resumes from the stages
+        the earlier attempts checkpointed. Returns False if the job is not running or failed.
+        """
+        with closing(self._connect()) as connection:
+            updated = connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = NULL, worker_id = NULL, result = NULL "
+                "WHERE id = ? AND status IN (?, ?)",
+                (QUEUED, error, job_id, RUNNING, FAILED),
+            ).rowcount
+        return updated > 0
+
+    def fail(self, job_id: str, error: str) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (FAILED, time.time(), error, job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with closing(self._connect()) as connection:
+            row = connection.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row is not None else None
+
+    def queue_position(self, job_id: str) -> int:
+        """
+        Number of queued jobs ahead of this one (0 when it is next or no longer queued).
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < "
+                "(SELECT created_at FROM jobs WHERE id = ? AND status = ?)",
+                (QUEUED, job_id, QUEUED),
+            ).fetchone()
+        return row[0]
+
+    def add_event(self, job_id: str, kind: str, stage: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO job_events (job_id, seq, kind, stage, payload, created_at, attempt) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ?, ?, "
+                "(SELECT attempts FROM jobs WHERE id = ?) FROM job_events WHERE job_id = ?",
+                (job_id, kind, stage, json.dumps(payload or {}, default=str), time.time(), job_id, job_id),
+            )
+
+    def events(self, job_id: str, after_seq: int = 0, attempt: Optional[int] = None) -> List[JobEvent]:
+        """
+        Returns the job's progress events after `after_seq`, in order, optionally only those of one attempt.
+        """
+        query = "SELECT seq, kind, stage, payload, attempt FROM job_events WHERE job_id = ? AND seq > ?"
+        params = [job_id, after_seq]
+        if attempt is not None:
+            query += " AND attempt = ?"
+            params.append(attempt)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query + " ORDER BY seq", params).fetchall()
+        return [JobEvent(seq, kind, stage, json.loads(payload), attempt) for seq, kind, stage, payload, attempt in rows]
+
+    def prune(self, older_than: float = JOB_RETENTION_SECONDS) -> int:
+        """
+        Deletes finished jobs (and their events) older than `older_than` seconds.
+        """
+        cutoff = time.time() - older_than
+        with closing(self._connect()) as connection:
+            ids = [row[0] for row in connection.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (*FINISHED_STATES, cutoff)
+            ).fetchall()]
+            connection.executemany("DELETE FROM job_events WHERE job_id = ?", [(job_id,) for job_id in ids])
+            connection.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in ids])
+        return len(ids)
+
+
+def replay_event(reporter, event: JobEvent) -> None:
+    """
+    Applies a stored progress event to a PipelineReporter, so the UI can rebuild a run's display
+    from its event log after a rerun or reconnect.
+    """
+    payload = event.payload
+    if event.kind == "started":
+        reporter.stage_started(event.stage)
+    elif event.kind == "completed":
+        reporter.stage_completed(event.stage, payload.get('output'))
+    elif event.kind == "reused":
+        reporter.stage_reused(event.stage, payload.get('age_seconds', 0.0))
+    elif event.kind == "resumed":
+        reporter.stage_resumed(event.stage)
+    elif event.kind == "stream":
+        reporter.stage_stream(event.stage, payload.get('text', ''), payload.get('label', ''))
+    elif event.kind == "tool":
+        reporter.stage_tool_call(event.stage, payload.get('description', ''), payload.get('label', ''))
+
+
+job_queue = JobQueue()
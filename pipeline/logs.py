@@ -0,0 +1,202 @@
+from contextlib import contextmanager
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterator, Optional
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-module levels as "logger=LEVEL,..." on top of these defaults; the longest matching prefix wins
+DEFAULT_LOG_LEVELS = "openai=WARNING,httpx=WARNING,httpcore=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of DEBUG records kept per logger prefix ("logger=rate,..."); traced runs are never sampled
+DEFAULT_LOG_SAMPLE_RATES = "openai=0.1,httpx=0.1,httpcore=0.1"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+# Loggers switched to DEBUG while a run with request tracing is active
+LOG_TRACE_LOGGERS = os.getenv("LOG_TRACE_LOGGERS", "openai,httpx")
+# Records are dropped (and counted) rather than blocking the event loop when the writer falls behind
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_run_id = contextvars.ContextVar("log_run_id", default="")
+_trace = contextvars.ContextVar("log_trace", default=False)
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {'message', 'asctime', 'run_id'}
+
+
+def _parse_mapping(spec: str) -> Dict[str, str]:
+    mapping = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+
+LEVELS = {name: value.upper() for name, value in {**_parse_mapping(DEFAULT_LOG_LEVELS), **_parse_mapping(LOG_LEVELS)}.items()}
+SAMPLE_RATES = {
+    name: float(value) for name, value in {**_parse_mapping(DEFAULT_LOG_SAMPLE_RATES), **_parse_mapping(LOG_SAMPLE_RATES)}.items()
+}
+
+
+def _lookup(mapping: Dict[str, object], logger_name: str, default):
+    name = logger_name
+    while name:
+        if name in mapping:
+            return mapping[name]
+        name = name.rpartition(".")[0]
+    return default
+
+
+@lru_cache(maxsize=None)
+def configured_level(logger_name: str) -> int:
+    return logging.getLevelName(_lookup(LEVELS, logger_name, LOG_LEVEL))
+
+
+@lru_cache(maxsize=None)
+def sample_rate(logger_name: str) -> float:
+    return _lookup(SAMPLE_RATES, logger_name, 1.0)
+
+
+class RunContextFilter(logging.Filter):
+    """
+    Stamps each record with the current run ID and applies the per-run policy: while a traced run
+    has lowered the trace loggers to DEBUG, records from untraced runs are still held to the
+    configured level, and DEBUG records outside traced runs are sampled.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = _run_id.get()
+        if _trace.get():
+            return True
+        if record.levelno < configured_level(record.name):
+            return False
+        if record.levelno < logging.INFO:
+            rate = sample_rate(record.name)
+            return rate >= 1.0 or random.random() < rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'run_id', ""):
+            entry['run_id'] = record.run_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread without ever blocking the caller; counts what a full queue drops.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments here; the traceback stays in exc_info for the writer thread to format
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[DroppingQueueHandler] = None
+_configure_lock = threading.Lock()
+_traced_runs = 0
+_trace_lock = threading.Lock()
+
+
+def configure_logging() -> None:
+    """
+    Routes all logging through a bounded queue to a background writer (stderr, JSON or text) and
+    applies LOG_LEVEL / LOG_LEVELS. Safe to call repeatedly (every Streamlit rerun, every worker process).
+    """
+    global _listener, _handler
+    with _configure_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        stream = logging.StreamHandler(sys.stderr)
+        if LOG_FORMAT == "text":
+            stream.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(run_id)s] %(message)s'))
+        else:
+            stream.setFormatter(JsonFormatter())
+        _handler = DroppingQueueHandler(log_queue)
+        _handler.addFilter(RunContextFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_handler)
+        root.setLevel(LOG_LEVEL)
+        for name, level in LEVELS.items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def _set_trace_levels(enabled: bool) -> None:
+    for name in filter(None, (name.strip() for name in LOG_TRACE_LOGGERS.split(","))):
+        logging.getLogger(name).setLevel(logging.DEBUG if enabled else configured_level(name))
+
+
+@contextmanager
+def run_context(run_id: str, trace: bool = False) -> Iterator[None]:
+    """
+    Tags every record logged inside the block (including from asyncio tasks and threads, and from
+    ContextThreadPoolExecutor pools) with `run_id`. With `trace`, the SDK and HTTP loggers emit full DEBUG request
+    tracing for this run only; other runs in the process keep their configured levels.
+    """
+    global _traced_runs
+    run_token = _run_id.set(run_id)
+    trace_token = _trace.set(trace)
+    if trace:
+        with _trace_lock:
+            _traced_runs += 1
+            if _traced_runs == 1:
+                _set_trace_levels(True)
+    try:
+        yield
+    finally:
+        if trace:
+            with _trace_lock:
+                _traced_runs -= 1
+                if _traced_runs == 0:
+                    _set_trace_levels(False)
+        _trace.reset(trace_token)
+        _run_id.reset(run_token)
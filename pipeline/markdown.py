@@ -0,0 +1,50 @@
+from typing import List, Tuple
+import re
+
+TICKER_PATTERN = re.compile(r"^[A-Z][A-Z0-9]{0,5}(?:[.\-][A-Z]{1,2})?$")
+SEPARATOR_CELL = re.compile(r"^:?-{3,}:?$")
+# Summary rows that agents sometimes append to ticker tables
+NON_TICKER_CELLS = {'TOTAL', 'CASH', 'TICKER', 'SUM', 'NA'}
+
+
+def _split_row(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_markdown_table(text: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Extracts the first Markdown table from agent output.
+
+    Returns:
+        (header cells, data rows). Both are empty when the text contains no table.
+    """
+    header = []
+    rows = []
+    for line in str(text).splitlines():
+        if not line.strip().startswith("|"):
+            if header and rows:
+                break
+            continue
+        cells = _split_row(line)
+        if not header:
+            header = cells
+        elif all(SEPARATOR_CELL.match(cell) for cell in cells if cell):
+            continue
+        else:
+            rows.append(cells)
+    return header, rows
+
+
+def extract_tickers(text: str) -> List[str]:
+    """
+    Returns the unique ticker symbols listed in the first column of a Markdown table, in order.
+    """
+    _, rows = parse_markdown_table(text)
+    tickers = []
+    for row in rows:
+        if not row:
+            continue
+        cell = row[0].strip("*` ").upper()
+        if TICKER_PATTERN.match(cell) and cell not in NON_TICKER_CELLS and cell not in tickers:
+            tickers.append(cell)
+    return tickers
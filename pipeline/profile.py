@@ -0,0 +1,384 @@
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import threading
+
+PROFILE_FAST_PATH_ENABLED = os.getenv("PROFILE_FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+
+AMOUNT_PATTERN = re.compile(
+    r"\$?\s*(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*(k|thousand|m|mm|mn|million|b|bn|billion)?\b",
+    re.IGNORECASE,
+)
+AMOUNT_MULTIPLIERS = {
+    'k': 1e3, 'thousand': 1e3,
+    'm': 1e6, 'mm': 1e6, 'mn': 1e6, 'million': 1e6,
+    'b': 1e9, 'bn': 1e9, 'billion': 1e9,
+}
+
+# Canonical sector -> phrases clients and the profiler use for it
+SECTOR_VOCABULARY = {
+    'Technology': ('technology', 'tech', 'information technology', 'software', 'cloud computing', 'cloud'),
+    'Artificial Intelligence': ('artificial intelligence', 'ai', 'machine learning'),
+    'Semiconductors': ('semiconductors', 'semiconductor', 'semis', 'chips', 'chipmakers'),
+    'Healthcare': ('healthcare', 'health care', 'medical'),
+    'Biotechnology': ('biotechnology', 'biotech'),
+    'Pharmaceuticals': ('pharmaceuticals', 'pharmaceutical', 'pharma'),
+    'Financials': ('financials', 'financial services', 'banks', 'banking', 'fintech'),
+    'Energy': ('energy', 'oil & gas', 'oil and gas', 'oil'),
+    'Renewable Energy': ('renewable energy', 'renewables', 'clean energy', 'green energy', 'solar', 'wind energy'),
+    'Utilities': ('utilities', 'utility'),
+    'Consumer Staples': ('consumer staples', 'staples'),
+    'Consumer Discretionary': ('consumer discretionary', 'e-commerce', 'ecommerce'),
+    'Real Estate': ('real estate', 'reits', 'reit'),
+    'Industrials': ('industrials', 'industrial', 'manufacturing'),
+    'Materials': ('materials', 'basic materials', 'mining', 'chemicals'),
+    'Communication Services': ('communication services', 'communications', 'telecom', 'telecommunications'),
+    'Aerospace & Defense': ('aerospace & defense', 'aerospace and defense', 'aerospace', 'defense', 'defence'),
+    'ETFs': ('etfs', 'etf', 'index funds', 'index fund'),
+}
+
+# Canonical strategy tag -> phrases that signal it
+STRATEGY_VOCABULARY = {
+    'Growth Investing': ('growth',),
+    'Value Investing': ('value investing', 'value stocks', 'deep value'),
+    'Dividend Income': ('dividend income', 'dividend growth', 'dividends', 'dividend'),
+    'Dollar-Cost Averaging': ('dollar-cost averaging', 'dollar cost averaging', 'dca'),
+    'Capital Preservation': ('preservation', 'preserve', 'conservative', 'defensive'),
+    'Balanced': ('balanced',),
+    'Index Investing': ('index investing', 'passive', 'indexing'),
+    'Momentum': ('momentum',),
+    'ESG': ('esg', 'sustainable', 'socially responsible'),
+}
+
+
+def _phrase_pattern(phrases) -> re.Pattern:
+    alternatives = sorted((re.escape(p) for p in phrases), key=len, reverse=True)
+    return re.compile(r"(?<![a-z0-9])(?:" + "|".join(alternatives) + r")(?![a-z0-9])", re.IGNORECASE)
+
+
+def _phrase_lookup(vocabulary: Dict[str, tuple]) -> Dict[str, str]:
+    return {phrase: canonical for canonical, phrases in vocabulary.items() for phrase in phrases}
+
+
+# One alternation per vocabulary, longest phrase first, so 'renewable energy' is never also read as 'energy'
+_SECTOR_PHRASES = _phrase_lookup(SECTOR_VOCABULARY)
+_SECTOR_PATTERN = _phrase_pattern(_SECTOR_PHRASES)
+_STRATEGY_PHRASES = _phrase_lookup(STRATEGY_VOCABULARY)
+_STRATEGY_PATTERN = _phrase_pattern(_STRATEGY_PHRASES)
+
+
+def _vocabulary_matches(pattern: re.Pattern, phrases: Dict[str, str], text: str) -> List[str]:
+    found = []
+    for match in pattern.finditer(str(text or "")):
+        canonical = phrases[match.group(0).lower()]
+        if canonical not in found:
+            found.append(canonical)
+    return found
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+    Parses the first dollar amount in text: '$1,000,000', '1 million', '$1.5M', '250k'.
+    """
+    match = AMOUNT_PATTERN.search(str(text or ""))
+    if match is None:
+        return None
+    value = float(match.group(1).replace(",", ""))
+    return value * AMOUNT_MULTIPLIERS.get((match.group(2) or "").lower(), 1.0)
+
+
+def canonical_sectors(text: str) -> List[str]:
+    """
+    Maps free-text sector mentions to canonical sector names, in order of first mention.
+    """
+    return _vocabulary_matches(_SECTOR_PATTERN, _SECTOR_PHRASES, text)
+
+
+def is_sector_phrase(text: str) -> bool:
+    """
+    True when the whole text is one sector phrase of the vocabulary ('Oil and Gas', 'semis').
+    """
+    return _SECTOR_PATTERN.fullmatch(str(text or "").strip()) is not None
+
+
+def canonical_strategies(text: str) -> List[str]:
+    return _vocabulary_matches(_STRATEGY_PATTERN, _STRATEGY_PHRASES, text)
+
+
+def _normalized_words(text: str) -> str:
+    return " ".join(sorted(set(re.findall(r"[a-z0-9&]+", str(text or "").lower()))))
+
+
+# Connectives and generic labels that carry no meaning of their own in a sector or strategy field
+FILLER_WORDS = frozenset((
+    'a', 'an', 'and', '&', 'the', 'of', 'in', 'on', 'with', 'plus', 'sector', 'sectors', 'industry',
+    'industries', 'stocks', 'investing', 'investment', 'investments', 'strategy', 'approach', 'focus', 'focused',
+))
+
+
+def _canonical_terms(pattern: re.Pattern, phrases: Dict[str, str], text: str) -> List[str]:
+    """
+    Canonical names for the vocabulary phrases in text, followed by every other meaningful word, so
+    'Technology, Robotics' and plain 'Technology' stay different while 'Tech and semis' and
+    'Technology, Semiconductors' stay equal.
+    """
+    text = str(text or "")
+    leftover = set(re.findall(r"[a-z0-9&]+", pattern.sub(" ", text).lower())) - FILLER_WORDS
+    return sorted(_vocabulary_matches(pattern, phrases, text)) + sorted(leftover)
+
+
+def normalize_profile(profile: Any) -> Dict[str, Any]:
+    """
+    Reduces a ClientProfileOutputSchema to the fields that decide the analysis, in a wording-independent
+    form: '$1M' and '1 million' give the same budget, 'Tech, semis' and 'Technology and Semiconductors'
+    the same sectors.
+    """
+    budget_text = getattr(profile, 'client_budget', '')
+    budget = parse_amount(budget_text)
+    sectors_text = getattr(profile, 'sector_preferences', '')
+    strategy_text = getattr(profile, 'investment_strategy', '')
+    return {
+        'budget': round(budget, 2) if budget is not None else _normalized_words(budget_text),
+        'timeline_years': int(getattr(profile, 'investment_timeline_years', 0) or 0),
+        'risk_tolerance': int(getattr(profile, 'risk_tolerance_level', 0) or 0),
+        'sectors': _canonical_terms(_SECTOR_PATTERN, _SECTOR_PHRASES, sectors_text),
+        'strategy': _canonical_terms(_STRATEGY_PATTERN, _STRATEGY_PHRASES, strategy_text),
+    }
+
+
+def profile_cache_key(profile: Any) -> str:
+    """
+    Stable digest of the normalized profile, used to recognize equivalent client requests.
+    """
+    canonical = json.dumps(normalize_profile(profile), sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+# ============================================================
+# Rule-based fast path for the Financial Profiler
+# ============================================================
+
+_NUMBER = r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+_MAGNITUDE = r"(k|thousand|m|mm|mn|million|b|bn|billion)"
+# An amount only counts as the budget when it is clearly money: a '$', a magnitude word or 'dollars'
+BUDGET_PATTERN = re.compile(
+    r"(?:\$\s*" + _NUMBER + r"(?:\s*" + _MAGNITUDE + r")?\b"
+    r"|(?<![\w.,])" + _NUMBER + r"\s*" + _MAGNITUDE + r"\b(?:\s*(?:dollars|usd))?"
+    r"|(?<![\w.,])" + _NUMBER + r"\s*(?:dollars|usd)\b)",
+    re.IGNORECASE,
+)
+TIMELINE_PATTERN = re.compile(
+    r"(?<![\w.])(\d+(?:\.\d+)?)\s*-?\s*(years?|yrs?|y|months?|mos?)\b|\b(a|one|two|three)\s+decades?\b",
+    re.IGNORECASE,
+)
+DECADES = {'a': 1, 'one': 1, 'two': 2, 'three': 3}
+# 'N years old', 'aged N', 'age: N' state the client's age, not the horizon
+AGE_SUFFIX = re.compile(r"\s*-?\s*(?:old|of\s+age)\b", re.IGNORECASE)
+AGE_PREFIX = re.compile(r"\b(?:aged|age)\s*(?:of|is|:|=)?\s*$", re.IGNORECASE)
+AGE_PATTERN = re.compile(
+    r"(?<![\w.])\d+\s*-?\s*(?:years?|yrs?|y)\s*-?\s*(?:old|of\s+age)\b|\b(?:aged|age)\s*(?:of|is|:|=)?\s*\d+",
+    re.IGNORECASE,
+)
+RISK_PATTERNS = (
+    re.compile(r"\brisk(?:\s*-?\s*(?:tolerance|appetite|level|score|profile|rating))?"
+               r"(?:\s+(?:of|is|at|around|about|=))?\s*:?\s*(\d{1,2})(?:\s*(?:/|out\s+of)\s*10)?(?!\s*%)",
+               re.IGNORECASE),
+    re.compile(r"(?<![\w.])(\d{1,2})\s*(?:/|out\s+of)\s*10\s+risk\b", re.IGNORECASE),
+)
+# Everyday words that only sometimes name a sector or strategy ('retail investor', 'steady income');
+# a query using them outside a longer vocabulary phrase goes to the model
+AMBIGUOUS_TERMS = re.compile(r"\b(?:retail|financial|finance|income|yield|value|media|health)\b", re.IGNORECASE)
+# Vocabulary hits only count in their own context: 'invest ... in X', 'X sectors', 'X strategy', 'using X'
+SECTOR_PREFIX = re.compile(
+    r"(?:\binvest(?:ing|ed|ment|ments)?\b[^.!?;]{0,60}?\b(?:in|into)|\bexposure\s+to|\bfocus(?:ed|ing)?\s+on"
+    r"|\b(?:sectors?|industr(?:y|ies))\s*(?::|like|such\s+as|including))\s+(?:the\s+)?$",
+    re.IGNORECASE,
+)
+SECTOR_SUFFIX = re.compile(r"^\s+(?:sectors?|industr(?:y|ies)|stocks|companies|names|space)\b", re.IGNORECASE)
+STRATEGY_PREFIX = re.compile(
+    r"(?:\b(?:using|use|with|via|through|follow(?:ing)?|prefer(?:ring)?|adopt(?:ing)?)\s+(?:an?\s+|the\s+|my\s+)?"
+    r"|\bstrateg(?:y|ies)\s*(?::|is|of|would\s+be)\s+(?:an?\s+)?)$",
+    re.IGNORECASE,
+)
+STRATEGY_SUFFIX = re.compile(r"^[\s-]*(?:investing|investment|strateg(?:y|ies)|approach|style|portfolio|focus)\b", re.IGNORECASE)
+# Strategy words that qualify the risk tolerance ('a conservative risk tolerance', 'risk appetite: defensive')
+# belong to the risk reading as much as the strategy one
+RISK_WORDING_AFTER = re.compile(r"^[\s-]*risk\b", re.IGNORECASE)
+RISK_WORDING_BEFORE = re.compile(
+    r"\brisk(?:\s*-?\s*(?:tolerance|appetite|level|profile))?\s*(?:is|of|:|=)?\s*$", re.IGNORECASE,
+)
+# Text allowed between the phrases of one list: 'Technology, AI and Semiconductors'
+LIST_CONNECTOR = re.compile(r"^[\s,/&]*(?:(?:and|or|plus)\b[\s,/&]*)?$", re.IGNORECASE)
+CONTEXT_WINDOW = 100
+
+# Queries that exclude or condition on something need the model to read them properly
+AMBIGUOUS_PHRASES = re.compile(
+    r"\b(?:not|no|avoid|avoiding|except|excluding|exclude|without|other than|rather than|instead of|"
+    r"per month|monthly|per year|annually|each month|each year|between|either|or so|unsure|not sure)\b",
+    re.IGNORECASE,
+)
+
+_extraction_stats = {'fast_path': 0, 'llm_fallback': 0}
+_fallback_reasons: Dict[str, int] = {}
+_stats_lock = threading.Lock()
+
+
+def _format_budget(amount: float) -> str:
+    return f"${amount:,.0f}" if amount == int(amount) else f"${amount:,.2f}"
+
+
+def _budgets(query: str) -> List[float]:
+    amounts = []
+    for match in BUDGET_PATTERN.finditer(query):
+        groups = match.groups()
+        # One (number, magnitude) pair per alternative of BUDGET_PATTERN
+        for number, magnitude in ((groups[0], groups[1]), (groups[2], groups[3]), (groups[4], None)):
+            if number is not None:
+                amounts.append(float(number.replace(",", "")) * AMOUNT_MULTIPLIERS.get((magnitude or "").lower(), 1.0))
+                break
+    return amounts
+
+
+def _timelines(query: str) -> List[float]:
+    years = []
+    for match in TIMELINE_PATTERN.finditer(query):
+        if AGE_SUFFIX.match(query, match.end()) or AGE_PREFIX.search(query[max(0, match.start() - 20):match.start()]):
+            continue
+        if match.group(3):
+            years.append(10.0 * DECADES[match.group(3).lower()])
+        elif match.group(2).lower().startswith('y'):
+            years.append(float(match.group(1)))
+        else:
+            years.append(float(match.group(1)) / 12.0)
+    return years
+
+
+def _risk_scores(query: str) -> List[int]:
+    return [int(match.group(1)) for pattern in RISK_PATTERNS for match in pattern.finditer(query)]
+
+
+def _contextual_matches(pattern: re.Pattern, phrases: Dict[str, str], text: str,
+                        prefix: re.Pattern, suffix: re.Pattern) -> Tuple[List[str], bool]:
+    """
+    Vocabulary hits that appear in their own context, grouping adjacent hits into lists so
+    'in Technology and Semiconductors sectors' counts for both.
+
+    Returns:
+        (canonical names, stray): stray is True when some hit appeared outside any such context.
+    """
+    runs = []
+    for match in pattern.finditer(text):
+        if runs and LIST_CONNECTOR.match(text[runs[-1][1]:match.start()]):
+            runs[-1][1] = match.end()
+            runs[-1][2].append(match.group(0))
+        else:
+            runs.append([match.start(), match.end(), [match.group(0)]])
+
+    found = []
+    stray = False
+    for start, end, hits in runs:
+        before = text[max(0, start - CONTEXT_WINDOW):start]
+        after = text[end:end + CONTEXT_WINDOW]
+        if not (prefix.search(before) or suffix.match(after)):
+            stray = True
+            continue
+        for hit in hits:
+            canonical = phrases[hit.lower()]
+            if canonical not in found:
+                found.append(canonical)
+    return found, stray
+
+
+def _strategy_describes_risk(query: str) -> bool:
+    for match in _STRATEGY_PATTERN.finditer(query):
+        if (RISK_WORDING_AFTER.match(query[match.end():])
+                or RISK_WORDING_BEFORE.search(query[max(0, match.start() - 40):match.start()])):
+            return True
+    return False
+
+
+def _ambiguous_term(query: str) -> Optional[str]:
+    # Longer vocabulary phrases ('financial services', 'value investing') are not ambiguous
+    remainder = _STRATEGY_PATTERN.sub(" ", _SECTOR_PATTERN.sub(" ", query))
+    match = AMBIGUOUS_TERMS.search(remainder)
+    return match.group(0).lower() if match else None
+
+
+def extract_profile_fields(query: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Fills the ClientProfileOutputSchema fields from a query in regular phrasing, without a model call.
+
+    Returns:
+        (fields, reason): fields is None when the query is not unambiguous enough to trust the rules,
+        and reason then says why, e.g. 'no risk score' or 'conflicting budgets'.
+    """
+    query = str(query or "")
+    if AMBIGUOUS_PHRASES.search(query):
+        return None, "conditional or exclusionary phrasing"
+    ambiguous = _ambiguous_term(query)
+    if ambiguous is not None:
+        return None, f"ambiguous term '{ambiguous}'"
+
+    if AGE_PATTERN.search(query):
+        return None, "age mentioned"
+
+    budgets = set(_budgets(query))
+    if len(budgets) != 1:
+        return None, "no budget" if not budgets else "conflicting budgets"
+    timelines = set(_timelines(query))
+    if len(timelines) != 1:
+        return None, "no timeline" if not timelines else "conflicting timelines"
+    timeline = timelines.pop()
+    if timeline != int(timeline) or timeline < 1:
+        return None, "timeline is not a whole number of years"
+    risks = set(_risk_scores(query))
+    if len(risks) != 1:
+        return None, "no risk score" if not risks else "conflicting risk scores"
+    risk = risks.pop()
+    if not 1 <= risk <= 10:
+        return None, "risk score outside 1-10"
+    sectors, stray = _contextual_matches(_SECTOR_PATTERN, _SECTOR_PHRASES, query, SECTOR_PREFIX, SECTOR_SUFFIX)
+    if stray:
+        return None, "sector mentioned outside an investment context"
+    if not sectors:
+        return None, "no recognized sectors"
+    if _strategy_describes_risk(query):
+        return None, "strategy wording describes the risk tolerance"
+    strategies, stray = _contextual_matches(
+        _STRATEGY_PATTERN, _STRATEGY_PHRASES, query, STRATEGY_PREFIX, STRATEGY_SUFFIX,
+    )
+    if stray:
+        return None, "strategy mentioned outside a strategy context"
+    if not strategies:
+        return None, "no recognized strategy"
+
+    return {
+        'client_budget': _format_budget(budgets.pop()),
+        'investment_timeline_years': int(timeline),
+        'risk_tolerance_level': risk,
+        'sector_preferences': ", ".join(sectors),
+        'investment_strategy': " and ".join(strategies),
+    }, ""
+
+
+def record_extraction(fast_path: bool, reason: str = "") -> None:
+    with _stats_lock:
+        _extraction_stats['fast_path' if fast_path else 'llm_fallback'] += 1
+        if not fast_path and reason:
+            _fallback_reasons[reason] = _fallback_reasons.get(reason, 0) + 1
+
+
+def extraction_stats() -> dict:
+    """
+    Returns how many profiles this process extracted locally vs. with the Financial Profiler agent,
+    the fast-path rate and the reasons queries fell back.
+    """
+    with _stats_lock:
+        total = _extraction_stats['fast_path'] + _extraction_stats['llm_fallback']
+        return {
+            **_extraction_stats,
+            'fast_path_rate': _extraction_stats['fast_path'] / total if total else 0.0,
+            'fallback_reasons': dict(_fallback_reasons),
+        }
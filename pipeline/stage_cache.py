@@ -0,0 +1,129 @@
+from contextlib import closing
+from typing import Any, Iterable, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pipeline.profile import normalize_profile
+
+STAGE_CACHE_PATH = os.getenv("STAGE_CACHE_PATH", "./.cache/stage_cache.sqlite")
+STAGE_CACHE_ENABLED = os.getenv("STAGE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Results computed in different epochs never match, so market data older than one epoch is not reused
+STAGE_CACHE_EPOCH_SECONDS = float(os.getenv("STAGE_CACHE_EPOCH_SECONDS", str(24 * 60 * 60)))
+STAGE_CACHE_MAX_AGE_SECONDS = {
+    'market_research': float(os.getenv("STAGE_CACHE_MARKET_RESEARCH_MAX_AGE", str(12 * 60 * 60))),
+    'stock_candidates': float(os.getenv("STAGE_CACHE_STOCK_CANDIDATES_MAX_AGE", str(4 * 60 * 60))),
+}
+
+
+def freshness_epoch(now: Optional[float] = None) -> int:
+    return int((time.time() if now is None else now) // STAGE_CACHE_EPOCH_SECONDS)
+
+
+def agent_fingerprint(agents: Iterable[Any]) -> str:
+    """
+    Digest of the instructions and models of the agents behind a stage, so a prompt or model change
+    invalidates the results they produced.
+    """
+    digest = hashlib.sha256()
+    for agent in agents:
+        for part in (getattr(agent, 'name', ''), getattr(agent, 'model', ''), getattr(agent, 'instructions', '')):
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def stage_cache_key(stage: str, client_profile: Any, fingerprint: str, *inputs: str) -> str:
+    """
+    Builds the cache key for one stage: normalized profile, freshness epoch, agent fingerprint and any
+    upstream outputs the stage consumes (so a reused stage never mixes with a fresh upstream result).
+    """
+    payload = {
+        'stage': stage,
+        'profile': normalize_profile(client_profile),
+        'epoch': freshness_epoch(),
+        'agents': fingerprint,
+        'inputs': [hashlib.sha256(str(text).encode('utf-8')).hexdigest() for text in inputs],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """
+    SQLite-backed cache of whole agent stage outputs shared by every process on the host.
+
+    Args:
+        path: SQLite database file.
+    """
+
+    def __init__(self, path: str = STAGE_CACHE_PATH):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS stage_results ("
+                "stage TEXT, key TEXT, value TEXT, created_at REAL, PRIMARY KEY (stage, key))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS stage_stats ("
+                "stage TEXT, name TEXT, value INTEGER, PRIMARY KEY (stage, name))"
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def _bump(self, connection: sqlite3.Connection, stage: str, name: str) -> None:
+        connection.execute(
+            "INSERT INTO stage_stats (stage, name, value) VALUES (?, ?, 1) "
+            "ON CONFLICT(stage, name) DO UPDATE SET value = value + 1",
+            (stage, name),
+        )
+
+    def get(self, stage: str, key: str, max_age: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """
+        Returns (output, age_seconds) for a result no older than max_age (the stage's configured
+        limit by default), or None on a miss.
+        """
+        if max_age is None:
+            max_age = STAGE_CACHE_MAX_AGE_SECONDS.get(stage, 0.0)
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT value, created_at FROM stage_results WHERE stage = ? AND key = ?", (stage, key)
+            ).fetchone()
+            age = time.time() - row[1] if row is not None else None
+            hit = age is not None and age < max_age
+            self._bump(connection, stage, 'hits' if hit else 'misses')
+            connection.commit()
+        return (json.loads(row[0]), age) if hit else None
+
+    def put(self, stage: str, key: str, value: Any) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO stage_results (stage, key, value, created_at) VALUES (?, ?, ?, ?)",
+                (stage, key, json.dumps(value), time.time()),
+            )
+            connection.commit()
+
+    def stats(self) -> dict:
+        """
+        Returns per-stage hit/miss totals across all processes.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT stage, name, value FROM stage_stats").fetchall()
+        stats = {}
+        for stage, name, value in rows:
+            stats.setdefault(stage, {'hits': 0, 'misses': 0})[name] = value
+        for counters in stats.values():
+            total = counters['hits'] + counters['misses']
+            counters['hit_rate'] = counters['hits'] / total if total else 0.0
+        return stats
+
+
+stage_cache = StageCache()
@@ -0,0 +1,554 @@
+from typing import Any, List, Optional, Tuple
+import asyncio
+import logging
+import os
+from Agents.client_recipt import ClientProfileOutputSchema, Financial_Profiler_Agent
+from Agents.Market_Research_Analyst import financial_analyst, sector_research_agent, research_merge_agent
+from Agents.Financial_Data_Analyst import chief_risk_officer_agent
+from Agents.Risk_Management_Specialist import risk_management_specialist
+from Agents.Investment_Strategist import portfolio_manager_agent
+from Agents.Final_Report_Generator import final_report_agent
+from pipeline.artifacts import (
+    compact_profile, compact_rows, parse_allocation_plan, parse_candidate_rows, parse_market_brief,
+)
+from pipeline.checkpoints import CHECKPOINTS_ENABLED, checkpoint_store
+from pipeline.dag import Stage
+from pipeline.fanout import fanout_sectors, fanout_tickers, run_risk_fanout, run_sector_fanout
+from pipeline.instrumentation import RunTimeline, instrumented_run, metrics
+from pipeline.markdown import extract_tickers
+from pipeline.profile import PROFILE_FAST_PATH_ENABLED, extract_profile_fields, record_extraction
+from pipeline.stage_cache import STAGE_CACHE_ENABLED, agent_fingerprint, stage_cache, stage_cache_key
+from pipeline.streaming import run_streamed
+from pipeline.token_accounting import TokenLedger
+from tools.context_executor import ContextThreadPoolExecutor
+from tools.custom_stock_retriever import _fetch_stock_fundamentals_batch_core
+from tools.sec_filing_store import get_latest_filings
+from tools.sec_index import load_index
+from tools.sec_sections import load_sections, search_targets
+
+logger = logging.getLogger(__name__)
+
+SEC_PREFETCH_WORKERS = int(os.getenv("SEC_PREFETCH_WORKERS", "4"))
+# Later stages read compact serialized artifacts instead of the full Markdown of earlier stages
+COMPACT_HANDOFF = os.getenv("COMPACT_HANDOFF", "true").lower() in ("1", "true", "yes")
+
+# Artifact fields the allocation and report stages need from the risk table
+ALLOCATION_HANDOFF_FIELDS = ('ticker', 'name', 'sector', 'beta', 'pe_ratio', 'qualitative_risks', 'risk_score')
+REPORT_HANDOFF_FIELDS = (
+    'ticker', 'name', 'sector', 'beta', 'pe_ratio', 'quantitative_justification', 'qualitative_risks', 'risk_score',
+)
+
+# The six agent stages in pipeline order; the UI shows one expander per stage
+CLIENT_PROFILE = "client_profile"
+MARKET_RESEARCH = "market_research"
+STOCK_CANDIDATES = "stock_candidates"
+RISK_ASSESSMENT = "risk_assessment"
+PORTFOLIO_ALLOCATION = "portfolio_allocation"
+FINAL_REPORT = "final_report"
+AGENT_STAGES = (CLIENT_PROFILE, MARKET_RESEARCH, STOCK_CANDIDATES, RISK_ASSESSMENT, PORTFOLIO_ALLOCATION, FINAL_REPORT)
+
+# Best-effort warm-up stages that overlap the agent stages
+SEC_PREFETCH = "sec_prefetch"
+QUOTE_PREFETCH = "quote_prefetch"
+
+
+class PipelineReporter:
+    """
+    Receives stage lifecycle events. The base class ignores them; the Streamlit UI overrides them.
+    """
+
+    def stage_started(self, stage: str) -> None:
+        pass
+
+    def stage_completed(self, stage: str, output: Any) -> None:
+        pass
+
+    def stage_reused(self, stage: str, age_seconds: float) -> None:
+        pass
+
+    def stage_resumed(self, stage: str) -> None:
+        """
+        The stage's output was restored from this run's checkpoint instead of being recomputed.
+        """
+        pass
+
+    def stage_stream(self, stage: str, text: str, label: str = "") -> None:
+        """
+        A chunk of model output while the stage runs. `label` names the sector or ticker of a fan-out sub-run.
+        """
+        pass
+
+    def stage_tool_call(self, stage: str, description: str, label: str = "") -> None:
+        pass
+
+
+def _prefetch_sec_filings(tickers: List[str]) -> int:
+    """
+    Downloads, parses and indexes filings for every candidate so the risk agent's searches hit local disk.
+    """
+    def fetch(ticker):
+        count = 0
+        for filing in get_latest_filings(ticker):
+            for path in search_targets(load_sections(filing.path, filing.form)).values():
+                load_index(path)
+            count += 1
+        return count
+
+    if not tickers:
+        return 0
+    with ContextThreadPoolExecutor(max_workers=min(SEC_PREFETCH_WORKERS, len(tickers))) as pool:
+        return sum(pool.map(fetch, tickers))
+
+
+def _cached_output(stage: str, key: str) -> Optional[Tuple[Any, float]]:
+    try:
+        cached = stage_cache.get(stage, key)
+    except Exception as e:
+        logger.warning(f"Stage cache lookup failed for {stage}: {e}")
+        return None
+    metrics.inc('stage_cache_lookups_total', {'stage': stage, 'outcome': 'hit' if cached is not None else 'miss'})
+    return cached
+
+
+def _store_output(stage: str, key: str, output: Any) -> None:
+    try:
+        stage_cache.put(stage, key, output)
+    except Exception as e:
+        logger.warning(f"Could not cache {stage} output: {e}")
+
+
+def _load_checkpoint(run_id: str, stage: str) -> Optional[Tuple[Any, float]]:
+    try:
+        return checkpoint_store.get(run_id, stage)
+    except Exception as e:
+        logger.warning(f"Checkpoint lookup failed for {stage}: {e}")
+        return None
+
+
+def _save_checkpoint(run_id: str, stage: str, output: Any) -> None:
+    try:
+        checkpoint_store.put(run_id, stage, output)
+    except Exception as e:
+        logger.warning(f"Could not checkpoint {stage} output: {e}")
+
+
+def build_pipeline(reporter: PipelineReporter, use_stage_cache: bool = True,
+                   ledger: Optional[TokenLedger] = None, run_id: Optional[str] = None,
+                   timeline: Optional[RunTimeline] = None) -> List[Stage]:
+    """
+    Describes the investment analysis as a dependency graph of stages.
+
+    Agent stages keep their original order because each consumes the previous output, but SEC
+    filings for the candidates are prefetched alongside the risk assessment, and quotes for the
+    vetted tickers are warmed alongside the allocation stage.
+
+    Args:
+        reporter: Receives stage lifecycle events.
+        use_stage_cache: Reuse recent market research and candidate selection for an equivalent
+            client profile. False forces a fresh analysis (STAGE_CACHE_ENABLED=false disables it globally).
+        ledger: Collects per-stage prompt and usage token counts for the run.
+        run_id: Checkpoints each agent stage's output under this ID. Building the pipeline again with
+            the same ID resumes it: stages with a checkpoint are restored instead of rerun.
+        timeline: Records each agent run and tool call of the run (metrics are recorded either way).
+    """
+    use_stage_cache = use_stage_cache and STAGE_CACHE_ENABLED
+    use_checkpoints = run_id is not None and CHECKPOINTS_ENABLED
+    if ledger is None:
+        ledger = TokenLedger()
+
+    def handoff_prompt(stage, template, **sections):
+        """
+        Renders a stage prompt from (full text, compact artifact) pairs, records both sizes,
+        and returns the one to send.
+        """
+        full_prompt = template.format(**{name: full for name, (full, _) in sections.items()})
+        compact_prompt = template.format(**{name: compact for name, (_, compact) in sections.items()})
+        ledger.record_handoff(stage, full_prompt, compact_prompt)
+        return compact_prompt if COMPACT_HANDOFF else full_prompt
+
+    def profile_handoff(client_profile):
+        return str(client_profile), compact_profile(client_profile)
+
+    def resume(stage):
+        """
+        Returns the stage's output from this run's checkpoint (reported as resumed), or None.
+        """
+        saved = _load_checkpoint(run_id, stage) if use_checkpoints else None
+        if saved is None:
+            return None
+        output, age = saved
+        logger.info("Resuming %s from the checkpoint saved %.0f min ago", stage, age / 60)
+        metrics.inc('checkpoint_restores_total', {'stage': stage})
+        reporter.stage_resumed(stage)
+        reporter.stage_completed(stage, output)
+        return output
+
+    def finish(stage, output):
+        """
+        Checkpoints a completed stage for later resumes, then reports it.
+        """
+        if use_checkpoints:
+            _save_checkpoint(run_id, stage, output)
+        reporter.stage_completed(stage, output)
+
+    def market_research_outputs(market_research):
+        return {'market_research': market_research, 'market_brief': parse_market_brief(market_research)}
+
+    def stock_candidates_outputs(stock_candidates):
+        return {
+            'stock_candidates': stock_candidates,
+            'candidate_tickers': extract_tickers(stock_candidates),
+            'candidates': parse_candidate_rows(stock_candidates),
+        }
+
+    def stage_runner(stage):
+        """
+        Returns a fanout.AgentRunner that streams the stage's agent output and tool calls to the reporter
+        and records the run's latency, tokens, turns and tool calls.
+        """
+        async def run_agent(agent, prompt, max_turns, label=""):
+            return await instrumented_run(
+                lambda hooks: run_streamed(
+                    agent, prompt, max_turns,
+                    on_text=lambda delta: reporter.stage_stream(stage, delta, label),
+                    on_tool=lambda description: reporter.stage_tool_call(stage, description, label),
+                    hooks=hooks,
+                ),
+                agent, stage, max_turns, label=label, timeline=timeline,
+            )
+        return run_agent
+
+    # ============================================================
+    # STEP 1: Financial Profiler Agent
+    # ============================================================
+    async def client_profile_stage(query):
+        reporter.stage_started(CLIENT_PROFILE)
+        logger.info("Step 1: Financial Profiler Agent (query: %s)", query)
+
+        resumed = resume(CLIENT_PROFILE)
+        if resumed is not None:
+            return {'client_profile': ClientProfileOutputSchema(**resumed)}
+
+        fields, reason = extract_profile_fields(query) if PROFILE_FAST_PATH_ENABLED else (None, "fast path disabled")
+        if fields is not None:
+            # Regular phrasing: the rules fill the schema without a model call
+            client_profile = ClientProfileOutputSchema(**fields)
+            record_extraction(True)
+            logger.info("Client profile extracted locally (fast path)")
+        else:
+            logger.info("Falling back to the Financial Profiler agent: %s", reason)
+            client_profile_result = await stage_runner(CLIENT_PROFILE)(
+                Financial_Profiler_Agent,
+                f"Client Investment Goal: {query}",
+                max_turns=20
+            )
+            client_profile = client_profile_result.final_output
+            ledger.record_usage(CLIENT_PROFILE, client_profile_result)
+            record_extraction(False, reason)
+
+        # Whole outputs only at DEBUG: formatting them on every run is not free
+        logger.debug("Client profile output:\n%s", client_profile, extra={'stage': CLIENT_PROFILE})
+
+        finish(CLIENT_PROFILE, client_profile)
+        return {'client_profile': client_profile}
+
+    # ============================================================
+    # STEP 2: Market Research Analyst Agent
+    # ============================================================
+    async def market_research_stage(client_profile):
+        reporter.stage_started(MARKET_RESEARCH)
+        logger.info("Step 2: Market Research Analyst Agent")
+
+        resumed = resume(MARKET_RESEARCH)
+        if resumed is not None:
+            return market_research_outputs(resumed)
+
+        if use_stage_cache:
+            cache_key = stage_cache_key(
+                MARKET_RESEARCH, client_profile,
+                agent_fingerprint((financial_analyst, sector_research_agent, research_merge_agent)),
+            )
+            cached = _cached_output(MARKET_RESEARCH, cache_key)
+            if cached is not None:
+                market_research, age = cached
+                logger.info("Reusing market research for an equivalent profile (%.0f min old)", age / 60)
+                reporter.stage_reused(MARKET_RESEARCH, age)
+                finish(MARKET_RESEARCH, market_research)
+                return market_research_outputs(market_research)
+
+        sectors = fanout_sectors(client_profile)
+        if sectors:
+            # One concurrent sub-run per requested sector instead of one long serial loop
+            logger.info("Fanning out market research across %d sectors: %s", len(sectors), ", ".join(sectors))
+            profile_text = compact_profile(client_profile) if COMPACT_HANDOFF else client_profile
+            market_research = await run_sector_fanout(
+                profile_text, sectors, stage_runner(MARKET_RESEARCH),
+                ledger=ledger, stage=MARKET_RESEARCH, full_profile=client_profile,
+            )
+        else:
+            market_research_prompt = handoff_prompt(
+                MARKET_RESEARCH,
+                """
+                    Based on the following client profile, conduct comprehensive market research:
+
+                    {client_profile}
+
+                    Analyze the requested sectors and provide a detailed market research brief.
+                    """,
+                client_profile=profile_handoff(client_profile),
+            )
+            market_research_result = await stage_runner(MARKET_RESEARCH)(
+                financial_analyst,
+                market_research_prompt,
+                max_turns=40
+            )
+            market_research = market_research_result.final_output
+            ledger.record_usage(MARKET_RESEARCH, market_research_result)
+
+        logger.debug("Market research output:\n%s", market_research, extra={'stage': MARKET_RESEARCH})
+
+        if use_stage_cache:
+            _store_output(MARKET_RESEARCH, cache_key, market_research)
+
+        finish(MARKET_RESEARCH, market_research)
+        return market_research_outputs(market_research)
+
+    # ============================================================
+    # STEP 3: Financial Data Analyst Agent
+    # ============================================================
+    async def stock_candidates_stage(client_profile, market_research, market_brief):
+        reporter.stage_started(STOCK_CANDIDATES)
+        logger.info("Step 3: Financial Data Analyst Agent")
+
+        resumed = resume(STOCK_CANDIDATES)
+        if resumed is not None:
+            return stock_candidates_outputs(resumed)
+
+        if use_stage_cache:
+            # Keyed on the research text too, so candidates always match the research they were picked from
+            cache_key = stage_cache_key(
+                STOCK_CANDIDATES, client_profile, agent_fingerprint((chief_risk_officer_agent,)), market_research,
+            )
+            cached = _cached_output(STOCK_CANDIDATES, cache_key)
+            if cached is not None:
+                stock_candidates, age = cached
+                logger.info("Reusing stock candidates for an equivalent profile (%.0f min old)", age / 60)
+                reporter.stage_reused(STOCK_CANDIDATES, age)
+                finish(STOCK_CANDIDATES, stock_candidates)
+                return stock_candidates_outputs(stock_candidates)
+
+        stock_analysis_prompt = handoff_prompt(
+            STOCK_CANDIDATES,
+            """
+                    Client Profile:
+                    {client_profile}
+
+                    Market Research Brief:
+                    {market_research}
+
+                    Based on the market research, select 5-7 stock candidates and perform quantitative analysis.
+                    """,
+            client_profile=profile_handoff(client_profile),
+            market_research=(market_research, market_brief.compact()),
+        )
+
+        stock_analysis_result = await stage_runner(STOCK_CANDIDATES)(
+            chief_risk_officer_agent,
+            stock_analysis_prompt,
+            max_turns=100  # Increased for multiple stock lookups
+        )
+        stock_candidates = stock_analysis_result.final_output
+        ledger.record_usage(STOCK_CANDIDATES, stock_analysis_result)
+
+        logger.debug("Stock candidates output:\n%s", stock_candidates, extra={'stage': STOCK_CANDIDATES})
+
+        if use_stage_cache:
+            _store_output(STOCK_CANDIDATES, cache_key, stock_candidates)
+
+        finish(STOCK_CANDIDATES, stock_candidates)
+        return stock_candidates_outputs(stock_candidates)
+
+    # Runs while the risk agent starts up, so its SEC searches find the filings already on disk
+    async def sec_prefetch_stage(candidate_tickers):
+        filings = await asyncio.to_thread(_prefetch_sec_filings, candidate_tickers)
+        return {'sec_prefetch': filings}
+
+    # ============================================================
+    # STEP 4: Risk Management Specialist Agent
+    # ============================================================
+    async def risk_assessment_stage(client_profile, stock_candidates, candidate_tickers, candidates):
+        reporter.stage_started(RISK_ASSESSMENT)
+        logger.info("Step 4: Risk Management Specialist Agent")
+
+        resumed = resume(RISK_ASSESSMENT)
+        if resumed is not None:
+            return {'risk_vetted_stocks': resumed, 'vetted_candidates': parse_candidate_rows(resumed)}
+
+        tickers = fanout_tickers(candidate_tickers)
+        if tickers:
+            # One bounded sub-run per ticker: latency follows the slowest ticker, not the sum
+            logger.info("Fanning out risk vetting across %d tickers: %s", len(tickers), ", ".join(tickers))
+            profile_text = compact_profile(client_profile) if COMPACT_HANDOFF else client_profile
+            risk_vetted_stocks = await run_risk_fanout(
+                profile_text, stock_candidates, tickers, stage_runner(RISK_ASSESSMENT),
+                ledger=ledger, stage=RISK_ASSESSMENT, full_profile=client_profile,
+            )
+        else:
+            risk_assessment_prompt = handoff_prompt(
+                RISK_ASSESSMENT,
+                """
+                    Client Profile:
+                    {client_profile}
+
+                    Stock Candidates:
+                    {stock_candidates}
+
+                    Perform comprehensive qualitative risk vetting on each stock candidate.
+                    Use SEC filings and web search to identify litigation, regulatory, and geopolitical risks.
+                    """,
+                client_profile=profile_handoff(client_profile),
+                stock_candidates=(stock_candidates, compact_rows(candidates, fallback=stock_candidates)),
+            )
+            risk_assessment_result = await stage_runner(RISK_ASSESSMENT)(
+                risk_management_specialist,
+                risk_assessment_prompt,
+                max_turns=100  # Increased for SEC filing searches per stock
+            )
+            risk_vetted_stocks = risk_assessment_result.final_output
+            ledger.record_usage(RISK_ASSESSMENT, risk_assessment_result)
+
+        logger.debug("Risk assessment output:\n%s", risk_vetted_stocks, extra={'stage': RISK_ASSESSMENT})
+
+        finish(RISK_ASSESSMENT, risk_vetted_stocks)
+        return {'risk_vetted_stocks': risk_vetted_stocks, 'vetted_candidates': parse_candidate_rows(risk_vetted_stocks)}
+
+    # Overlaps the strategist's first model turn, so its price lookups are cache hits
+    async def quote_prefetch_stage(risk_vetted_stocks):
+        tickers = extract_tickers(risk_vetted_stocks)
+        if tickers:
+            await asyncio.to_thread(_fetch_stock_fundamentals_batch_core, ",".join(tickers))
+        return {'quote_prefetch': len(tickers)}
+
+    # ============================================================
+    # STEP 5: Investment Strategist Agent
+    # ============================================================
+    async def portfolio_allocation_stage(client_profile, market_research, market_brief,
+                                         risk_vetted_stocks, vetted_candidates):
+        reporter.stage_started(PORTFOLIO_ALLOCATION)
+        logger.info("Step 5: Investment Strategist Agent")
+
+        resumed = resume(PORTFOLIO_ALLOCATION)
+        if resumed is not None:
+            return {'portfolio_allocation': resumed, 'allocation_plan': parse_allocation_plan(resumed)}
+
+        portfolio_allocation_prompt = handoff_prompt(
+            PORTFOLIO_ALLOCATION,
+            """
+                    Client Profile:
+                    {client_profile}
+
+                    Market Research:
+                    {market_research}
+
+                    Risk-Vetted Stock Candidates:
+                    {risk_vetted_stocks}
+
+                    Create a final portfolio allocation plan with exact percentages, investment amounts,
+                    and share calculations using current market prices.
+                    """,
+            client_profile=profile_handoff(client_profile),
+            market_research=(market_research, market_brief.compact()),
+            risk_vetted_stocks=(
+                risk_vetted_stocks,
+                compact_rows(vetted_candidates, ALLOCATION_HANDOFF_FIELDS, fallback=risk_vetted_stocks),
+            ),
+        )
+
+        portfolio_result = await stage_runner(PORTFOLIO_ALLOCATION)(
+            portfolio_manager_agent,
+            portfolio_allocation_prompt,
+            max_turns=60
+        )
+        portfolio_allocation = portfolio_result.final_output
+        ledger.record_usage(PORTFOLIO_ALLOCATION, portfolio_result)
+
+        logger.debug("Portfolio allocation output:\n%s", portfolio_allocation, extra={'stage': PORTFOLIO_ALLOCATION})
+
+        finish(PORTFOLIO_ALLOCATION, portfolio_allocation)
+        return {
+            'portfolio_allocation': portfolio_allocation,
+            'allocation_plan': parse_allocation_plan(portfolio_allocation),
+        }
+
+    # ============================================================
+    # STEP 6: Final Report Generator Agent
+    # ============================================================
+    async def final_report_stage(client_profile, market_research, market_brief, risk_vetted_stocks,
+                                 vetted_candidates, portfolio_allocation, allocation_plan):
+        reporter.stage_started(FINAL_REPORT)
+        logger.info("Step 6: Final Report Generator Agent")
+
+        resumed = resume(FINAL_REPORT)
+        if resumed is not None:
+            return {'final_report': resumed}
+
+        final_report_prompt = handoff_prompt(
+            FINAL_REPORT,
+            """
+                    Compile a professional, client-ready investment report using:
+
+                    Client Profile:
+                    {client_profile}
+
+                    Market Research Brief:
+                    {market_research}
+
+                    Risk Assessment:
+                    {risk_vetted_stocks}
+
+                    Portfolio Allocation:
+                    {portfolio_allocation}
+
+                    Generate a complete, polished report following all formatting requirements.
+                    """,
+            client_profile=profile_handoff(client_profile),
+            market_research=(market_research, market_brief.compact()),
+            risk_vetted_stocks=(
+                risk_vetted_stocks,
+                compact_rows(vetted_candidates, REPORT_HANDOFF_FIELDS, fallback=risk_vetted_stocks),
+            ),
+            portfolio_allocation=(portfolio_allocation, allocation_plan.compact()),
+        )
+
+        final_report_result = await stage_runner(FINAL_REPORT)(
+            final_report_agent,
+            final_report_prompt,
+            max_turns=30
+        )
+        final_report = final_report_result.final_output
+        ledger.record_usage(FINAL_REPORT, final_report_result)
+
+        logger.info("Final report generated")
+
+        finish(FINAL_REPORT, final_report)
+        return {'final_report': final_report}
+
+    return [
+        Stage(CLIENT_PROFILE, client_profile_stage, ('query',), ('client_profile',)),
+        Stage(MARKET_RESEARCH, market_research_stage, ('client_profile',), ('market_research', 'market_brief')),
+        Stage(STOCK_CANDIDATES, stock_candidates_stage,
+              ('client_profile', 'market_research', 'market_brief'),
+              ('stock_candidates', 'candidate_tickers', 'candidates')),
+        Stage(SEC_PREFETCH, sec_prefetch_stage, ('candidate_tickers',), ('sec_prefetch',), critical=False),
+        Stage(RISK_ASSESSMENT, risk_assessment_stage,
+              ('client_profile', 'stock_candidates', 'candidate_tickers', 'candidates'),
+              ('risk_vetted_stocks', 'vetted_candidates')),
+        Stage(QUOTE_PREFETCH, quote_prefetch_stage, ('risk_vetted_stocks',), ('quote_prefetch',), critical=False),
+        Stage(PORTFOLIO_ALLOCATION, portfolio_allocation_stage,
+              ('client_profile', 'market_research', 'market_brief', 'risk_vetted_stocks', 'vetted_candidates'),
+              ('portfolio_allocation', 'allocation_plan')),
+        Stage(FINAL_REPORT, final_report_stage,
+              ('client_profile', 'market_research', 'market_brief', 'risk_vetted_stocks', 'vetted_candidates',
+               'portfolio_allocation', 'allocation_plan'),
+              ('final_report',)),
+    ]
@@ -0,0 +1,58 @@
+from agents import RunHooks, Runner
+from openai.types.responses import ResponseTextDeltaEvent
+from typing import Any, Callable, Dict, Optional
+import os
+
+STREAM_AGENT_OUTPUT = os.getenv("STREAM_AGENT_OUTPUT", "true").lower() in ("1", "true", "yes")
+TOOL_ARGUMENT_PREVIEW = 80
+TOOL_OUTPUT_PREVIEW = 100
+
+
+def _preview(text: Any, limit: int) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+async def run_streamed(
+    agent,
+    prompt: str,
+    max_turns: int,
+    on_text: Optional[Callable[[str], None]] = None,
+    on_tool: Optional[Callable[[str], None]] = None,
+    hooks: Optional[RunHooks] = None,
+):
+    """
+    Runs an agent with Runner.run_streamed, forwarding output text deltas and tool calls/results as
+    they arrive. Falls back to Runner.run when STREAM_AGENT_OUTPUT is off.
+
+    Args:
+        agent: Agent to run.
+        prompt: Input for the run.
+        max_turns: Turn limit, as for Runner.run.
+        on_text: Called with each chunk of model output text.
+        on_tool: Called with a one-line description of each tool call and tool result.
+        hooks: SDK run hooks for the run (instrumentation).
+
+    Returns:
+        The finished run result (final_output and usage are available as with Runner.run).
+    """
+    if not STREAM_AGENT_OUTPUT:
+        return await Runner.run(agent, prompt, max_turns=max_turns, hooks=hooks)
+
+    result = Runner.run_streamed(agent, prompt, max_turns=max_turns, hooks=hooks)
+    tool_names: Dict[str, str] = {}
+    async for event in result.stream_events():
+        if event.type == "raw_response_event":
+            if on_text is not None and isinstance(event.data, ResponseTextDeltaEvent) and event.data.delta:
+                on_text(event.data.delta)
+        elif event.type == "run_item_stream_event" and on_tool is not None:
+            raw_item = getattr(event.item, 'raw_item', None)
+            if event.name == "tool_called":
+                name = getattr(raw_item, 'name', None) or type(raw_item).__name__
+                tool_names[getattr(raw_item, 'call_id', '')] = name
+                on_tool(f"🔧 {name}({_preview(getattr(raw_item, 'arguments', ''), TOOL_ARGUMENT_PREVIEW)})")
+            elif event.name == "tool_output":
+                call_id = raw_item.get('call_id', '') if isinstance(raw_item, dict) else getattr(raw_item, 'call_id', '')
+                name = tool_names.get(call_id, "tool")
+                on_tool(f"↳ {name}: {_preview(getattr(event.item, 'output', ''), TOOL_OUTPUT_PREVIEW)}")
+    return result
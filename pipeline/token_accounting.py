@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken not installed or encoding unavailable: estimate instead
+    _ENCODING = None
+
+# Average characters per token for English prose with GPT-4o tokenizers
+CHARS_PER_TOKEN = 4.0
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts prompt tokens with tiktoken when it is installed, otherwise estimates from length.
+    """
+    text = str(text or "")
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return int(round(len(text) / CHARS_PER_TOKEN))
+
+
+@dataclass
+class StageTokens:
+    stage: str
+    full_handoff: int = 0
+    compact_handoff: int = 0
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+    @property
+    def saved(self) -> int:
+        return self.full_handoff - self.compact_handoff
+
+
+class TokenLedger:
+    """
+    Per-stage token accounting for one pipeline run: the prompt size with the full free-text
+    hand-off, the size actually sent with the compact hand-off, and the model usage reported by the SDK.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageTokens] = {}
+
+    def _entry(self, stage: str) -> StageTokens:
+        if stage not in self.stages:
+            self.stages[stage] = StageTokens(stage)
+        return self.stages[stage]
+
+    def record_handoff(self, stage: str, full_prompt: str, compact_prompt: str) -> None:
+        entry = self._entry(stage)
+        entry.full_handoff += count_tokens(full_prompt)
+        entry.compact_handoff += count_tokens(compact_prompt)
+
+    def record_usage(self, stage: str, result) -> None:
+        """
+        Adds the input/output tokens of a Runner result (all turns, including tool calls).
+        """
+        usage = getattr(getattr(result, 'context_wrapper', None), 'usage', None)
+        if usage is None:
+            return
+        entry = self._entry(stage)
+        entry.input_tokens = (entry.input_tokens or 0) + usage.input_tokens
+        entry.output_tokens = (entry.output_tokens or 0) + usage.output_tokens
+
+    def report(self) -> List[StageTokens]:
+        return list(self.stages.values())
+
+    def format_report(self) -> str:
+        """
+        Markdown table of the per-stage hand-off savings and model usage.
+        """
+        def fmt(value):
+            return f"{value:,}" if value is not None else "—"
+
+        lines = [
+            "| Stage | Full Hand-off | Compact Hand-off | Saved | Saved (%) | Input Tokens | Output Tokens |",
+            "| :--- | ---: | ---: | ---: | ---: | ---: | ---: |",
+        ]
+        for entry in self.stages.values():
+            pct = 100.0 * entry.saved / entry.full_handoff if entry.full_handoff else 0.0
+            lines.append(
+                f"| {entry.stage} | {fmt(entry.full_handoff)} | {fmt(entry.compact_handoff)} | {fmt(entry.saved)} "
+                f"| {pct:.0f}% | {fmt(entry.input_tokens)} | {fmt(entry.output_tokens)} |"
+            )
+        full = sum(entry.full_handoff for entry in self.stages.values())
+        compact = sum(entry.compact_handoff for entry in self.stages.values())
+        pct = 100.0 * (full - compact) / full if full else 0.0
+        lines.append(f"| **Total** | {fmt(full)} | {fmt(compact)} | {fmt(full - compact)} | {pct:.0f}% | | |")
+        counter = "tiktoken o200k_base" if _ENCODING is not None else f"estimated at {CHARS_PER_TOKEN:g} chars/token"
+        lines.append(f"\nHand-off sizes are prompt tokens ({counter}); input/output tokens are SDK usage.")
+        return "\n".join(lines)
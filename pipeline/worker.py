@@ -0,0 +1,249 @@
+from dotenv import load_dotenv
+
+# Load environment variables first: pipeline and tool modules read their settings at import
+load_dotenv()
+
+from agents import trace
+from typing import Any, Dict, Optional, Tuple
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from pipeline.checkpoints import checkpoint_store
+from pipeline.dag import DagScheduler
+from pipeline.instrumentation import METRICS_PORT, RunTimeline, start_metrics_server
+from pipeline.jobs import JOB_HEARTBEAT_SECONDS, JOB_MAX_ATTEMPTS, Job, JobQueue, job_queue
+from pipeline.logs import configure_logging, run_context
+from pipeline.profile import extraction_stats
+from pipeline.stages import AGENT_STAGES, FINAL_REPORT, PipelineReporter, build_pipeline
+from pipeline.token_accounting import TokenLedger
+from tools.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+# Streamed text is written to the queue in batches rather than one row per token
+JOB_STREAM_FLUSH_SECONDS = float(os.getenv("JOB_STREAM_FLUSH_SECONDS", "0.5"))
+
+
+def _jsonable(output: Any) -> Any:
+    if hasattr(output, 'model_dump'):
+        return output.model_dump()
+    return output if isinstance(output, (str, int, float, bool, list, dict, type(None))) else str(output)
+
+
+class QueueReporter(PipelineReporter):
+    """
+    Records stage lifecycle events in the job queue for the UI to replay.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.pending: Dict[Tuple[str, str], str] = {}
+        self.last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        for (stage, label), text in pending.items():
+            self.queue.add_event(self.job_id, "stream", stage, {'text': text, 'label': label})
+        self.last_flush = time.monotonic()
+
+    def stage_started(self, stage: str) -> None:
+        self.queue.add_event(self.job_id, "started", stage)
+
+    def stage_completed(self, stage: str, output: Any) -> None:
+        self.flush()
+        self.queue.add_event(self.job_id, "completed", stage, {'output': _jsonable(output)})
+
+    def stage_reused(self, stage: str, age_seconds: float) -> None:
+        self.queue.add_event(self.job_id, "reused", stage, {'age_seconds': age_seconds})
+
+    def stage_resumed(self, stage: str) -> None:
+        self.queue.add_event(self.job_id, "resumed", stage)
+
+    def stage_stream(self, stage: str, text: str, label: str = "") -> None:
+        self.pending[(stage, label)] = self.pending.get((stage, label), "") + text
+        if time.monotonic() - self.last_flush >= JOB_STREAM_FLUSH_SECONDS:
+            self.flush()
+
+    def stage_tool_call(self, stage: str, description: str, label: str = "") -> None:
+        self.flush()
+        self.queue.add_event(self.job_id, "tool", stage, {'description': description, 'label': label})
+
+
+async def execute_job(job: Job, queue: JobQueue) -> Dict[str, Any]:
+    """
+    Runs the six-stage pipeline for a job, recording progress events in the queue. The job ID is
+    the checkpoint run ID, so a retried job resumes from its first incomplete stage.
+
+    Returns:
+        The job result: final report, timing summary, token accounting and the run timeline.
+    """
+    reporter = QueueReporter(queue, job.id)
+    ledger = TokenLedger()
+    timeline = RunTimeline(job.id)
+    try:
+        with trace("investment_analysis_trace"):
+            pipeline = build_pipeline(
+                reporter, use_stage_cache=job.options.get('use_stage_cache', True), ledger=ledger, run_id=job.id,
+                timeline=timeline,
+            )
+            result = await DagScheduler(pipeline, on_stage_finished=timeline.record_stage).run({'query': job.query})
+    finally:
+        reporter.flush()
+        _report_timeline(timeline)
+
+    logger.info("Analysis pipeline completed in %.1fs; critical path: %s",
+                result.wall_time, result.describe_critical_path())
+    for name, error in result.errors.items():
+        logger.warning(f"Background stage {name} failed: {error}")
+    for source, counters in single_flight.stats().items():
+        logger.info("Requests coalesced (%s): %d of %d", source, counters['coalesced'], counters['calls'])
+    profile_stats = extraction_stats()
+    logger.info("Profile fast path: %d of %d queries (%.0f%%)", profile_stats['fast_path'],
+                profile_stats['fast_path'] + profile_stats['llm_fallback'], 100 * profile_stats['fast_path_rate'])
+    logger.debug("Token accounting:\n%s", ledger.format_report())
+
+    return {
+        'final_report': result.values.get(FINAL_REPORT),
+        'wall_time': result.wall_time,
+        'critical_path': result.describe_critical_path(),
+        'errors': result.errors,
+        'token_report': ledger.format_report(),
+        'stages': [stage for stage in AGENT_STAGES if stage in result.timings],
+        'timeline': timeline.to_dict(),
+    }
+
+
+def _report_timeline(timeline: RunTimeline) -> None:
+    """
+    Prints where the run spent its time (slowest stage first) and saves the timeline file, if configured.
+    """
+    for row in timeline.stage_summary():
+        logger.info(
+            "Stage %s: %.1fs, %d agent runs, %d turns, %d/%d tokens, %d tool calls (%d failed)",
+            row['stage'], row.get('seconds', 0.0), row.get('agent_runs', 0), row.get('turns', 0),
+            row.get('input_tokens', 0), row.get('output_tokens', 0), row.get('tool_calls', 0), row.get('tool_errors', 0),
+            extra={'timing': row},
+        )
+    try:
+        path = timeline.save()
+    except OSError as e:
+        logger.warning(f"Could not save the run timeline: {e}")
+    else:
+        if path:
+            logger.info("Run timeline saved to %s", path)
+
+
+def _heartbeat_loop(queue: JobQueue, worker_id: str, state: dict, stop: threading.Event) -> None:
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            queue.heartbeat(worker_id, state.get('job_id'))
+        except Exception as e:
+            logger.warning(f"Heartbeat failed for {worker_id}: {e}")
+
+
+def work_loop(worker_id: str, queue: Optional[JobQueue] = None, max_jobs: Optional[int] = None) -> None:
+    """
+    Claims and runs jobs one at a time until stopped (or after max_jobs).
+    """
+    queue = queue or job_queue
+    state = {'job_id': None}
+    stop = threading.Event()
+    queue.heartbeat(worker_id)
+    heartbeat = threading.Thread(target=_heartbeat_loop, args=(queue, worker_id, state, stop), daemon=True)
+    heartbeat.start()
+    completed = 0
+    try:
+        while max_jobs is None or completed < max_jobs:
+            job = queue.claim(worker_id)
+            if job is None:
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+            state['job_id'] = job.id
+            # Every record logged while the job runs carries its ID; trace_logging turns on request tracing for it alone
+            with run_context(job.id, trace=job.options.get('trace_logging', False)):
+                logger.info("Running job (attempt %d): %s", job.attempts, job.query, extra={'worker': worker_id})
+                if job.attempts > 1:
+                    completed_stages = checkpoint_store.completed_stages(job.id)
+                    logger.info("Checkpointed stages: %s", ", ".join(completed_stages) or "none")
+                try:
+                    queue.complete(job.id, asyncio.run(execute_job(job, queue)))
+                    checkpoint_store.clear(job.id)
+                except Exception as e:
+                    logger.exception(f"Job failed: {e}", extra={'worker': worker_id})
+                    error = f"{type(e).__name__}: {e}"
+                    if job.attempts < JOB_MAX_ATTEMPTS:
+                        # Rate limits and flaky tools are usually transient; the retry only reruns the failed stage
+                        logger.info("Requeueing job to resume from its checkpoints")
+                        queue.requeue(job.id, error)
+                    else:
+                        queue.fail(job.id, error)
+                finally:
+                    state['job_id'] = None
+                    completed += 1
+    finally:
+        stop.set()
+        queue.unregister(worker_id)
+
+
+def _interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+def _worker_process(index: int) -> None:
+    # terminate() from the parent stops the worker the same way Ctrl+C does
+    signal.signal(signal.SIGTERM, _interrupt)
+    configure_logging()
+    if METRICS_PORT:
+        # Metrics live in each worker process, so every worker gets its own scrape target
+        try:
+            start_metrics_server(METRICS_PORT + index)
+            logger.info("Worker %d serving metrics on port %d", index, METRICS_PORT + index)
+        except OSError as e:
+            logger.warning(f"Worker {index} could not serve metrics on port {METRICS_PORT + index}: {e}")
+    try:
+        work_loop(f"{socket.gethostname()}-{os.getpid()}-{index}")
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run investment analysis workers for the job queue.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="Number of worker processes")
+    args = parser.parse_args()
+    configure_logging()
+
+    removed = job_queue.prune()
+    if removed:
+        logger.info("Pruned %d finished jobs", removed)
+    removed = checkpoint_store.prune()
+    if removed:
+        logger.info("Pruned %d stale checkpoints", removed)
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker_process, args=(index,)) for index in range(args.workers)]
+    for process in processes:
+        process.start()
+    logger.info("Started %d workers on %s", len(processes), job_queue.path)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Ctrl+C also reaches the workers; a second interrupt must not abandon the shutdown
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+from alpha_vantage.techindicators import TechIndicators
+from alpha_vantage.timeseries import TimeSeries
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+from tools.context_executor import ContextThreadPoolExecutor
+from tools.single_flight import single_flight
+
+# Free tier: 5 requests per minute (and 25 per day)
+AV_CALLS_PER_MINUTE = float(os.getenv("AV_CALLS_PER_MINUTE", "5"))
+AV_BURST = int(os.getenv("AV_BURST", "5"))
+# A caller that would have to wait longer than this for a token gets an error instead
+AV_MAX_WAIT_SECONDS = float(os.getenv("AV_MAX_WAIT_SECONDS", "75"))
+AV_QUOTE_TTL_SECONDS = float(os.getenv("AV_QUOTE_TTL_SECONDS", "60"))
+AV_INDICATOR_TTL_SECONDS = float(os.getenv("AV_INDICATOR_TTL_SECONDS", str(6 * 60 * 60)))
+MAX_QUOTE_WORKERS = 8
+# Bucket state shared by every worker process on this host, so the limit holds for the whole deployment
+AV_RATE_LIMIT_PATH = os.getenv("AV_RATE_LIMIT_PATH", "./.cache/alpha_vantage_rate_limit.json")
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process bucket
+    fcntl = None
+
+
+class RateLimitExceeded(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """
+    Token bucket that refills `rate_per_minute` tokens per minute up to `capacity`.
+
+    The bucket state lives in a file locked with flock, so every thread and worker process using the
+    same `path` draws from one budget. Without a path (or on platforms without fcntl) the bucket is
+    private to the process.
+
+    Args:
+        rate_per_minute: Refill rate.
+        capacity: Maximum burst.
+        path: State file shared across processes.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: int, path: Optional[str] = AV_RATE_LIMIT_PATH):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.path = path if fcntl is not None else None
+        self._state = {'tokens': float(capacity), 'updated': time.time()}
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    @contextmanager
+    def _shared_state(self) -> Iterator[dict]:
+        if not self.path:
+            yield self._state
+            return
+        with open(self.path, "a+") as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                try:
+                    state = json.loads(handle.read())
+                except ValueError:
+                    state = {'tokens': float(self.capacity), 'updated': time.time()}
+                yield state
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps(state))
+                handle.flush()
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def acquire(self, max_wait: float = AV_MAX_WAIT_SECONDS) -> float:
+        """
+        Takes one token, sleeping until one is available.
+
+        Returns:
+            Seconds spent waiting.
+
+        Raises:
+            RateLimitExceeded: If the wait would exceed max_wait.
+        """
+        with self._lock, self._shared_state() as state:
+            # Wall-clock time, since the state is shared between processes
+            now = time.time()
+            tokens = min(self.capacity, state['tokens'] + max(0.0, now - state['updated']) * self.rate)
+            wait = (1.0 - tokens) / self.rate if tokens < 1.0 else 0.0
+            if wait > max_wait:
+                raise RateLimitExceeded(
+                    f"Alpha Vantage rate limit reached ({AV_CALLS_PER_MINUTE:g} calls/minute); "
+                    f"next slot in {wait:.0f}s"
+                )
+            # The token is reserved now, so concurrent callers (in any process) queue behind it instead of racing
+            state['tokens'] = tokens - 1.0
+            state['updated'] = now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class AlphaVantageClient:
+    """
+    One Alpha Vantage client per process: cached quotes, single-flight requests and a rate limit shared
+    with every other worker process (see TokenBucket).
+
+    Args:
+        api_key: Alpha Vantage API key.
+        bucket: Rate limiter shared by every request this client makes.
+    """
+
+    def __init__(self, api_key: str, bucket: Optional[TokenBucket] = None):
+        self.api_key = api_key
+        self.bucket = bucket or TokenBucket(AV_CALLS_PER_MINUTE, AV_BURST)
+        self._time_series = TimeSeries(key=api_key, output_format='json')
+        self._indicators = TechIndicators(key=api_key, output_format='json')
+        self._cache: Dict[Tuple, Tuple[float, Any]] = {}
+        self._cache_lock = threading.Lock()
+        self._stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'throttle_wait_seconds': 0.0}
+
+    def _cached(self, key: Tuple, ttl: float) -> Tuple[bool, Any]:
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None and time.time() - cached[0] < ttl:
+                return True, cached[1]
+            return False, None
+
+    def _cached_call(self, key: Tuple, ttl: float, fn: Callable[[], Any]) -> Any:
+        hit, data = self._cached(key, ttl)
+        if hit:
+            with self._cache_lock:
+                self._stats['cache_hits'] += 1
+            return data
+
+        def fetch():
+            hit, data = self._cached(key, ttl)
+            if hit:
+                return data
+            waited = self.bucket.acquire()
+            data = fn()
+            with self._cache_lock:
+                self._stats['requests'] += 1
+                self._stats['throttle_wait_seconds'] += waited
+                self._cache[key] = (time.time(), data)
+            return data
+
+        data, shared = single_flight.do('alpha_vantage', (self.api_key, key), fetch)
+        if shared:
+            with self._cache_lock:
+                self._stats['coalesced'] += 1
+        return data
+
+    def quote(self, ticker: str) -> dict:
+        """
+        Returns the GLOBAL_QUOTE fields ('02. open', '03. high', '04. low', '05. price', '06. volume', ...).
+        One request per ticker per AV_QUOTE_TTL_SECONDS serves every quote field.
+        """
+        ticker = ticker.strip().upper()
+        return self._cached_call(
+            ('quote', ticker), AV_QUOTE_TTL_SECONDS,
+            lambda: self._time_series.get_quote_endpoint(symbol=ticker)[0],
+        )
+
+    def quotes(self, tickers: List[str]) -> List[Tuple[str, Optional[dict], Optional[Exception]]]:
+        """
+        Fetches quotes for several tickers concurrently; the token bucket paces the requests.
+
+        Returns:
+            One (ticker, quote, error) tuple per ticker, in input order.
+        """
+        def fetch(ticker):
+            try:
+                return ticker, self.quote(ticker), None
+            except Exception as e:
+                return ticker, None, e
+
+        if not tickers:
+            return []
+        with ContextThreadPoolExecutor(max_workers=min(MAX_QUOTE_WORKERS, len(tickers))) as pool:
+            return list(pool.map(fetch, tickers))
+
+    def sma(self, ticker: str, time_period: int = 50) -> dict:
+        ticker = ticker.strip().upper()
+        return self._cached_call(
+            ('sma', ticker, time_period), AV_INDICATOR_TTL_SECONDS,
+            lambda: self._indicators.get_sma(symbol=ticker, interval='daily', time_period=time_period, series_type='close')[0],
+        )
+
+    def rsi(self, ticker: str, time_period: int = 14) -> dict:
+        ticker = ticker.strip().upper()
+        return self._cached_call(
+            ('rsi', ticker, time_period), AV_INDICATOR_TTL_SECONDS,
+            lambda: self._indicators.get_rsi(symbol=ticker, interval='daily', time_period=time_period, series_type='close')[0],
+        )
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            return dict(self._stats)
+
+
+_clients: Dict[str, AlphaVantageClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_alpha_vantage_client(api_key: Optional[str] = None) -> AlphaVantageClient:
+    """
+    Returns the process-wide client for the key (AV_API_KEY by default), creating it on first use.
+    """
+    api_key = api_key or os.getenv("AV_API_KEY")
+    if not api_key:
+        raise ValueError("AV_API_KEY is not set in environment variables.")
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = AlphaVantageClient(api_key)
+            _clients[api_key] = client
+        return client
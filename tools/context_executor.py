@@ -0,0 +1,15 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+import contextvars
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor whose tasks run in a copy of the submitting thread's context, so context
+    variables such as the run ID attached to log records carry over into the pool threads.
+
+    Each task gets its own copy: a single context cannot be entered by two threads at once.
+    """
+
+    def submit(self, fn: Callable[..., Any], /, *args, **kwargs) -> Future:
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
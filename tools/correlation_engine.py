@@ -0,0 +1,205 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Pairs that traded together on fewer days than this get no correlation (NaN)
+MIN_OVERLAP_DAYS = 20
+EWM_HALFLIFE_DAYS = 63
+ROLLING_WINDOW_DAYS = 63
+HIGH_CORRELATION = 0.7
+
+
+@dataclass
+class ReturnMatrix:
+    """
+    Daily simple returns, one column per ticker. Days a ticker did not trade are NaN.
+    """
+    tickers: List[str]
+    dates: np.ndarray
+    values: np.ndarray
+
+
+@dataclass
+class CorrelationSummary:
+    mean: float
+    median: float
+    pairs: int
+    top_pairs: List[Tuple[str, str, float]]
+    clusters: List[List[str]]
+    uncorrelated: List[str]
+
+
+def returns_matrix(closes: pd.DataFrame) -> ReturnMatrix:
+    """
+    Converts an aligned close-price matrix into daily returns in one array operation.
+
+    Args:
+        closes: Close prices indexed by day, one column per ticker (NaN where a ticker has no bar).
+
+    Returns:
+        A ReturnMatrix with one row per day after the first.
+    """
+    prices = closes.to_numpy(dtype='f8')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = prices[1:] / prices[:-1] - 1.0
+    values[~np.isfinite(values)] = np.nan
+    return ReturnMatrix(list(closes.columns), closes.index.to_numpy()[1:], values)
+
+
+def _weighted_correlation(values: np.ndarray, weights: np.ndarray, min_overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairwise-complete (weighted) Pearson correlation for every column pair via a few matrix products.
+
+    Each pair uses only the days on which both tickers have a return, like pandas' DataFrame.corr,
+    but without the per-pair Python loop.
+    """
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    m = valid.astype('f8')
+    wx = x * weights[:, None]
+    wm = m * weights[:, None]
+
+    overlap = m.T @ m
+    weight = wm.T @ m
+    sum_x = wx.T @ m            # [i, j]: weighted sum of i's returns on days both i and j traded
+    sum_xx = (wx * x).T @ m
+    sum_xy = wx.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = weight * sum_xy - sum_x * sum_x.T
+        var_i = weight * sum_xx - sum_x ** 2
+        var_j = var_i.T
+        corr = cov / np.sqrt(var_i * var_j)
+    corr[(overlap < min_overlap) | ~np.isfinite(corr)] = np.nan
+    corr = np.clip(corr, -1.0, 1.0)
+    np.fill_diagonal(corr, 1.0)
+    return corr, overlap
+
+
+def correlation(returns: ReturnMatrix, min_overlap: int = MIN_OVERLAP_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Full-period correlation matrix.
+
+    Returns:
+        (correlation matrix, matrix of overlapping trading days per pair).
+    """
+    return _weighted_correlation(returns.values, np.ones(len(returns.values)), min_overlap)
+
+
+def ewm_correlation(returns: ReturnMatrix, halflife: float = EWM_HALFLIFE_DAYS,
+                    min_overlap: int = MIN_OVERLAP_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exponentially weighted correlation: a day `halflife` trading days ago counts half as much as today.
+    """
+    age = np.arange(len(returns.values))[::-1]
+    return _weighted_correlation(returns.values, 0.5 ** (age / halflife), min_overlap)
+
+
+def rolling_correlation(returns: ReturnMatrix, window: int = ROLLING_WINDOW_DAYS, step: Optional[int] = None,
+                        min_overlap: int = MIN_OVERLAP_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Correlation matrices over trailing windows.
+
+    Args:
+        returns: Daily returns.
+        window: Trading days per window.
+        step: Trading days between window ends (defaults to the window length).
+
+    Returns:
+        (end dates of each window, array of shape (windows, tickers, tickers)). The last window
+        always ends on the most recent day.
+    """
+    step = step or window
+    total = len(returns.values)
+    ends = list(range(total, window - 1, -step))[::-1] or [total]
+    weights = np.ones(window)
+    matrices = []
+    for end in ends:
+        chunk = returns.values[max(0, end - window):end]
+        matrices.append(_weighted_correlation(chunk, weights[-len(chunk):], min(min_overlap, len(chunk)))[0])
+    return returns.dates[[end - 1 for end in ends]], np.stack(matrices)
+
+
+def mean_off_diagonal(corr: np.ndarray) -> float:
+    """
+    Average correlation over distinct pairs. Perfectly correlated pairs are kept; only the diagonal is excluded.
+    """
+    upper = corr[np.triu_indices(len(corr), k=1)]
+    upper = upper[~np.isnan(upper)]
+    return float(upper.mean()) if upper.size else float('nan')
+
+
+def _threshold_clusters(corr: np.ndarray, tickers: List[str], threshold: float) -> List[List[str]]:
+    """
+    Groups tickers linked by a chain of pairs at or above the threshold (connected components).
+    """
+    parent = list(range(len(tickers)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows, cols = np.nonzero(np.triu(np.nan_to_num(corr, nan=-1.0) >= threshold, k=1))
+    for i, j in zip(rows, cols):
+        parent[find(i)] = find(j)
+
+    groups = {}
+    for i, ticker in enumerate(tickers):
+        groups.setdefault(find(i), []).append(ticker)
+    return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+
+def summarize(corr: np.ndarray, tickers: List[str], top: int = 5,
+              threshold: float = HIGH_CORRELATION) -> CorrelationSummary:
+    """
+    Condenses a correlation matrix of any size into a few numbers an agent can reason about.
+
+    Args:
+        corr: Correlation matrix.
+        tickers: Ticker for each row/column.
+        top: How many of the most-correlated pairs to list.
+        threshold: Correlation at which two tickers are put in the same cluster.
+    """
+    rows, cols = np.triu_indices(len(tickers), k=1)
+    upper = corr[rows, cols]
+    known = ~np.isnan(upper)
+    order = np.argsort(-upper[known])[:top]
+    known_rows, known_cols, known_values = rows[known], cols[known], upper[known]
+    top_pairs = [(tickers[known_rows[k]], tickers[known_cols[k]], float(known_values[k])) for k in order]
+    no_data = np.all(np.isnan(corr) | np.eye(len(tickers), dtype=bool), axis=1)
+
+    return CorrelationSummary(
+        mean=float(known_values.mean()) if known_values.size else float('nan'),
+        median=float(np.median(known_values)) if known_values.size else float('nan'),
+        pairs=int(known.sum()),
+        top_pairs=top_pairs,
+        clusters=_threshold_clusters(corr, tickers, threshold),
+        uncorrelated=[ticker for ticker, empty in zip(tickers, no_data) if empty and len(tickers) > 1],
+    )
+
+
+def format_matrix(corr: np.ndarray, tickers: List[str]) -> str:
+    """
+    Renders the matrix as the fixed-width text table the correlation tool has always returned.
+    """
+    header = "Ticker  | " + " | ".join(f"{t:6s}" for t in tickers)
+    cells = np.where(np.isnan(corr), "  n/a ", np.char.mod("%6.3f", np.nan_to_num(corr)))
+    lines = [header, "-" * len(header)]
+    lines += [f"{ticker:7s} | " + " | ".join(row) for ticker, row in zip(tickers, cells)]
+    return "\n".join(lines)
+
+
+def format_summary(summary: CorrelationSummary, threshold: float = HIGH_CORRELATION) -> str:
+    lines = [f"Pairs Measured: {summary.pairs}", f"Median Pair Correlation: {summary.median:.3f}"]
+    if summary.top_pairs:
+        lines.append("Most Correlated Pairs: " + ", ".join(f"{a}/{b} ({c:.2f})" for a, b, c in summary.top_pairs))
+    if summary.clusters:
+        lines.append(f"Clusters (ρ ≥ {threshold:.2f}): " + "; ".join(", ".join(group) for group in summary.clusters))
+    else:
+        lines.append(f"Clusters (ρ ≥ {threshold:.2f}): none")
+    if summary.uncorrelated:
+        lines.append(f"Insufficient Overlapping History: {', '.join(summary.uncorrelated)}")
+    return "\n".join(lines)
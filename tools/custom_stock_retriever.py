@@ -1,6 +1,67 @@
-import yfinance as yf
 from agents import function_tool
-from typing import Optional
+from typing import List, Optional, Tuple
+import os
+from tools.context_executor import ContextThreadPoolExecutor
+from tools.market_data_cache import get_ticker_info
+
+MAX_BATCH_TICKERS = 25
+BATCH_MAX_WORKERS = int(os.getenv("FUNDAMENTALS_BATCH_WORKERS", "8"))
+
+# Info fields read by each tool, so the shared cache can apply the right TTL
+FUNDAMENTAL_FIELDS = (
+    'currentPrice', 'regularMarketPrice', 'marketCap', 'trailingPE', 'forwardPE',
+    'beta', 'debtToEquity', 'dividendYield', 'sector',
+)
+METRIC_FIELDS = {
+    'fcf': ('freeCashflow', 'operatingCashflow'),
+    'growth': ('revenueGrowth', 'earningsGrowth'),
+    'profitability': ('profitMargins', 'operatingMargins', 'returnOnEquity'),
+}
+RISK_INDICATOR_FIELDS = (
+    'beta', 'fiftyTwoWeekHigh', 'fiftyTwoWeekLow', 'currentPrice',
+    'regularMarketPrice', 'recommendationKey', 'targetMeanPrice',
+)
+
+
+def _extract_stock_fundamentals(ticker: str) -> dict:
+    """
+    Fetches the fundamental fields for a ticker from the shared info cache and formats them for display.
+    Raises on network or lookup failure so callers can report the error in their own format.
+    """
+    info = get_ticker_info(ticker, FUNDAMENTAL_FIELDS)
+    
+    # Extract key metrics with fallbacks
+    price = info.get('currentPrice', info.get('regularMarketPrice', 'N/A'))
+    market_cap = info.get('marketCap', 'N/A')
+    pe_ratio = info.get('trailingPE', info.get('forwardPE', 'N/A'))
+    beta = info.get('beta', 'N/A')
+    debt_to_equity = info.get('debtToEquity', 'N/A')
+    dividend_yield = info.get('dividendYield', 'N/A')
+    sector = info.get('sector', 'N/A')
+    
+    # Format market cap for readability
+    if isinstance(market_cap, (int, float)):
+        # Use 'g' format specifier to handle very large numbers gracefully
+        market_cap_str = f"${market_cap:,.0f}" 
+    else:
+        market_cap_str = str(market_cap)
+    
+    # Format dividend yield as percentage
+    if isinstance(dividend_yield, (int, float)):
+        dividend_yield_str = f"{dividend_yield * 100:.2f}%"
+    else:
+        dividend_yield_str = str(dividend_yield)
+    
+    return {
+        'price': price,
+        'market_cap': market_cap,
+        'market_cap_str': market_cap_str,
+        'pe_ratio': pe_ratio,
+        'beta': beta,
+        'debt_to_equity': debt_to_equity,
+        'dividend_yield_str': dividend_yield_str,
+        'sector': sector,
+    }
 
 
 def _fetch_stock_fundamentals_core(ticker: str) -> str:
@@ -8,46 +69,98 @@ def _fetch_stock_fundamentals_core(ticker: str) -> str:
     Core logic to fetch and format comprehensive stock fundamentals using yfinance.
     """
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        
-        # Extract key metrics with fallbacks
-        price = info.get('currentPrice', info.get('regularMarketPrice', 'N/A'))
-        market_cap = info.get('marketCap', 'N/A')
-        pe_ratio = info.get('trailingPE', info.get('forwardPE', 'N/A'))
-        beta = info.get('beta', 'N/A')
-        debt_to_equity = info.get('debtToEquity', 'N/A')
-        dividend_yield = info.get('dividendYield', 'N/A')
-        sector = info.get('sector', 'N/A')
-        
-        # Format market cap for readability
-        if isinstance(market_cap, (int, float)):
-            # Use 'g' format specifier to handle very large numbers gracefully
-            market_cap_str = f"${market_cap:,.0f}" 
-        else:
-            market_cap_str = str(market_cap)
-        
-        # Format dividend yield as percentage
-        if isinstance(dividend_yield, (int, float)):
-            dividend_yield_str = f"{dividend_yield * 100:.2f}%"
-        else:
-            dividend_yield_str = str(dividend_yield)
+        data = _extract_stock_fundamentals(ticker)
         
         result = f"""
 Stock Fundamentals for {ticker}:
-- Current Price: ${price}
-- Market Cap: {market_cap_str}
-- P/E Ratio: {pe_ratio}
-- Beta: {beta}
-- Debt-to-Equity: {debt_to_equity}
-- Dividend Yield: {dividend_yield_str}
-- Sector: {sector}
+- Current Price: ${data['price']}
+- Market Cap: {data['market_cap_str']}
+- P/E Ratio: {data['pe_ratio']}
+- Beta: {data['beta']}
+- Debt-to-Equity: {data['debt_to_equity']}
+- Dividend Yield: {data['dividend_yield_str']}
+- Sector: {data['sector']}
 """
         return result.strip()
         
     except Exception as e:
         return f"ERROR: Could not retrieve data for ticker {ticker}. Reason: {e}"
 
+
+def _format_compact_number(value) -> str:
+    """
+    Abbreviates large dollar amounts (e.g., 2.91T, 845.2B) for compact tables.
+    """
+    if not isinstance(value, (int, float)):
+        return str(value)
+    for divisor, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= divisor:
+            return f"${value / divisor:,.2f}{suffix}"
+    return f"${value:,.0f}"
+
+
+def _format_metric(value, digits: int = 2) -> str:
+    return f"{value:.{digits}f}" if isinstance(value, (int, float)) else str(value)
+
+
+def _extract_stock_fundamentals_many(ticker_list: List[str]) -> List[Tuple[str, Optional[dict], Optional[Exception]]]:
+    """
+    Fetches fundamentals for several tickers concurrently.
+    
+    Returns:
+        One (ticker, data, error) tuple per ticker, in input order; exactly one of data/error is set.
+    """
+    def fetch(ticker):
+        try:
+            return ticker, _extract_stock_fundamentals(ticker), None
+        except Exception as e:
+            return ticker, None, e
+    
+    if not ticker_list:
+        return []
+    # Bounded pool: yfinance requests are I/O bound, but Yahoo throttles bursts
+    workers = min(BATCH_MAX_WORKERS, len(ticker_list))
+    with ContextThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fetch, ticker_list))
+
+
+def _fetch_stock_fundamentals_batch_core(tickers: str) -> str:
+    """
+    Core logic to fetch fundamentals for many tickers concurrently and format them as one Markdown table.
+    """
+    ticker_list = list(dict.fromkeys(t.strip().upper() for t in tickers.split(',') if t.strip()))
+    
+    if not ticker_list:
+        return "ERROR: Please provide at least 1 ticker separated by commas."
+    
+    if len(ticker_list) > MAX_BATCH_TICKERS:
+        return f"ERROR: Maximum {MAX_BATCH_TICKERS} tickers allowed per batch request."
+    
+    results = _extract_stock_fundamentals_many(ticker_list)
+    
+    lines = [
+        "| Ticker | Price ($) | Market Cap | P/E | Beta | D/E | Div Yield | Sector |",
+        "| :--- | ---: | ---: | ---: | ---: | ---: | ---: | :--- |",
+    ]
+    errors = []
+    for ticker, data, error in results:
+        if error is not None:
+            errors.append(f"{ticker} ({error})")
+            continue
+        lines.append(
+            f"| {ticker} | {_format_metric(data['price'])} | {_format_compact_number(data['market_cap'])} "
+            f"| {_format_metric(data['pe_ratio'], 1)} | {_format_metric(data['beta'])} "
+            f"| {_format_metric(data['debt_to_equity'], 1)} | {data['dividend_yield_str']} | {data['sector']} |"
+        )
+    
+    if len(errors) == len(ticker_list):
+        return f"ERROR: Could not retrieve data for any of the tickers: {', '.join(errors)}"
+    
+    result = f"Stock Fundamentals for {len(ticker_list) - len(errors)} tickers:\n\n" + "\n".join(lines)
+    if errors:
+        result += f"\n\nERROR: Could not retrieve data for: {', '.join(errors)}"
+    return result
+
 # --- TOOL 1: WRAPPER FOR AGENT USE ---
 @function_tool
 def get_stock_fundamentals(ticker: str) -> str:
@@ -65,6 +178,22 @@ def get_stock_fundamentals(ticker: str) -> str:
     return _fetch_stock_fundamentals_core(ticker)
 
 
+@function_tool
+def get_stock_fundamentals_batch(tickers: str) -> str:
+    """
+    Retrieves price, market cap, P/E ratio, beta, debt-to-equity, dividend yield and sector
+    for several stocks in ONE call, fetched concurrently and returned as a single table.
+    Prefer this over calling get_stock_fundamentals once per ticker.
+    
+    Args:
+        tickers: Comma-separated list of stock ticker symbols (e.g., 'AAPL,MSFT,NVDA,AVGO').
+    
+    Returns:
+        A Markdown table with one row per ticker, followed by any per-ticker errors.
+    """
+    return _fetch_stock_fundamentals_batch_core(tickers)
+
+
 # --- TOOL 2: CORRECTED FINANCIAL METRICS TOOL ---
 @function_tool
 def get_stock_financial_metrics(ticker: str, metric_type: str = "all") -> str:
@@ -80,12 +209,10 @@ def get_stock_financial_metrics(ticker: str, metric_type: str = "all") -> str:
         A formatted string with the requested financial metrics.
     """
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        
         metric_type = metric_type.lower()
         
         if metric_type in ["fcf", "cashflow", "free_cash_flow"]:
+            info = get_ticker_info(ticker, METRIC_FIELDS['fcf'])
             fcf = info.get('freeCashflow', 'N/A')
             operating_cf = info.get('operatingCashflow', 'N/A')
             
@@ -101,6 +228,7 @@ Cash Flow Metrics for {ticker}:
             return result.strip()
         
         elif metric_type in ["growth", "revenue_growth"]:
+            info = get_ticker_info(ticker, METRIC_FIELDS['growth'])
             revenue_growth = info.get('revenueGrowth', 'N/A')
             earnings_growth = info.get('earningsGrowth', 'N/A')
             
@@ -117,6 +245,7 @@ Growth Metrics for {ticker}:
             return result.strip()
         
         elif metric_type in ["profitability", "margins"]:
+            info = get_ticker_info(ticker, METRIC_FIELDS['profitability'])
             profit_margin = info.get('profitMargins', 'N/A')
             operating_margin = info.get('operatingMargins', 'N/A')
             roe = info.get('returnOnEquity', 'N/A')
@@ -157,8 +286,7 @@ def check_stock_risk_indicators(ticker: str) -> str:
         A formatted string with risk assessment data.
     """
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        info = get_ticker_info(ticker, RISK_INDICATOR_FIELDS)
         
         beta = info.get('beta', 'N/A')
         fifty_two_week_high = info.get('fiftyTwoWeekHigh', 'N/A')
@@ -0,0 +1,211 @@
+from agents import function_tool
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+from tools.correlation_engine import correlation, returns_matrix
+from tools.price_history_store import close_matrix
+
+MAX_UNIVERSE_TICKERS = 500
+# Tickers whose average pairwise correlation is at least this end up in the same cluster
+CLUSTER_CORRELATION = 0.5
+MAX_LISTED_CLUSTERS = 20
+MAX_LISTED_MEMBERS = 8
+
+
+@dataclass
+class Cluster:
+    members: List[str]
+    representative: str
+    intra_correlation: float
+
+
+def correlation_distance(corr: np.ndarray) -> np.ndarray:
+    """
+    Maps correlation to a metric distance, sqrt((1 - ρ) / 2): 0 for identical movers, 1 for opposite ones.
+    Pairs without enough overlapping history are treated as uncorrelated.
+    """
+    return np.sqrt(np.clip(0.5 * (1.0 - np.nan_to_num(corr, nan=0.0)), 0.0, 1.0))
+
+
+def average_linkage_labels(distance: np.ndarray, max_distance: float) -> np.ndarray:
+    """
+    Agglomerative clustering with average linkage, cut at `max_distance`.
+
+    Merges are applied with the Lance-Williams update on the whole distance row at once, and
+    merging stops at the cut (average linkage is monotone), so 500 tickers take well under a second.
+
+    Returns:
+        A cluster label per ticker (labels are indices of a member of the cluster).
+    """
+    n = len(distance)
+    work = distance.astype('f8', copy=True)
+    np.fill_diagonal(work, np.inf)
+    sizes = np.ones(n)
+    labels = np.arange(n)
+
+    for _ in range(n - 1):
+        flat = int(np.argmin(work))
+        i, j = divmod(flat, n)
+        if work[i, j] > max_distance:
+            break
+        merged = (sizes[i] * work[i] + sizes[j] * work[j]) / (sizes[i] + sizes[j])
+        work[i, :] = merged
+        work[:, i] = merged
+        work[i, i] = np.inf
+        work[j, :] = np.inf
+        work[:, j] = np.inf
+        sizes[i] += sizes[j]
+        labels[labels == j] = i
+    return labels
+
+
+def effective_number_of_bets(corr: np.ndarray, weights: Optional[np.ndarray] = None) -> float:
+    """
+    Exponential of the entropy of each principal component's share of portfolio variance.
+
+    Equals the number of holdings when they are uncorrelated and approaches 1 when they all
+    move together. Computed on the correlation matrix, so it measures co-movement rather than volatility.
+    """
+    n = len(corr)
+    weights = np.full(n, 1.0 / n) if weights is None else np.asarray(weights, dtype='f8')
+    matrix = np.nan_to_num(corr, nan=0.0)
+    matrix = (matrix + matrix.T) / 2.0
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    # Pairwise-complete matrices can be slightly indefinite; negative components carry no variance
+    eigenvalues = np.clip(eigenvalues, 0.0, None)
+    contributions = (eigenvectors.T @ weights) ** 2 * eigenvalues
+    total = contributions.sum()
+    if total <= 0:
+        return float('nan')
+    shares = contributions[contributions > 0] / total
+    return float(np.exp(-np.sum(shares * np.log(shares))))
+
+
+def cluster_universe(corr: np.ndarray, tickers: List[str], scores: Optional[Dict[str, float]] = None,
+                     min_correlation: float = CLUSTER_CORRELATION) -> List[Cluster]:
+    """
+    Groups tickers by correlation distance and picks one representative per cluster.
+
+    The representative is the member with the highest score when scores are given (e.g., risk
+    suitability); otherwise, and to break ties, the member most correlated with the rest of its
+    cluster, i.e. the best single proxy for it.
+
+    Returns:
+        Clusters, largest first.
+    """
+    scores = scores or {}
+    cut = float(np.sqrt(0.5 * (1.0 - min_correlation)))
+    labels = average_linkage_labels(correlation_distance(corr), cut)
+    filled = np.nan_to_num(corr, nan=0.0)
+
+    clusters = []
+    for label in np.unique(labels):
+        index = np.flatnonzero(labels == label)
+        block = filled[np.ix_(index, index)]
+        if len(index) > 1:
+            centrality = (block.sum(axis=1) - 1.0) / (len(index) - 1)
+            intra = float(block[np.triu_indices(len(index), k=1)].mean())
+        else:
+            centrality = np.ones(1)
+            intra = 1.0
+        ranked = sorted(
+            range(len(index)),
+            key=lambda k: (scores.get(tickers[index[k]], float('-inf')), centrality[k]),
+            reverse=True,
+        )
+        clusters.append(Cluster(
+            members=[tickers[k] for k in index],
+            representative=tickers[index[ranked[0]]],
+            intra_correlation=intra,
+        ))
+    return sorted(clusters, key=lambda cluster: len(cluster.members), reverse=True)
+
+
+def parse_scores(scores: str) -> Dict[str, float]:
+    """
+    Parses 'TICKER:value' pairs ('AAPL:3, MSFT:4.5') into {ticker: value}, skipping malformed entries.
+    """
+    parsed = {}
+    for item in (scores or "").split(','):
+        if ':' in item:
+            ticker, value = item.split(':', 1)
+            try:
+                parsed[ticker.strip().upper()] = float(value)
+            except ValueError:
+                continue
+    return parsed
+
+
+def _analyze_diversification_core(tickers: str, scores: str = "", period: str = "1y",
+                                  min_correlation: float = CLUSTER_CORRELATION) -> str:
+    ticker_list = list(dict.fromkeys(t.strip().upper() for t in tickers.split(',') if t.strip()))
+    if len(ticker_list) < 2:
+        return "ERROR: Please provide at least 2 tickers separated by commas."
+    if len(ticker_list) > MAX_UNIVERSE_TICKERS:
+        return f"ERROR: Maximum {MAX_UNIVERSE_TICKERS} tickers allowed for diversification analysis."
+
+    try:
+        closes = close_matrix(ticker_list, period)
+    except Exception as e:
+        return f"ERROR: Failed to load price history. Reason: {e}"
+    missing = [t for t in ticker_list if t not in closes.columns]
+    ticker_list = [t for t in ticker_list if t in closes.columns]
+    if len(ticker_list) < 2:
+        return f"ERROR: Could not retrieve data for: {', '.join(missing) or tickers}"
+
+    corr, _ = correlation(returns_matrix(closes[ticker_list]))
+    clusters = cluster_universe(corr, ticker_list, parse_scores(scores), min_correlation)
+    cluster_weights = np.array([len(cluster.members) for cluster in clusters]) / len(ticker_list)
+    representatives = [cluster.representative for cluster in clusters]
+    rep_index = [ticker_list.index(ticker) for ticker in representatives]
+
+    lines = [
+        f"Diversification Analysis ({period})",
+        f"- Tickers Analyzed: {len(ticker_list)}",
+        f"- Clusters (avg ρ ≥ {min_correlation:.2f}): {len(clusters)}",
+        f"- Effective Number of Bets (equal weight): {effective_number_of_bets(corr):.1f} of {len(ticker_list)}",
+        f"- Effective Number of Clusters (equal weight): {1.0 / np.sum(cluster_weights ** 2):.1f}",
+        f"- Effective Number of Bets (one per cluster): "
+        f"{effective_number_of_bets(corr[np.ix_(rep_index, rep_index)]):.1f} of {len(rep_index)}",
+        "",
+        "| Cluster | Size | Avg Intra-Cluster ρ | Representative | Members |",
+        "| :---: | ---: | :---: | :--- | :--- |",
+    ]
+    multi = [cluster for cluster in clusters if len(cluster.members) > 1]
+    for number, cluster in enumerate(multi[:MAX_LISTED_CLUSTERS], 1):
+        members = ", ".join(cluster.members[:MAX_LISTED_MEMBERS])
+        if len(cluster.members) > MAX_LISTED_MEMBERS:
+            members += f" (+{len(cluster.members) - MAX_LISTED_MEMBERS} more)"
+        lines.append(f"| {number} | {len(cluster.members)} | {cluster.intra_correlation:.2f} | {cluster.representative} | {members} |")
+    if len(multi) > MAX_LISTED_CLUSTERS:
+        lines.append(f"\n{len(multi) - MAX_LISTED_CLUSTERS} smaller clusters not shown.")
+
+    singletons = [cluster.representative for cluster in clusters if len(cluster.members) == 1]
+    if singletons:
+        shown = ", ".join(singletons[:30]) + (f" (+{len(singletons) - 30} more)" if len(singletons) > 30 else "")
+        lines.append(f"\nIndependent Names ({len(singletons)}): {shown}")
+    lines.append(f"\nSuggested Diversified Shortlist (one per cluster): {', '.join(representatives[:MAX_LISTED_CLUSTERS])}")
+    if missing:
+        lines.append(f"No Price Data: {', '.join(missing)}")
+    return "\n".join(lines)
+
+
+@function_tool
+def analyze_portfolio_diversification(tickers: str, scores: str = "", period: str = "1y") -> str:
+    """
+    Clusters a candidate universe by return correlation, picks one representative per cluster,
+    and scores how many independent bets the names really represent.
+
+    Args:
+        tickers: Comma-separated ticker symbols, up to 500 (e.g., 'AAPL,MSFT,NVDA,KO,PG,XOM').
+        scores: Optional comma-separated 'TICKER:score' pairs used to pick each cluster's representative,
+                highest first (e.g., risk suitability scores 'AAPL:9,MSFT:8').
+        period: Historical period for the correlations. Options: '1mo', '3mo', '6mo', '1y', '2y', '3y', '5y'. Default is '1y'.
+
+    Returns:
+        Effective number of bets, a cluster table with representatives, and a diversified shortlist.
+    """
+    try:
+        return _analyze_diversification_core(tickers, scores, period)
+    except Exception as e:
+        return f"ERROR: Failed to analyze diversification. Reason: {e}"
@@ -1,7 +1,43 @@
-from alpha_vantage.timeseries import TimeSeries
-from alpha_vantage.techindicators import TechIndicators
+import logging
 import os
+import re
 from agents import function_tool
+from tools.alpha_vantage_client import get_alpha_vantage_client
+from tools.price_history_store import get_price_history
+from tools.technical_indicators import IndicatorRequest, compute_indicators, history_start
+
+logger = logging.getLogger(__name__)
+
+# data_point aliases -> (GLOBAL_QUOTE field, label, dollar amount?)
+QUOTE_FIELDS = {
+    ('price', 'close', 'latest_price', 'current_price'): ('05. price', 'Latest closing price', True),
+    ('open', 'open_price'): ('02. open', 'Opening price', True),
+    ('volume', 'trading_volume'): ('06. volume', 'Trading volume', False),
+    ('high', 'day_high'): ('03. high', 'Day high', True),
+    ('low', 'day_low'): ('04. low', 'Day low', True),
+}
+
+
+def _local_indicator(ticker: str, kind: str, window: int) -> str:
+    """
+    Computes the latest SMA/RSI from locally stored daily bars; raises if no history is available.
+    """
+    request = IndicatorRequest(kind, (float(window),))
+    bars = get_price_history(ticker.strip().upper(), history_start([request]))
+    if not len(bars):
+        raise ValueError("no price history")
+    value = compute_indicators(bars, [request])[request.columns[0]]
+    if value != value:
+        raise ValueError(f"not enough history for a {window}-day {kind.upper()}")
+    return f"{value:.4f}"
+
+
+def _quote_field(data_point_lower: str):
+    for aliases, field in QUOTE_FIELDS.items():
+        if data_point_lower in aliases:
+            return field
+    return None
+
 
 @function_tool
 def get_supplementary_financial_data(ticker: str, data_point: str) -> str:
@@ -9,7 +45,8 @@ def get_supplementary_financial_data(ticker: str, data_point: str) -> str:
     Retrieves specific supplementary financial data points like current price, volume, or technical indicators using Alpha Vantage.
     
     Args:
-        ticker: The stock ticker symbol (e.g., 'PG', 'UNH') to retrieve data for.
+        ticker: The stock ticker symbol (e.g., 'PG', 'UNH') to retrieve data for. Quote data points
+                ('price', 'open', 'high', 'low', 'volume') also accept several comma-separated tickers (e.g., 'PG,KO').
         data_point: The specific data point to retrieve (e.g., 'price', 'volume', '50day SMA').
     
     Returns:
@@ -20,8 +57,7 @@ def get_supplementary_financial_data(ticker: str, data_point: str) -> str:
         return "ERROR: AV_API_KEY is not set in environment variables."
 
     try:
-        ts = TimeSeries(key=os.getenv("AV_API_KEY"), output_format='json')
-        ti = TechIndicators(key=os.getenv("AV_API_KEY"), output_format='json')
+        client = get_alpha_vantage_client()
     except Exception as e:
         return f"ERROR: Alpha Vantage API initialization failed. {e}"
 
@@ -29,72 +65,59 @@ def get_supplementary_financial_data(ticker: str, data_point: str) -> str:
     
     try:
         # Handle different data point requests
-        if data_point_lower in ["price", "close", "latest_price", "current_price"]:
-            data, _ = ts.get_quote_endpoint(symbol=ticker)
-            if not data:
-                return f"ERROR: Could not find quote data for ticker {ticker}."
+        quote_field = _quote_field(data_point_lower)
+        if quote_field is not None:
+            key, label, is_dollar = quote_field
+            tickers = list(dict.fromkeys(t.strip().upper() for t in ticker.split(',') if t.strip()))
             
-            value = data.get('05. price', 'N/A')
-            return f"Latest closing price for {ticker}: ${value}"
-        
-        elif data_point_lower in ["open", "open_price"]:
-            data, _ = ts.get_quote_endpoint(symbol=ticker)
-            if not data:
-                return f"ERROR: Could not find quote data for ticker {ticker}."
-            
-            value = data.get('02. open', 'N/A')
-            return f"Opening price for {ticker}: ${value}"
-        
-        elif data_point_lower in ["volume", "trading_volume"]:
-            data, _ = ts.get_quote_endpoint(symbol=ticker)
-            if not data:
-                return f"ERROR: Could not find quote data for ticker {ticker}."
-            
-            value = data.get('06. volume', 'N/A')
-            return f"Trading volume for {ticker}: {value}"
-        
-        elif data_point_lower in ["high", "day_high"]:
-            data, _ = ts.get_quote_endpoint(symbol=ticker)
-            if not data:
-                return f"ERROR: Could not find quote data for ticker {ticker}."
-            
-            value = data.get('03. high', 'N/A')
-            return f"Day high for {ticker}: ${value}"
-        
-        elif data_point_lower in ["low", "day_low"]:
-            data, _ = ts.get_quote_endpoint(symbol=ticker)
-            if not data:
-                return f"ERROR: Could not find quote data for ticker {ticker}."
-            
-            value = data.get('04. low', 'N/A')
-            return f"Day low for {ticker}: ${value}"
+            # One cached GLOBAL_QUOTE per ticker serves price, open, high, low and volume
+            lines = []
+            for symbol, data, error in client.quotes(tickers):
+                if error is not None:
+                    lines.append(f"API ERROR: Failed to retrieve '{data_point}' for {symbol}. Reason: {error}")
+                elif not data:
+                    lines.append(f"ERROR: Could not find quote data for ticker {symbol}.")
+                else:
+                    value = data.get(key, 'N/A')
+                    lines.append(f"{label} for {symbol}: {'$' if is_dollar else ''}{value}")
+            return "\n".join(lines)
             
         elif "sma" in data_point_lower or "moving_average" in data_point_lower:
-            data, _ = ti.get_sma(symbol=ticker, interval='daily', time_period=50, series_type='close')
-            
-            if not data or 'Technical Analysis: SMA' not in data:
-                return f"ERROR: Could not retrieve SMA data for ticker {ticker}."
-            
-            latest_timestamp = next(iter(data['Technical Analysis: SMA']))
-            sma_value = data['Technical Analysis: SMA'][latest_timestamp]['SMA']
+            window = int(re.search(r"\d+", data_point_lower).group()) if re.search(r"\d+", data_point_lower) else 50
+            try:
+                sma_value = _local_indicator(ticker, 'sma', window)
+            except Exception as e:
+                logger.warning(f"Local SMA unavailable for {ticker}, using Alpha Vantage: {e}")
+                data = client.sma(ticker, time_period=window)
+                
+                if not data or 'Technical Analysis: SMA' not in data:
+                    return f"ERROR: Could not retrieve SMA data for ticker {ticker}."
+                
+                latest_timestamp = next(iter(data['Technical Analysis: SMA']))
+                sma_value = data['Technical Analysis: SMA'][latest_timestamp]['SMA']
             
-            return f"The 50-day Simple Moving Average (SMA) for {ticker} is: ${sma_value}"
+            return f"The {window}-day Simple Moving Average (SMA) for {ticker} is: ${sma_value}"
         
         elif "rsi" in data_point_lower:
-            data, _ = ti.get_rsi(symbol=ticker, interval='daily', time_period=14, series_type='close')
-            
-            if not data or 'Technical Analysis: RSI' not in data:
-                return f"ERROR: Could not retrieve RSI data for ticker {ticker}."
-            
-            latest_timestamp = next(iter(data['Technical Analysis: RSI']))
-            rsi_value = data['Technical Analysis: RSI'][latest_timestamp]['RSI']
+            window = int(re.search(r"\d+", data_point_lower).group()) if re.search(r"\d+", data_point_lower) else 14
+            try:
+                rsi_value = _local_indicator(ticker, 'rsi', window)
+            except Exception as e:
+                logger.warning(f"Local RSI unavailable for {ticker}, using Alpha Vantage: {e}")
+                data = client.rsi(ticker, time_period=window)
+                
+                if not data or 'Technical Analysis: RSI' not in data:
+                    return f"ERROR: Could not retrieve RSI data for ticker {ticker}."
+                
+                latest_timestamp = next(iter(data['Technical Analysis: RSI']))
+                rsi_value = data['Technical Analysis: RSI'][latest_timestamp]['RSI']
             
-            return f"The 14-day Relative Strength Index (RSI) for {ticker} is: {rsi_value}"
+            return f"The {window}-day Relative Strength Index (RSI) for {ticker} is: {rsi_value}"
             
         else:
             return (f"Data point '{data_point}' is not recognized. "
-                   f"Available options: 'price', 'open', 'high', 'low', 'volume', '50day SMA', 'RSI'. "
+                   f"Available options: 'price', 'open', 'high', 'low', 'volume', '50day SMA' (any window), 'RSI'. "
                    f"Please specify one of these for ticker {ticker}.")
 
     except Exception as e:
-        return f"API ERROR: Failed to retrieve '{data_point}' for {ticker}. Reason: {e}"
\ No newline at end of file
+        return f"API ERROR: Failed to retrieve '{data_point}' for {ticker}. Reason: {e}"
@@ -0,0 +1,54 @@
+from googleapiclient.discovery import build
+from typing import Any, Dict, Tuple
+import httplib2
+import os
+import threading
+
+GOOGLE_API_TIMEOUT = float(os.getenv("GOOGLE_API_TIMEOUT", "15"))
+GOOGLE_API_RETRIES = int(os.getenv("GOOGLE_API_RETRIES", "1"))
+
+_services: Dict[Tuple[str, str, str], Any] = {}
+_services_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_google_service(api: str, version: str, api_key: str):
+    """
+    Returns a shared client for a Google API, building it on first use.
+
+    The client is built from the discovery document bundled with google-api-python-client,
+    so no discovery fetch happens at startup in any process.
+
+    Args:
+        api: API name (e.g., 'customsearch').
+        version: API version (e.g., 'v1').
+        api_key: Developer key the client is bound to.
+
+    Returns:
+        A googleapiclient Resource. Its requests must be sent with execute_google_request.
+    """
+    key = (api, version, api_key)
+    service = _services.get(key)
+    if service is None:
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                service = build(api, version, developerKey=api_key, static_discovery=True, cache_discovery=False)
+                _services[key] = service
+    return service
+
+
+def _thread_http() -> httplib2.Http:
+    # httplib2.Http is not thread-safe, so each thread keeps its own keep-alive connection pool
+    http = getattr(_local, 'http', None)
+    if http is None:
+        http = httplib2.Http(timeout=GOOGLE_API_TIMEOUT)
+        _local.http = http
+    return http
+
+
+def execute_google_request(request) -> dict:
+    """
+    Sends a request built from a shared client over the calling thread's persistent connection.
+    """
+    return request.execute(http=_thread_http(), num_retries=GOOGLE_API_RETRIES)
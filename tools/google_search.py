@@ -1,10 +1,15 @@
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import logging
 import os
 from agents import function_tool
+from tools.google_client import execute_google_request, get_google_service
+from tools.search_cache import search_cache
+
+logger = logging.getLogger(__name__)
 
 CUSTOM_SEARCH_ENGINE_ID = "42389273c2ea947a1" 
 
+
 @function_tool
 def general_web_search(query: str) -> str:
     """
@@ -21,20 +26,39 @@ def general_web_search(query: str) -> str:
         return "ERROR: GOOGLE_API_KEY is not set in environment variables."
         
     try:
-        service = build("customsearch", "v1", developerKey=api_key)
-        result = service.cse().list(
-            q=query,
-            cx=CUSTOM_SEARCH_ENGINE_ID,
-            num=5  
-        ).execute()
-    
-    except HttpError as e:
-        return f"ERROR: Google Search API returned an HTTP error. Check daily quota. Error: {e}"
+        items = search_cache.get(query)
     except Exception as e:
-        return f"ERROR: An unexpected error occurred during search execution: {e}"
+        logger.warning(f"Search cache unavailable: {e}")
+        items = None
+    
+    if items is not None:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Search cache hit for '{query}' ({search_cache.stats()['quota_saved']} Google CSE queries saved so far)")
+    else:
+        try:
+            service = get_google_service("customsearch", "v1", api_key)
+            result = execute_google_request(service.cse().list(
+                q=query,
+                cx=CUSTOM_SEARCH_ENGINE_ID,
+                num=5  
+            ))
+        
+        except HttpError as e:
+            return f"ERROR: Google Search API returned an HTTP error. Check daily quota. Error: {e}"
+        except Exception as e:
+            return f"ERROR: An unexpected error occurred during search execution: {e}"
+        
+        # Only the fields we format are cached
+        items = [
+            {'title': item.get('title', 'No Title'), 'snippet': item.get('snippet', 'No Snippet')}
+            for item in result.get('items', [])
+        ]
+        try:
+            search_cache.put(query, items)
+        except Exception as e:
+            logger.warning(f"Could not cache search results: {e}")
 
     search_results_markdown = ""
-    items = result.get('items', [])
     
     if not items:
         return f"Search for '{query}' returned no relevant results."
@@ -1,5 +1,14 @@
-import yfinance as yf
 from agents import function_tool
+from tools.correlation_engine import (
+    EWM_HALFLIFE_DAYS, HIGH_CORRELATION, MIN_OVERLAP_DAYS, ROLLING_WINDOW_DAYS,
+    correlation, ewm_correlation, format_matrix, format_summary, mean_off_diagonal,
+    returns_matrix, rolling_correlation, summarize,
+)
+from tools.price_history_store import close_matrix
+
+MAX_CORRELATION_TICKERS = 500
+# Larger portfolios get the summary only, so the agent prompt stays small
+MATRIX_DISPLAY_LIMIT = 12
 
 @function_tool
 def calculate_historical_correlation(ticker_1: str, ticker_2: str, period: str = "1y") -> str:
@@ -16,30 +25,34 @@ def calculate_historical_correlation(ticker_1: str, ticker_2: str, period: str =
         A formatted string with the correlation coefficient and diversification assessment.
     """
     try:
-        data = yf.download([ticker_1, ticker_2], period=period, progress=False)
+        ticker_1 = ticker_1.strip().upper()
+        ticker_2 = ticker_2.strip().upper()
+        closes = close_matrix([ticker_1, ticker_2], period)
         
-        if data.empty:
+        if closes.empty:
             return f"ERROR: Could not retrieve data for {ticker_1} and/or {ticker_2} over period {period}."
         
-        returns = data['Close'].pct_change().dropna()
-        
-        if ticker_1 not in returns.columns or ticker_2 not in returns.columns:
+        if ticker_1 not in closes.columns or ticker_2 not in closes.columns:
             return f"ERROR: Could not retrieve sufficient data for one or both tickers ({ticker_1}, {ticker_2}) over the period {period}."
         
-        if returns.empty or len(returns) < 20:
-            return f"ERROR: Insufficient data points for correlation calculation. Need at least 20 trading days, got {len(returns)}."
+        returns = returns_matrix(closes[[ticker_1, ticker_2]])
+        corr_matrix, overlap = correlation(returns)
+        data_points = int(overlap[0, 1])
+        
+        if data_points < MIN_OVERLAP_DAYS:
+            return f"ERROR: Insufficient data points for correlation calculation. Need at least {MIN_OVERLAP_DAYS} trading days, got {data_points}."
         
-        correlation = returns.corr().loc[ticker_1, ticker_2]
+        correlation_value = corr_matrix[0, 1]
         
-        if correlation < 0:
+        if correlation_value < 0:
             interpretation = "EXCELLENT diversification (negative correlation - moves in opposite directions)"
-        elif correlation < 0.3:
+        elif correlation_value < 0.3:
             interpretation = "VERY GOOD diversification (low positive correlation)"
-        elif correlation < 0.5:
+        elif correlation_value < 0.5:
             interpretation = "GOOD diversification (moderate-low correlation)"
-        elif correlation < 0.7:
+        elif correlation_value < 0.7:
             interpretation = "FAIR diversification (moderate correlation)"
-        elif correlation < 0.85:
+        elif correlation_value < 0.85:
             interpretation = "LIMITED diversification (high correlation)"
         else:
             interpretation = "POOR diversification (very high correlation - moves almost identically)"
@@ -47,68 +60,81 @@ def calculate_historical_correlation(ticker_1: str, ticker_2: str, period: str =
         return f"""Historical Correlation Analysis:
 - Tickers: {ticker_1} vs {ticker_2}
 - Period: {period}
-- Correlation Coefficient (ρ): {correlation:.3f}
-- Data Points: {len(returns)} trading days
+- Correlation Coefficient (ρ): {correlation_value:.3f}
+- Data Points: {data_points} trading days
 - Diversification Assessment: {interpretation}
 
-Interpretation: A correlation of {correlation:.3f} means the stocks move {"together" if correlation > 0.5 else "somewhat independently"}. {"Consider these for portfolio diversification." if correlation < 0.7 else "These stocks may provide limited diversification benefits."}"""
+Interpretation: A correlation of {correlation_value:.3f} means the stocks move {"together" if correlation_value > 0.5 else "somewhat independently"}. {"Consider these for portfolio diversification." if correlation_value < 0.7 else "These stocks may provide limited diversification benefits."}"""
     
     except Exception as e:
         return f"ERROR: Failed to calculate correlation for {ticker_1} and {ticker_2}. Reason: {e}"
 
 
 @function_tool
-def calculate_portfolio_correlation_matrix(tickers: str, period: str = "1y") -> str:
+def calculate_portfolio_correlation_matrix(tickers: str, period: str = "1y", method: str = "standard") -> str:
     """
     Calculate a correlation matrix for multiple stocks to assess overall portfolio diversification.
     
     Args:
         tickers: Comma-separated list of stock ticker symbols (e.g., 'AAPL,MSFT,GOOGL,TSLA').
         period: The historical period for calculation. Options: '1mo', '3mo', '6mo', '1y', '2y', '3y', '5y'. Default is '1y'.
+        method: 'standard' (equal weight over the period), 'ewm' (recent days weighted more, 63-day half-life),
+                or 'rolling' (latest 63-day window plus how average correlation moved across windows). Default is 'standard'.
     
     Returns:
-        A formatted correlation matrix showing relationships between all stock pairs.
+        A correlation summary (average, most-correlated pairs, clusters) plus the full matrix for small portfolios.
     """
     try:
-        ticker_list = [t.strip().upper() for t in tickers.split(',')]
+        ticker_list = list(dict.fromkeys(t.strip().upper() for t in tickers.split(',') if t.strip()))
         
         if len(ticker_list) < 2:
             return "ERROR: Please provide at least 2 tickers separated by commas."
         
-        if len(ticker_list) > 10:
-            return "ERROR: Maximum 10 tickers allowed for correlation matrix calculation."
+        if len(ticker_list) > MAX_CORRELATION_TICKERS:
+            return f"ERROR: Maximum {MAX_CORRELATION_TICKERS} tickers allowed for correlation matrix calculation."
         
-        data = yf.download(ticker_list, period=period, progress=False)
+        if method not in ("standard", "ewm", "rolling"):
+            return f"ERROR: Unknown method '{method}'. Options: 'standard', 'ewm', 'rolling'."
         
-        if data.empty:
-            return f"ERROR: Could not retrieve data for the provided tickers over period {period}."
+        closes = close_matrix(ticker_list, period)
         
-        returns = data['Close'].pct_change().dropna()
+        if closes.empty:
+            return f"ERROR: Could not retrieve data for the provided tickers over period {period}."
         
-        missing_tickers = [t for t in ticker_list if t not in returns.columns]
-        if missing_tickers:
+        missing_tickers = [t for t in ticker_list if t not in closes.columns]
+        if len(ticker_list) - len(missing_tickers) < 2:
             return f"ERROR: Could not retrieve data for: {', '.join(missing_tickers)}"
         
-        if len(returns) < 20:
-            return f"ERROR: Insufficient data points. Need at least 20 trading days, got {len(returns)}."
-        
-        corr_matrix = returns.corr()
+        ticker_list = [t for t in ticker_list if t in closes.columns]
+        returns = returns_matrix(closes[ticker_list])
+        
+        if len(returns.values) < MIN_OVERLAP_DAYS:
+            return f"ERROR: Insufficient data points. Need at least {MIN_OVERLAP_DAYS} trading days, got {len(returns.values)}."
+        
+        trend = ""
+        if method == "ewm":
+            corr_matrix, _ = ewm_correlation(returns)
+            label = f"EWM, {EWM_HALFLIFE_DAYS}-day half-life"
+        elif method == "rolling":
+            window_ends, windows = rolling_correlation(returns)
+            corr_matrix = windows[-1]
+            label = f"latest {ROLLING_WINDOW_DAYS}-day window"
+            trend = "\nAverage Correlation by Window: " + ", ".join(
+                f"{str(end)[:10]}: {mean_off_diagonal(window):.2f}" for end, window in zip(window_ends, windows)
+            )
+        else:
+            corr_matrix, _ = correlation(returns)
+            label = period
         
-        result = f"""Portfolio Correlation Matrix ({period})
-Data Points: {len(returns)} trading days
+        result = f"""Portfolio Correlation Matrix ({label})
+Tickers: {len(ticker_list)}
+Data Points: {len(returns.values)} trading days
 """
         
-        # Create header row
-        header = "Ticker  | " + " | ".join([f"{t:6s}" for t in ticker_list])
-        separator = "-" * len(header)
-        result += f"\n{header}\n{separator}\n"
-        
-        for ticker in ticker_list:
-            row = f"{ticker:7s} | "
-            row += " | ".join([f"{corr_matrix.loc[ticker, t]:6.3f}" for t in ticker_list])
-            result += row + "\n"
+        if len(ticker_list) <= MATRIX_DISPLAY_LIMIT:
+            result += f"\n{format_matrix(corr_matrix, ticker_list)}\n"
         
-        avg_corr = corr_matrix.values[corr_matrix.values != 1.0].mean()
+        avg_corr = mean_off_diagonal(corr_matrix)
         result += f"\n📊 Average Correlation: {avg_corr:.3f}"
         
         if avg_corr < 0.3:
@@ -120,7 +146,11 @@ Data Points: {len(returns)} trading days
         else:
             result += "\n❌ LIMITED portfolio diversification - consider more diverse holdings"
         
+        result += f"\n\n{format_summary(summarize(corr_matrix, ticker_list), HIGH_CORRELATION)}{trend}"
+        if missing_tickers:
+            result += f"\nNo Price Data: {', '.join(missing_tickers)}"
+        
         return result
     
     except Exception as e:
-        return f"ERROR: Failed to calculate correlation matrix. Reason: {e}"
\ No newline at end of file
+        return f"ERROR: Failed to calculate correlation matrix. Reason: {e}"
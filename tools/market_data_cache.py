@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+import yfinance as yf
+
+from tools.single_flight import single_flight
+
+
+# --- FIELD FRESHNESS CLASSES ---
+# One `Ticker.info` round trip returns every field at once, so an entry is
+# considered fresh for a request when its age is below the shortest TTL of the
+# fields that request actually reads.
+PRICE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_PRICE_TTL", "60"))
+METRIC_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_METRIC_TTL", str(6 * 60 * 60)))
+PROFILE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_PROFILE_TTL", str(7 * 24 * 60 * 60)))
+
+PRICE_FIELDS = (
+    'currentPrice', 'regularMarketPrice', 'previousClose', 'open',
+    'dayHigh', 'dayLow', 'volume', 'regularMarketVolume', 'bid', 'ask',
+)
+PROFILE_FIELDS = (
+    'sector', 'industry', 'longName', 'shortName', 'country',
+    'longBusinessSummary', 'exchange', 'quoteType', 'currency',
+)
+
+FIELD_TTLS = {field: PRICE_TTL_SECONDS for field in PRICE_FIELDS}
+FIELD_TTLS.update({field: PROFILE_TTL_SECONDS for field in PROFILE_FIELDS})
+
+DEFAULT_MAX_BYTES = int(os.getenv("QUOTE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def _fetch_ticker_info(ticker: str) -> dict:
+    """
+    Performs the actual network round trip to Yahoo Finance.
+    """
+    return yf.Ticker(ticker).info or {}
+
+
+def _estimate_size(info: dict) -> int:
+    """
+    Cheap approximation of the memory held by an info dict (keys, values and one level of nesting).
+    """
+    size = sys.getsizeof(info)
+    for key, value in info.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+        if isinstance(value, (list, tuple)):
+            size += sum(sys.getsizeof(v) for v in value)
+        elif isinstance(value, dict):
+            size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return size
+
+
+class TickerInfoCache:
+    """
+    Process-wide LRU cache for yfinance `Ticker.info` with per-field TTLs and a memory cap.
+
+    Args:
+        max_bytes: Approximate upper bound on the memory used by cached entries.
+        field_ttls: Mapping of info field name to TTL in seconds.
+        default_ttl: TTL in seconds for fields missing from `field_ttls`.
+        fetch: Callable used to load the info dict for a ticker on a miss.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        field_ttls: Optional[dict] = None,
+        default_ttl: float = METRIC_TTL_SECONDS,
+        fetch: Callable[[str], dict] = _fetch_ticker_info,
+    ):
+        self.max_bytes = max_bytes
+        self.field_ttls = dict(FIELD_TTLS if field_ttls is None else field_ttls)
+        self.default_ttl = default_ttl
+        self._fetch = fetch
+        self._entries = OrderedDict()  # ticker -> (info, fetched_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _max_age(self, fields: Optional[Iterable[str]]) -> float:
+        if fields is None:
+            return min([self.default_ttl, *self.field_ttls.values()])
+        return min((self.field_ttls.get(f, self.default_ttl) for f in fields), default=self.default_ttl)
+
+    def get(self, ticker: str, fields: Optional[Iterable[str]] = None) -> dict:
+        """
+        Returns the cached info dict for `ticker`, fetching it when any requested field has expired.
+
+        Args:
+            ticker: The stock ticker symbol.
+            fields: The info fields the caller is going to read. `None` means all fields,
+                    which applies the shortest TTL.
+
+        Returns:
+            The `Ticker.info` dict. Callers must treat it as read-only.
+        """
+        key = ticker.strip().upper()
+        max_age = self._max_age(fields)
+
+        info = self._lookup(key, max_age)
+        if info is not None:
+            return info
+
+        def fetch():
+            # A request that finished just before this one became the leader may already have refreshed the entry
+            fresh = self._lookup(key, max_age, count=False)
+            if fresh is not None:
+                return fresh
+            fetched = self._fetch(key)
+            self._store(key, fetched)
+            return fetched
+
+        info, _ = single_flight.do('yfinance.info', key, fetch)
+        return info
+
+    def _lookup(self, key: str, max_age: float, count: bool = True) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= max_age:
+                self._entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return entry[0]
+            if count:
+                self.misses += 1
+            return None
+
+    def _store(self, key: str, info: dict) -> None:
+        size = _estimate_size(info)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (info, time.monotonic(), size)
+            self._bytes += size
+            # Evict least recently used tickers, but always keep the newest entry
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, ticker: Optional[str] = None) -> None:
+        """
+        Drops one ticker (or every ticker when `ticker` is None) from the cache.
+        """
+        with self._lock:
+            if ticker is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            old = self._entries.pop(ticker.strip().upper(), None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and current occupancy.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Shared by every stock tool in this process
+ticker_info_cache = TickerInfoCache()
+
+
+def get_ticker_info(ticker: str, fields: Optional[Iterable[str]] = None) -> dict:
+    """
+    Returns `Ticker.info` for `ticker` from the shared process-wide cache.
+    """
+    return ticker_info_cache.get(ticker, fields)
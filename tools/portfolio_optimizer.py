@@ -0,0 +1,261 @@
+from agents import function_tool
+from dataclasses import dataclass
+from typing import List, Optional
+import numpy as np
+from tools.custom_stock_retriever import _extract_stock_fundamentals_many
+from tools.diversification import parse_scores
+
+MAX_PORTFOLIO_TICKERS = 50
+DEFAULT_RISK_SCORE = 5.0
+DEFAULT_BETA = 1.0
+MAX_SECTOR_PCT = 50.0
+
+# How raw weights are derived from risk suitability score and beta for each profile:
+# weight ∝ score ** score_power / beta ** beta_power, then capped at max_position_pct
+PROFILES = {
+    'growth': {'score_power': 2.0, 'beta_power': 0.0, 'max_position_pct': 30.0},
+    'balanced': {'score_power': 1.5, 'beta_power': 0.5, 'max_position_pct': 25.0},
+    'preservation': {'score_power': 2.0, 'beta_power': 1.0, 'max_position_pct': 20.0},
+}
+
+
+@dataclass
+class Allocation:
+    tickers: List[str]
+    sectors: List[str]
+    prices: np.ndarray
+    betas: np.ndarray
+    scores: np.ndarray
+    target_weights: np.ndarray
+    shares: np.ndarray
+    capital: float
+
+    @property
+    def invested(self) -> np.ndarray:
+        return self.shares * self.prices
+
+    @property
+    def leftover_cash(self) -> float:
+        return float(self.capital - self.invested.sum())
+
+
+def capped_weights(raw: np.ndarray, sector_index: np.ndarray, max_position: float,
+                   max_sector: float, tolerance: float = 1e-9) -> np.ndarray:
+    """
+    Scales raw weights to sum to 1 while respecting per-position and per-sector caps.
+
+    Weight trimmed by a cap is handed to the names that still have room, in proportion to their
+    raw weights, until everything is placed or no name can take more. Whatever cannot be placed
+    stays unallocated (cash).
+    """
+    raw = np.clip(np.asarray(raw, dtype='f8'), 0.0, None)
+    if raw.sum() <= 0:
+        raw = np.ones_like(raw)
+    sectors = int(sector_index.max()) + 1
+    weights = raw / raw.sum()
+
+    for _ in range(4 * len(raw) + 4):
+        weights = np.minimum(weights, max_position)
+        sector_totals = np.bincount(sector_index, weights, minlength=sectors)
+        over = sector_totals > max_sector
+        scale = np.where(over, max_sector / np.where(over, sector_totals, 1.0), 1.0)
+        weights = weights * scale[sector_index]
+        sector_totals = np.bincount(sector_index, weights, minlength=sectors)
+
+        slack = 1.0 - weights.sum()
+        if slack <= tolerance:
+            break
+        room = (weights < max_position - tolerance) & (sector_totals[sector_index] < max_sector - tolerance)
+        if not room.any() or raw[room].sum() <= 0:
+            break
+        weights[room] += slack * raw[room] / raw[room].sum()
+    return weights
+
+
+def whole_share_allocation(weights: np.ndarray, prices: np.ndarray, capital: float, sector_index: np.ndarray,
+                           max_position: float, max_sector: float) -> np.ndarray:
+    """
+    Converts target weights into whole shares: round every position down, then spend the leftover
+    one share at a time on the position furthest below its target that still fits under the caps.
+    """
+    targets = weights * capital
+    shares = np.floor(targets / prices)
+    sectors = int(sector_index.max()) + 1
+
+    while True:
+        invested = shares * prices
+        leftover = capital - invested.sum()
+        sector_invested = np.bincount(sector_index, invested, minlength=sectors)
+        fits = (
+            (prices <= leftover + 1e-9)
+            & (invested + prices <= max_position * capital + 1e-9)
+            & (sector_invested[sector_index] + prices <= max_sector * capital + 1e-9)
+            & (weights > 0)
+        )
+        if not fits.any():
+            return shares
+        shortfall = np.where(fits, (targets - invested) / prices, -np.inf)
+        shares[int(np.argmax(shortfall))] += 1
+
+
+def optimize_allocation(tickers: List[str], sectors: List[str], prices: np.ndarray, betas: np.ndarray,
+                        scores: np.ndarray, capital: float, profile: str = 'growth',
+                        max_position_pct: Optional[float] = None, max_sector_pct: float = MAX_SECTOR_PCT,
+                        target_weights: Optional[np.ndarray] = None) -> Allocation:
+    """
+    Computes a capped, whole-share allocation of `capital`.
+
+    Args:
+        tickers, sectors, prices, betas, scores: Per-position inputs in matching order.
+        capital: Total dollars to allocate.
+        profile: 'growth', 'balanced' or 'preservation' (see PROFILES).
+        max_position_pct: Per-position cap in percent (defaults to the profile's cap).
+        max_sector_pct: Per-sector cap in percent.
+        target_weights: Optional preferred raw weights that replace the profile formula; caps still apply.
+    """
+    settings = PROFILES[profile]
+    max_position = (max_position_pct or settings['max_position_pct']) / 100.0
+    max_sector = max_sector_pct / 100.0
+    _, sector_index = np.unique(np.array(sectors), return_inverse=True)
+
+    if target_weights is None:
+        raw = scores ** settings['score_power'] / np.clip(betas, 0.3, None) ** settings['beta_power']
+    else:
+        raw = target_weights
+    weights = capped_weights(raw, sector_index, max_position, max_sector)
+    shares = whole_share_allocation(weights, prices, capital, sector_index, max_position, max_sector)
+    return Allocation(tickers, sectors, prices, betas, scores, weights, shares, capital)
+
+
+def format_allocation(allocation: Allocation, profile: str, assumptions: List[str]) -> str:
+    invested = allocation.invested
+    total_invested = float(invested.sum())
+    actual = invested / allocation.capital
+    lines = [
+        f"Optimized Portfolio Allocation ({profile} profile, ${allocation.capital:,.2f} capital)",
+        "",
+        "| Ticker | Sector | Current Price ($) | Target (%) | Shares to Purchase | Investment Amount ($) | Actual (%) | Risk Score | Beta |",
+        "| :--- | :--- | ---: | ---: | ---: | ---: | ---: | :---: | ---: |",
+    ]
+    for k, ticker in enumerate(allocation.tickers):
+        lines.append(
+            f"| {ticker} | {allocation.sectors[k]} | {allocation.prices[k]:,.2f} | {allocation.target_weights[k] * 100:.2f} "
+            f"| {int(allocation.shares[k])} | {invested[k]:,.2f} | {actual[k] * 100:.2f} "
+            f"| {allocation.scores[k]:g} | {allocation.betas[k]:.2f} |"
+        )
+
+    sector_totals = {}
+    for sector, amount in zip(allocation.sectors, invested):
+        sector_totals[sector] = sector_totals.get(sector, 0.0) + amount
+    if total_invested > 0:
+        portfolio_beta = float(invested @ allocation.betas / total_invested)
+        risk_score = float(invested @ allocation.scores / total_invested)
+    else:
+        portfolio_beta = risk_score = float('nan')
+
+    lines += [
+        "",
+        f"- Total Invested: ${total_invested:,.2f} ({total_invested / allocation.capital * 100:.2f}% of capital)",
+        f"- Leftover Cash: ${allocation.leftover_cash:,.2f}",
+        f"- Number of Positions: {int(np.count_nonzero(allocation.shares))}",
+        f"- Portfolio Beta (invested capital): {portfolio_beta:.2f}",
+        f"- Portfolio Beta (including cash): {portfolio_beta * total_invested / allocation.capital:.2f}",
+        f"- Weighted Average Risk Score: {risk_score:.1f}/10",
+        "- Sector Breakdown: " + ", ".join(
+            f"{sector} {amount / allocation.capital * 100:.1f}%"
+            for sector, amount in sorted(sector_totals.items(), key=lambda item: -item[1])
+        ),
+    ]
+    unallocated = 1.0 - float(allocation.target_weights.sum())
+    if unallocated > 1e-6:
+        lines.append(
+            f"- Caps Left Unallocated: {unallocated * 100:.1f}% of capital; add positions in other sectors to deploy it"
+        )
+    unfilled = [t for t, s, w in zip(allocation.tickers, allocation.shares, allocation.target_weights) if s == 0 and w > 0]
+    if unfilled:
+        lines.append(f"- Not Purchased (one share exceeds its allocation): {', '.join(unfilled)}")
+    if assumptions:
+        lines.append(f"- Assumptions: {'; '.join(assumptions)}")
+    return "\n".join(lines)
+
+
+def _optimize_portfolio_core(tickers: str, risk_scores: str, capital: float, profile: str = "growth",
+                             max_position_pct: float = 0.0, max_sector_pct: float = MAX_SECTOR_PCT,
+                             target_weights: str = "") -> str:
+    ticker_list = list(dict.fromkeys(t.strip().upper() for t in tickers.split(',') if t.strip()))
+    profile = profile.strip().lower()
+
+    if not ticker_list:
+        return "ERROR: Please provide at least 1 ticker separated by commas."
+    if len(ticker_list) > MAX_PORTFOLIO_TICKERS:
+        return f"ERROR: Maximum {MAX_PORTFOLIO_TICKERS} tickers allowed per allocation."
+    if profile not in PROFILES:
+        return f"ERROR: Unknown profile '{profile}'. Options: {', '.join(PROFILES)}."
+    if capital <= 0:
+        return "ERROR: Capital must be a positive dollar amount."
+    if not 0 < max_sector_pct <= 100 or not 0 <= max_position_pct <= 100:
+        return "ERROR: Caps must be percentages between 0 and 100."
+
+    scores_by_ticker = parse_scores(risk_scores)
+    preferred = parse_scores(target_weights)
+    assumptions = []
+    errors = []
+    rows = []
+    for ticker, data, error in _extract_stock_fundamentals_many(ticker_list):
+        price = data.get('price') if data else None
+        if error is not None or not isinstance(price, (int, float)) or price <= 0:
+            errors.append(f"{ticker} ({error or 'no current price'})")
+            continue
+        beta = data['beta']
+        if not isinstance(beta, (int, float)):
+            beta = DEFAULT_BETA
+            assumptions.append(f"{ticker} beta unavailable, assumed {DEFAULT_BETA:.1f}")
+        if ticker not in scores_by_ticker:
+            assumptions.append(f"{ticker} risk score missing, assumed {DEFAULT_RISK_SCORE:g}")
+        # Funds have no sector in Yahoo's data; each is treated as its own sector for the cap
+        sector = data['sector'] if data['sector'] not in (None, '', 'N/A') else f"Unclassified ({ticker})"
+        rows.append((ticker, sector, float(price), float(beta), scores_by_ticker.get(ticker, DEFAULT_RISK_SCORE)))
+
+    if not rows:
+        return f"ERROR: Could not retrieve prices for any of the tickers: {', '.join(errors)}"
+
+    names, sectors, prices, betas, scores = zip(*rows)
+    allocation = optimize_allocation(
+        list(names), list(sectors), np.array(prices), np.array(betas), np.array(scores), float(capital),
+        profile=profile, max_position_pct=max_position_pct or None, max_sector_pct=max_sector_pct,
+        target_weights=np.array([preferred.get(name, 0.0) for name in names]) if preferred else None,
+    )
+    result = format_allocation(allocation, profile, assumptions)
+    if errors:
+        result += f"\n\nERROR: Excluded, could not retrieve price for: {', '.join(errors)}"
+    return result
+
+
+@function_tool
+def optimize_portfolio_allocation(tickers: str, risk_scores: str, capital: float, profile: str = "growth",
+                                  max_position_pct: float = 0.0, max_sector_pct: float = 50.0,
+                                  target_weights: str = "") -> str:
+    """
+    Computes the exact allocation in ONE call: live prices, capped weights, whole-share counts,
+    leftover cash, portfolio beta, weighted risk score and sector breakdown. Use its numbers as-is
+    instead of calculating amounts or share counts yourself.
+
+    Args:
+        tickers: Comma-separated ticker symbols to hold (e.g., 'AAPL,MSFT,KO,PG').
+        risk_scores: Comma-separated 'TICKER:score' Risk Suitability Scores from 1-10 (e.g., 'AAPL:9,MSFT:8').
+        capital: Total capital to invest in dollars (e.g., 100000).
+        profile: 'growth' (concentrates in top-scored names, 30% position cap), 'balanced' (25% cap),
+                 or 'preservation' (favors high scores and low beta, 20% cap). Default is 'growth'.
+        max_position_pct: Per-position cap in percent; 0 uses the profile's cap.
+        max_sector_pct: Per-sector cap in percent. Default is 50.
+        target_weights: Optional 'TICKER:weight' pairs (any scale) to express preferred weights, e.g. to give
+                        a requested ETF a strategic weight; caps still apply. Empty uses the profile formula.
+
+    Returns:
+        A Markdown allocation table followed by the portfolio composition summary.
+    """
+    try:
+        return _optimize_portfolio_core(tickers, risk_scores, capital, profile,
+                                        max_position_pct, max_sector_pct, target_weights)
+    except Exception as e:
+        return f"ERROR: Failed to optimize portfolio allocation. Reason: {e}"
@@ -0,0 +1,262 @@
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from tools.context_executor import ContextThreadPoolExecutor
+from tools.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+STORE_DIR = os.getenv("PRICE_HISTORY_STORE_DIR", "./price_history_store")
+# How long a ticker's stored bars are trusted before the missing tail is fetched again
+FRESHNESS_SECONDS = float(os.getenv("PRICE_HISTORY_FRESHNESS_SECONDS", str(4 * 60 * 60)))
+FETCH_WORKERS = int(os.getenv("PRICE_HISTORY_FETCH_WORKERS", "8"))
+
+# One row per trading day. Close is Yahoo's split-adjusted, dividend-unadjusted close;
+# dividends are kept so total-return closes can be derived without rewriting stored history.
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'dividend', 'split')
+BAR_DTYPE = np.dtype([('date', 'M8[D]')] + [(name, 'f8') for name in BAR_FIELDS])
+YF_COLUMNS = {
+    'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close',
+    'volume': 'Volume', 'dividend': 'Dividends', 'split': 'Stock Splits',
+}
+
+PERIOD_OFFSETS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '3y': pd.DateOffset(years=3),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_stats = {'hits': 0, 'tail_fetches': 0, 'full_fetches': 0, 'stale_fallbacks': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(stat: str) -> None:
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+@contextmanager
+def _exclusive(name: str):
+    """
+    Holds an exclusive lock shared by every thread and worker process using the same store directory.
+    """
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(name, threading.Lock())
+    lock_dir = os.path.join(STORE_DIR, "locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    with thread_lock, open(os.path.join(lock_dir, f"{name}.lock"), "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _safe_name(ticker: str) -> str:
+    return ticker.upper().replace("/", "-")
+
+
+def _bars_path(ticker: str) -> str:
+    return os.path.join(STORE_DIR, "bars", f"{_safe_name(ticker)}.npy")
+
+
+def _meta_path(ticker: str) -> str:
+    return os.path.join(STORE_DIR, "bars", f"{_safe_name(ticker)}.json")
+
+
+def _read_meta(ticker: str) -> Optional[dict]:
+    try:
+        with open(_meta_path(ticker), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_bars(ticker: str) -> np.ndarray:
+    """
+    Memory-maps the stored bars, so slicing a date window reads only those pages from disk.
+    """
+    try:
+        return np.load(_bars_path(ticker), mmap_mode='r')
+    except (OSError, ValueError):
+        return np.empty(0, dtype=BAR_DTYPE)
+
+
+def _write(ticker: str, bars: np.ndarray, covered_from: date) -> None:
+    path = _bars_path(ticker)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE))
+    os.replace(tmp_path, path)
+
+    meta_path = _meta_path(ticker)
+    tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'covered_from': covered_from.isoformat(), 'checked_at': time.time()}, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _download_bars(ticker: str, start: date) -> np.ndarray:
+    frame = yf.Ticker(ticker).history(start=start.isoformat(), auto_adjust=False, actions=True)
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    if frame.empty:
+        return bars
+    index = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+    bars['date'] = index.values.astype('datetime64[D]')
+    for name, column in YF_COLUMNS.items():
+        bars[name] = frame[column].to_numpy(dtype='f8') if column in frame.columns else 0.0
+    return bars
+
+
+def _has_new_split(bars: np.ndarray, tail: np.ndarray) -> bool:
+    """
+    True when the tail reports a split the stored bars do not have yet; Yahoo then restates all earlier closes.
+    """
+    stored = {day: ratio for day, ratio in zip(bars['date'][-1:], bars['split'][-1:])}
+    return any(ratio != 0 and stored.get(day, 0) == 0 for day, ratio in zip(tail['date'], tail['split']))
+
+
+def period_start(period: str) -> date:
+    """
+    Converts a yfinance-style period ('1mo', '1y', '5y', 'ytd') into its first calendar date.
+    """
+    today = pd.Timestamp.today().normalize()
+    if period == 'ytd':
+        return date(today.year, 1, 1)
+    if period not in PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported period '{period}'. Options: {', '.join(PERIOD_OFFSETS)}, ytd.")
+    return (today - PERIOD_OFFSETS[period]).date()
+
+
+def get_price_history(ticker: str, start: date) -> np.ndarray:
+    """
+    Returns the daily bars for a ticker from `start` to the latest trading day.
+
+    Bars already on disk are served without a network call while fresh; afterwards only the
+    tail after the last stored day is downloaded. The full range is re-downloaded when an
+    earlier start is requested or a new stock split changes Yahoo's split-adjusted history.
+
+    Args:
+        ticker: Stock ticker symbol.
+        start: First calendar date needed.
+
+    Returns:
+        A structured array with BAR_DTYPE rows in date order (empty if Yahoo has no data).
+    """
+    ticker = ticker.strip().upper()
+    bars, _ = single_flight.do('yfinance.history', (ticker, start), lambda: _load_price_history(ticker, start))
+    return bars
+
+
+def _load_price_history(ticker: str, start: date) -> np.ndarray:
+    with _exclusive(_safe_name(ticker)):
+        meta = _read_meta(ticker)
+        bars = _load_bars(ticker)
+        covered_from = date.fromisoformat(meta['covered_from']) if meta else None
+
+        try:
+            if covered_from is None or start < covered_from:
+                _count('full_fetches')
+                bars = _download_bars(ticker, start)
+                _write(ticker, bars, start)
+            elif time.time() - meta.get('checked_at', 0) > FRESHNESS_SECONDS:
+                _count('tail_fetches')
+                # The last stored day is fetched again because it may have been a partial intraday bar
+                last_day = bars['date'][-1].astype(object) if len(bars) else covered_from
+                tail = _download_bars(ticker, last_day)
+                if _has_new_split(bars, tail):
+                    tail = _download_bars(ticker, covered_from)
+                    bars = tail
+                elif len(tail):
+                    bars = np.concatenate([bars[bars['date'] < tail['date'][0]], tail])
+                _write(ticker, bars, covered_from)
+                bars = _load_bars(ticker)
+            else:
+                _count('hits')
+        except Exception as e:
+            if not len(bars):
+                raise
+            _count('stale_fallbacks')
+            logger.warning(f"Could not refresh price history for {ticker}, using stored bars: {e}")
+
+    return bars[bars['date'] >= np.datetime64(start)]
+
+
+def adjusted_closes(bars: np.ndarray) -> np.ndarray:
+    """
+    Back-adjusts closes for dividends (Yahoo's method), so returns across ex-dates are total returns.
+    """
+    closes = np.asarray(bars['close'], dtype='f8')
+    dividends = np.asarray(bars['dividend'], dtype='f8')
+    factors = np.ones_like(closes)
+    if len(closes) > 1:
+        ratio = np.where(closes[:-1] > 0, 1.0 - dividends[1:] / closes[:-1], 1.0)
+        # Each ex-date scales every earlier close; reversed cumulative product applies them all at once
+        factors[:-1] = np.cumprod(ratio[::-1])[::-1]
+    return closes * factors
+
+
+def close_matrix(tickers: List[str], period: str = "1y") -> pd.DataFrame:
+    """
+    Builds an aligned, dividend-adjusted close-price matrix from the local store.
+
+    Args:
+        tickers: Ticker symbols; each becomes one column.
+        period: yfinance-style lookback period (see period_start).
+
+    Returns:
+        A DataFrame indexed by trading day. Tickers without data are left out, and days on which
+        only some tickers traded hold NaN for the others.
+    """
+    start = period_start(period)
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+
+    def load(ticker):
+        try:
+            return ticker, get_price_history(ticker, start)
+        except Exception as e:
+            logger.warning(f"Price history unavailable for {ticker}: {e}")
+            return ticker, None
+
+    if not tickers:
+        return pd.DataFrame()
+    with ContextThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(tickers))) as pool:
+        histories = dict(pool.map(load, tickers))
+
+    columns = {}
+    for ticker in tickers:
+        bars = histories.get(ticker)
+        if bars is not None and len(bars):
+            columns[ticker] = pd.Series(adjusted_closes(bars), index=pd.DatetimeIndex(bars['date']))
+    if not columns:
+        return pd.DataFrame()
+    return pd.DataFrame(columns).sort_index()
+
+
+def store_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
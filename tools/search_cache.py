@@ -0,0 +1,108 @@
+from contextlib import closing
+from typing import List, Optional
+import json
+import os
+import re
+import sqlite3
+import time
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "./.cache/search_cache.sqlite")
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", str(12 * 60 * 60)))
+
+QUERY_TOKEN = re.compile(r"[a-z0-9&$%.+-]+")
+# Words that change the wording of a query but not the results worth paying quota for
+FILLER_WORDS = {
+    'a', 'an', 'the', 'of', 'for', 'in', 'on', 'and', 'to', 'about', 'with', 'vs',
+    'latest', 'recent', 'current', 'news', 'update', 'updates',
+}
+CORPORATE_SUFFIXES = {'inc', 'corp', 'corporation', 'co', 'ltd', 'plc', 'llc', 'company', 'incorporated'}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Reduces a search query to an order-independent key, so 'Apple Inc. litigation news 2025' and
+    'apple litigation 2025' share one cache entry.
+    """
+    tokens = {token.strip(".-+") for token in QUERY_TOKEN.findall(query.lower())}
+    tokens -= FILLER_WORDS | CORPORATE_SUFFIXES
+    tokens.discard("")
+    return " ".join(sorted(tokens))
+
+
+class SearchResultCache:
+    """
+    SQLite-backed cache of web search results shared by every process on the host.
+
+    Args:
+        path: SQLite database file.
+        ttl_seconds: How long a cached result is served before the query is sent again.
+    """
+
+    def __init__(self, path: str = SEARCH_CACHE_PATH, ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_results ("
+                "key TEXT PRIMARY KEY, query TEXT, items TEXT, fetched_at REAL)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS search_stats (name TEXT PRIMARY KEY, value INTEGER)")
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def _bump(self, connection: sqlite3.Connection, name: str) -> None:
+        connection.execute(
+            "INSERT INTO search_stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, query: str) -> Optional[List[dict]]:
+        """
+        Returns the cached result items for an equivalent query, or None on a miss or expiry.
+        """
+        key = normalize_query(query)
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT items, fetched_at FROM search_results WHERE key = ?", (key,)
+            ).fetchone()
+            hit = row is not None and time.time() - row[1] < self.ttl_seconds
+            self._bump(connection, 'hits' if hit else 'misses')
+            connection.commit()
+        return json.loads(row[0]) if hit else None
+
+    def put(self, query: str, items: List[dict]) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO search_results (key, query, items, fetched_at) VALUES (?, ?, ?, ?)",
+                (normalize_query(query), query, json.dumps(items), time.time()),
+            )
+            connection.commit()
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss totals across all processes. Every hit is one Google CSE query saved.
+        """
+        with closing(self._connect()) as connection:
+            counters = dict(connection.execute("SELECT name, value FROM search_stats").fetchall())
+            entries = connection.execute("SELECT COUNT(*) FROM search_results").fetchone()[0]
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'quota_saved': hits,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': entries,
+        }
+
+
+search_cache = SearchResultCache()
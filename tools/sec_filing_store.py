@@ -0,0 +1,318 @@
+from sec_edgar_downloader import Downloader
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+import copy
+import glob
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import urllib.request
+import uuid
+from tools.sec_sections import ingest_sections
+from tools.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+SEC_COMPANY_NAME = "InvestmentAnalysisCrew"
+SEC_EMAIL = "analysis@investment.com"
+SUBMISSIONS_URL = "https://data.sec.gov/submissions/CIK{cik}.json"
+
+STORE_DIR = os.getenv("SEC_FILING_STORE_DIR", "./sec_filings_store")
+# How long a (ticker, form) is trusted before the newest accession is re-checked on EDGAR
+FRESHNESS_SECONDS = float(os.getenv("SEC_FILING_FRESHNESS_SECONDS", str(6 * 60 * 60)))
+MAX_STORE_BYTES = int(os.getenv("SEC_FILING_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Filings touched this recently are never evicted, so concurrent readers keep their files
+EVICTION_GRACE_SECONDS = 120
+
+LAST_USED_MARKER = ".last_used"
+FILING_FILENAME = "full-submission.txt"
+
+
+@dataclass(frozen=True)
+class StoredFiling:
+    """
+    A filing available on local disk.
+    """
+    ticker: str
+    form: str
+    accession: str
+    path: str
+
+
+_downloader = None
+_downloader_lock = threading.Lock()
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_stats = {'hits': 0, 'freshness_checks': 0, 'downloads': 0, 'stale_fallbacks': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(stat: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+def _get_downloader() -> Downloader:
+    """
+    Creates the SEC downloader once per process; its constructor fetches the full ticker-to-CIK map.
+    """
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = Downloader(SEC_COMPANY_NAME, SEC_EMAIL, os.path.join(STORE_DIR, "staging"))
+        return _downloader
+
+
+@contextmanager
+def _exclusive(name: str):
+    """
+    Holds an exclusive lock shared by every thread and worker process using the same store directory.
+    """
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(name, threading.Lock())
+    lock_dir = os.path.join(STORE_DIR, "locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    with thread_lock, open(os.path.join(lock_dir, f"{name}.lock"), "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _key(ticker: str, form: str) -> str:
+    return f"{ticker}_{form}".replace("/", "-").replace(" ", "_")
+
+
+def _object_dir(ticker: str, form: str, accession: str) -> str:
+    return os.path.join(STORE_DIR, "objects", ticker, form.replace("/", "-"), accession)
+
+
+def _ref_path(ticker: str, form: str) -> str:
+    return os.path.join(STORE_DIR, "refs", f"{_key(ticker, form)}.json")
+
+
+def _read_ref(ticker: str, form: str) -> Optional[dict]:
+    try:
+        with open(_ref_path(ticker, form), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_ref(ticker: str, form: str, accession: str) -> None:
+    path = _ref_path(ticker, form)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'accession': accession, 'checked_at': time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+def _filing_text_path(object_dir: str) -> Optional[str]:
+    path = os.path.join(object_dir, FILING_FILENAME)
+    return path if os.path.isfile(path) else None
+
+
+def _touch(object_dir: str) -> None:
+    marker = os.path.join(object_dir, LAST_USED_MARKER)
+    try:
+        with open(marker, 'a'):
+            pass
+        os.utime(marker, None)
+    except OSError:
+        pass
+
+
+def _latest_accession(ticker: str, form: str) -> Optional[str]:
+    """
+    Looks up the newest accession number for a form on EDGAR (one small JSON request).
+    Returns None when the form is not among the company's recent filings.
+    """
+    cik = _get_downloader().ticker_to_cik_mapping.get(ticker)
+    if cik is None:
+        raise ValueError(f"Ticker {ticker} is not known to SEC EDGAR.")
+
+    def fetch():
+        request = urllib.request.Request(
+            SUBMISSIONS_URL.format(cik=cik),
+            headers={'User-Agent': f"{SEC_COMPANY_NAME} {SEC_EMAIL}", 'Accept-Encoding': 'identity'},
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.load(response)['filings']['recent']
+
+    # The submissions document lists every form, so concurrent 10-K and 8-K checks share one request
+    recent, _ = single_flight.do('sec.submissions', cik, fetch)
+
+    # Recent filings are ordered newest first
+    for accession, filed_form in zip(recent['accessionNumber'], recent['form']):
+        if filed_form == form:
+            return accession
+    return None
+
+
+def _download(ticker: str, form: str) -> Optional[str]:
+    """
+    Downloads the latest filing of `form` into a private staging directory and moves it into the store.
+    Returns the accession number, or None when EDGAR has no such filing.
+    """
+    staging_dir = os.path.join(STORE_DIR, "staging", uuid.uuid4().hex)
+    try:
+        # Shallow copy: shares the CIK map but downloads into this call's own folder
+        dl = copy.copy(_get_downloader())
+        dl.download_folder = Path(staging_dir).resolve()
+        dl.get(form, ticker, limit=1)
+
+        accession_dirs = glob.glob(os.path.join(staging_dir, "sec-edgar-filings", "*", form, "*"))
+        if not accession_dirs:
+            return None
+        accession_dir = accession_dirs[0]
+        accession = os.path.basename(accession_dir)
+
+        # Split into sections and index them once at ingest time so searches never rescan the raw text
+        try:
+            ingest_sections(os.path.join(accession_dir, FILING_FILENAME), form)
+        except Exception as e:
+            logger.warning(f"Could not index {form} {accession} for {ticker}: {e}")
+
+        target_dir = _object_dir(ticker, form, accession)
+        if not os.path.isdir(target_dir):
+            os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+            os.replace(accession_dir, target_dir)
+        _count('downloads')
+        return accession
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _evict_if_needed(keep: set) -> None:
+    """
+    Deletes least recently used filings until the store fits under MAX_STORE_BYTES.
+    """
+    with _exclusive("store"):
+        entries = []
+        total = 0
+        for object_dir in glob.glob(os.path.join(STORE_DIR, "objects", "*", "*", "*")):
+            size = 0
+            for root, _, files in os.walk(object_dir):
+                for name in files:
+                    try:
+                        size += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+            marker = os.path.join(object_dir, LAST_USED_MARKER)
+            last_used = os.path.getmtime(marker) if os.path.exists(marker) else 0.0
+            entries.append((last_used, size, object_dir))
+            total += size
+
+        if total <= MAX_STORE_BYTES:
+            return
+
+        now = time.time()
+        for last_used, size, object_dir in sorted(entries):
+            if total <= MAX_STORE_BYTES:
+                break
+            if object_dir in keep or now - last_used < EVICTION_GRACE_SECONDS:
+                continue
+            shutil.rmtree(object_dir, ignore_errors=True)
+            total -= size
+            _count('evictions')
+
+
+def _get_latest_filing(ticker: str, form: str) -> Optional[StoredFiling]:
+    filing, _ = single_flight.do('sec.filing', (ticker, form), lambda: _load_latest_filing(ticker, form))
+    return filing
+
+
+def _load_latest_filing(ticker: str, form: str) -> Optional[StoredFiling]:
+    with _exclusive(_key(ticker, form)):
+        ref = _read_ref(ticker, form)
+        cached_dir = _object_dir(ticker, form, ref['accession']) if ref else None
+        cached_path = _filing_text_path(cached_dir) if cached_dir else None
+
+        # Fresh enough: serve from disk with no network at all
+        if cached_path and time.time() - ref.get('checked_at', 0) < FRESHNESS_SECONDS:
+            _count('hits')
+            _touch(cached_dir)
+            return StoredFiling(ticker, form, ref['accession'], cached_path)
+
+        try:
+            _count('freshness_checks')
+            latest = _latest_accession(ticker, form)
+            if cached_path and latest == ref['accession']:
+                _write_ref(ticker, form, latest)
+                _touch(cached_dir)
+                return StoredFiling(ticker, form, latest, cached_path)
+
+            if latest is not None and _filing_text_path(_object_dir(ticker, form, latest)):
+                accession = latest
+            else:
+                accession = _download(ticker, form)
+        except Exception as e:
+            if cached_path:
+                # EDGAR unreachable: an older filing beats no filing
+                logger.warning(f"Could not refresh {form} for {ticker}, using cached copy: {e}")
+                _count('stale_fallbacks')
+                _touch(cached_dir)
+                return StoredFiling(ticker, form, ref['accession'], cached_path)
+            raise
+
+        if accession is None:
+            return None
+
+        object_dir = _object_dir(ticker, form, accession)
+        path = _filing_text_path(object_dir)
+        if path is None:
+            return None
+        _write_ref(ticker, form, accession)
+        _touch(object_dir)
+        return StoredFiling(ticker, form, accession, path)
+
+
+def get_latest_filings(ticker: str, forms=("10-K", "8-K")) -> List[StoredFiling]:
+    """
+    Returns the latest filing of each requested form for a ticker, downloading only what the store lacks.
+    
+    Args:
+        ticker: The stock ticker symbol (e.g., 'AAPL').
+        forms: SEC form types to return, newest filing of each.
+    
+    Returns:
+        The filings that could be served, in `forms` order. Forms that could not be retrieved
+        are skipped with a warning.
+    """
+    ticker = ticker.strip().upper()
+    filings = []
+    downloads_before = store_stats()['downloads']
+    for form in forms:
+        try:
+            filing = _get_latest_filing(ticker, form)
+        except Exception as e:
+            logger.warning(f"Could not retrieve {form} filing for {ticker}: {e}")
+            continue
+        if filing is not None:
+            filings.append(filing)
+
+    if store_stats()['downloads'] > downloads_before:
+        _evict_if_needed({os.path.dirname(f.path) for f in filings})
+    return filings
+
+
+def store_stats() -> dict:
+    """
+    Returns counters for cache hits, EDGAR freshness checks, downloads and evictions in this process.
+    """
+    with _stats_lock:
+        return dict(_stats)
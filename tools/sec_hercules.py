@@ -1,9 +1,21 @@
-from sec_edgar_downloader import Downloader
+import logging
 import os
-import glob
-import re
-import shutil
 from agents import function_tool
+from tools.sec_filing_store import get_latest_filings
+from tools.sec_index import load_index
+from tools.sec_sections import SECTION_LABELS, load_sections, search_targets
+
+logger = logging.getLogger(__name__)
+
+
+def _searchable_sections(filing) -> list:
+    """
+    Returns (label, text path) pairs for the risk-relevant sections of a stored filing:
+    Items 1A, 3 and 7 of a 10-K, or the main document of an 8-K.
+    """
+    sections = search_targets(load_sections(filing.path, filing.form))
+    return [(f"{filing.form} - {SECTION_LABELS[name]}", path) for name, path in sections.items()]
+
 
 @function_tool
 def search_sec_filings_for_risk(ticker: str, risk_keyword: str) -> str:
@@ -19,68 +31,40 @@ def search_sec_filings_for_risk(ticker: str, risk_keyword: str) -> str:
         A formatted string with search results or indication that no risks were found.
     """
     
-    temp_dir = f"./sec_filings_temp/{ticker}_{os.getpid()}"
-    
     try:
-        
-        dl = Downloader("InvestmentAnalysisCrew", "analysis@investment.com", temp_dir)
-    except Exception as e:
-        return f"ERROR: Could not initialize SEC Downloader. Reason: {e}"
-
-    try:
-        # Download latest 10-K (annual report) and 8-K (current events)
-        print(f"Downloading SEC filings for {ticker}...")
-        dl.get("10-K", ticker, limit=1)
-        dl.get("8-K", ticker, limit=1)
+        # Served from the persistent filing store; only new accessions hit the network
+        filings = get_latest_filings(ticker, ("10-K", "8-K"))
     except Exception as e:
-        # If download fails, still try to search existing files
-        print(f"Warning: Could not download all filings for {ticker}: {e}")
+        return f"ERROR: Could not access the SEC filing store. Reason: {e}"
 
     mentions = []
     
-    # Search all downloaded filing text files
-    search_pattern = os.path.join(temp_dir, "**", "*.txt")
-    filing_paths = glob.glob(search_pattern, recursive=True)
-    
-    if not filing_paths:
-        # Cleanup and return
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+    if not filings:
         return f"ERROR: No SEC filings could be downloaded for ticker {ticker}. Ticker may be invalid or filings unavailable."
     
-    for path in filing_paths:
+    for filing in filings:
         try:
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                
-                # Find the keyword with context (100 chars on each side for better context)
-                pattern = f".{{0,100}}({re.escape(risk_keyword)}).{{0,100}}"
-                matches = re.findall(pattern, content, re.IGNORECASE)
+            sections = _searchable_sections(filing)
+        except Exception as e:
+            logger.warning(f"Could not parse filing {filing.path}: {e}")
+            continue
+        
+        for label, path in sections:
+            try:
+                # Positional index lookup; context is 100 bytes on each side of the match
+                matches = load_index(path).snippets(risk_keyword, limit=3, radius=100)
                 
                 if matches:
-                    # Determine filing type from path
-                    filing_type = "10-K" if "10-k" in path.lower() else "8-K" if "8-k" in path.lower() else "Unknown"
-                    
-                    # Get filename for reference
-                    filename = os.path.basename(path)
-                    
                     mentions.append({
-                        'filing': filing_type,
-                        'filename': filename,
-                        'context': [m.strip() for m in matches[:3]]  
+                        'filing': label,
+                        'filename': f"{filing.accession}/{os.path.basename(path)}",
+                        'context': [m.strip() for m in matches]  
                     })
-                    
-        except Exception as e:
-            print(f"Warning: Could not read or search file {path}: {e}")
-            continue
+                        
+            except Exception as e:
+                logger.warning(f"Could not read or search file {path}: {e}")
+                continue
 
-    # Cleanup temporary directory
-    try:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-    except Exception as e:
-        print(f"Warning: Could not cleanup temp directory: {e}")
-    
     # Format results
     if mentions:
         result = f"✅ SEC RISK DISCLOSURE FOUND for '{risk_keyword}' in {ticker} filings:\n\n"
@@ -105,7 +89,7 @@ def search_sec_filings_for_risk(ticker: str, risk_keyword: str) -> str:
     else:
         return (
             f"ℹ️ SEC FILING SEARCH RESULT for {ticker}:\n\n"
-            f"No mentions of '{risk_keyword}' found in the latest 10-K or 8-K filings.\n\n"
+            f"No mentions of '{risk_keyword}' found in the risk-relevant sections of the latest 10-K or 8-K filings.\n\n"
             f"INTERPRETATION: This risk may not be formally disclosed under this specific term, "
             f"or it may not be considered material by the company. Consider searching with "
             f"alternative keywords (e.g., 'regulation' instead of 'regulatory', 'legal' instead of 'litigation')."
@@ -131,51 +115,36 @@ def search_sec_filings_multiple_risks(ticker: str, risk_keywords: str) -> str:
     if len(keywords) > 10:
         return "ERROR: Maximum 10 keywords allowed. Please reduce the number of search terms."
     
-    temp_dir = f"./sec_filings_temp/{ticker}_{os.getpid()}"
-    
     try:
-        dl = Downloader("InvestmentAnalysisCrew", "analysis@investment.com", temp_dir)
-        print(f"Downloading SEC filings for {ticker}...")
-        dl.get("10-K", ticker, limit=1)
-        dl.get("8-K", ticker, limit=1)
+        filings = get_latest_filings(ticker, ("10-K", "8-K"))
     except Exception as e:
         return f"ERROR: Could not download SEC filings for {ticker}. Reason: {e}"
 
     # Search for all keywords
     results = {}
     
-    search_pattern = os.path.join(temp_dir, "**", "*.txt")
-    filing_paths = glob.glob(search_pattern, recursive=True)
-    
-    if not filing_paths:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+    if not filings:
         return f"ERROR: No SEC filings could be downloaded for {ticker}."
     
-    # Read all filing content once
-    all_content = ""
-    for path in filing_paths:
+    # Load the index of each risk-relevant section once
+    indexes = []
+    searched = []
+    for filing in filings:
         try:
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                all_content += f.read().lower() + "\n"
+            for label, path in _searchable_sections(filing):
+                indexes.append(load_index(path))
+                searched.append(label)
         except Exception as e:
+            logger.warning(f"Could not load sections for {filing.path}: {e}")
             continue
     
-    # Search for each keyword
+    # Count each keyword (or phrase) across all filings
     for keyword in keywords:
-        count = all_content.count(keyword.lower())
-        results[keyword] = count
-    
-    # Cleanup
-    try:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-    except Exception as e:
-        print(f"Warning: Could not cleanup temp directory: {e}")
+        results[keyword] = sum(index.count(keyword) for index in indexes)
     
     # Format results
     output = f"📊 SEC RISK DISCLOSURE ANALYSIS for {ticker}\n"
-    output += f"Filings Searched: Latest 10-K and 8-K\n\n"
+    output += f"Sections Searched: {', '.join(searched) or 'None'}\n\n"
     output += "Risk Factor Mentions:\n"
     output += "-" * 50 + "\n"
     
@@ -0,0 +1,183 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List
+import os
+import pickle
+import re
+import threading
+import uuid
+
+# Indexes are written next to the filing they describe, e.g. <accession>/full-submission.txt.index
+INDEX_SUFFIX = ".index"
+INDEX_VERSION = 1
+TOKEN_PATTERN = re.compile(rb"[a-z0-9]+")
+QUERY_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+LOADED_INDEX_LIMIT = 32
+
+
+def _contains(sorted_positions: array, position: int) -> bool:
+    i = bisect_left(sorted_positions, position)
+    return i < len(sorted_positions) and sorted_positions[i] == position
+
+
+class FilingIndex:
+    """
+    Positional inverted index over one filing's text.
+
+    Terms are lowercase alphanumeric tokens. Each term maps to the sorted token positions where it
+    occurs, and each position maps to its byte offset in the source file so snippets can be read
+    with a single seek instead of rescanning the document.
+    """
+
+    def __init__(self, source_path: str, postings: Dict[str, array], offsets: array):
+        self.source_path = source_path
+        self.postings = postings
+        self.offsets = offsets
+        self.vocabulary = sorted(postings)
+
+    @classmethod
+    def build(cls, source_path: str) -> "FilingIndex":
+        with open(source_path, 'rb') as f:
+            content = f.read().lower()
+
+        postings = {}
+        offsets = array('Q')
+        for position, match in enumerate(TOKEN_PATTERN.finditer(content)):
+            offsets.append(match.start())
+            term = match.group().decode('ascii')
+            positions = postings.get(term)
+            if positions is None:
+                postings[term] = positions = array('I')
+            positions.append(position)
+        return cls(source_path, postings, offsets)
+
+    def save(self, index_path: str) -> None:
+        tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(
+                {'version': INDEX_VERSION, 'postings': self.postings, 'offsets': self.offsets},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, source_path: str, index_path: str) -> "FilingIndex":
+        # Index files are only ever written by this module inside the local filing store
+        with open(index_path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in {index_path}")
+        return cls(source_path, data['postings'], data['offsets'])
+
+    def _term_positions(self, term: str, prefix: bool) -> List[int]:
+        if not prefix:
+            return list(self.postings.get(term, ()))
+        # Prefix match keeps the old substring behaviour for stems ('regulat' -> 'regulatory')
+        positions = []
+        merged_terms = 0
+        start = bisect_left(self.vocabulary, term)
+        for candidate in self.vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            positions.extend(self.postings[candidate])
+            merged_terms += 1
+        if merged_terms > 1:
+            positions.sort()
+        return positions
+
+    def find(self, query: str) -> List[int]:
+        """
+        Returns the token positions where `query` starts. Multi-word queries are matched as phrases;
+        the last word also matches longer words that start with it.
+        """
+        terms = QUERY_TOKEN_PATTERN.findall(query.lower())
+        if not terms:
+            return []
+
+        matches = self._term_positions(terms[-1], prefix=True)
+        if len(terms) == 1:
+            return matches
+
+        # Anchor on the last word, then keep starts whose preceding words line up
+        starts = [position - (len(terms) - 1) for position in matches]
+        for offset, term in enumerate(terms[:-1]):
+            term_positions = self.postings.get(term)
+            if term_positions is None:
+                return []
+            starts = [start for start in starts if _contains(term_positions, start + offset)]
+            if not starts:
+                return []
+        return starts
+
+    def count(self, query: str) -> int:
+        return len(self.find(query))
+
+    def snippets(self, query: str, limit: int = 3, radius: int = 100) -> List[str]:
+        """
+        Returns up to `limit` context snippets of `radius` bytes on each side of a match.
+        """
+        positions = self.find(query)[:limit]
+        snippets = []
+        if not positions:
+            return snippets
+        with open(self.source_path, 'rb') as f:
+            for position in positions:
+                start = max(0, self.offsets[position] - radius)
+                f.seek(start)
+                raw = f.read(self.offsets[position] - start + len(query) + radius)
+                snippets.append(raw.decode('utf-8', errors='ignore'))
+        return snippets
+
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def index_path_for(source_path: str) -> str:
+    return source_path + INDEX_SUFFIX
+
+
+def build_index(source_path: str) -> FilingIndex:
+    """
+    Builds the index for a filing and saves it next to the file. Called once when a filing is ingested.
+    """
+    index = FilingIndex.build(source_path)
+    index.save(index_path_for(source_path))
+    return index
+
+
+def load_index(source_path: str) -> FilingIndex:
+    """
+    Returns the index for a filing, loading it from disk (or building it if it is missing)
+    and keeping recently used indexes in memory.
+    """
+    index_path = index_path_for(source_path)
+    try:
+        cache_key = (source_path, os.path.getmtime(index_path))
+    except OSError:
+        cache_key = None
+
+    if cache_key is not None:
+        with _loaded_lock:
+            index = _loaded.get(cache_key)
+            if index is not None:
+                _loaded.move_to_end(cache_key)
+                return index
+        try:
+            index = FilingIndex.load(source_path, index_path)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            index = None
+    else:
+        index = None
+
+    if index is None:
+        index = build_index(source_path)
+        cache_key = (source_path, os.path.getmtime(index_path))
+
+    with _loaded_lock:
+        _loaded[cache_key] = index
+        while len(_loaded) > LOADED_INDEX_LIMIT:
+            _loaded.popitem(last=False)
+    return index
@@ -0,0 +1,258 @@
+from typing import Dict, Iterator, Optional
+import html
+import json
+import os
+import re
+import uuid
+from tools.sec_index import build_index
+
+SECTIONS_DIRNAME = "sections"
+MANIFEST_FILENAME = "manifest.json"
+SECTIONS_VERSION = 1
+
+# 10-K items kept as separate searchable sections
+TEN_K_ITEMS = {
+    '1a': 'risk_factors',
+    '3': 'legal_proceedings',
+    '7': 'mdna',
+}
+SECTION_LABELS = {
+    'risk_factors': "Item 1A Risk Factors",
+    'legal_proceedings': "Item 3 Legal Proceedings",
+    'mdna': "Item 7 MD&A",
+    'body': "Main Document",
+}
+# The whole main document (markup stripped, exhibits dropped) is always kept as 'body'
+BODY_SECTION = 'body'
+
+ITEM_HEADING = re.compile(r"^item\s*(\d{1,2}[a-d]?)(?!\d|\.\d)\b", re.IGNORECASE)
+MAX_HEADING_LENGTH = 200
+TAG_NAME = re.compile(r"/?\s*([a-zA-Z][\w:.-]*)")
+BLOCK_TAGS = {
+    'p', 'div', 'br', 'tr', 'li', 'table', 'ul', 'ol', 'title',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'page',
+}
+# Content inside these tags is never visible text (inline XBRL facts, CSS, scripts)
+SKIP_TAGS = {'ix:header', 'style', 'script', 'head'}
+MAX_PENDING_TAG = 4096
+WHITESPACE = re.compile(r"\s+")
+
+
+class _MarkupStripper:
+    """
+    Incremental HTML-to-text converter fed one raw line at a time.
+
+    Block-level tags become line breaks; in HTML mode raw newlines are plain whitespace, as a
+    browser would render them. Tags split across lines are carried over to the next call.
+    """
+
+    def __init__(self, html_mode: bool):
+        self.html_mode = html_mode
+        self.pending = ""
+        self.skip_tag = None
+
+    def feed(self, line: str) -> str:
+        data = self.pending + (line.replace("\n", " ") if self.html_mode else line)
+        self.pending = ""
+        out = []
+        pos = 0
+        while True:
+            lt = data.find("<", pos)
+            if lt == -1:
+                if self.skip_tag is None:
+                    out.append(data[pos:])
+                break
+            if self.skip_tag is None:
+                out.append(data[pos:lt])
+            gt = data.find(">", lt)
+            if gt == -1:
+                rest = data[lt:]
+                if len(rest) < MAX_PENDING_TAG:
+                    self.pending = rest
+                elif self.skip_tag is None:
+                    # Not a tag after all (e.g. a bare '<' in plain text)
+                    out.append(rest)
+                break
+            self._handle_tag(data[lt + 1:gt], out)
+            pos = gt + 1
+        return html.unescape("".join(out)).replace("\xa0", " ")
+
+    def _handle_tag(self, tag: str, out: list) -> None:
+        match = TAG_NAME.match(tag)
+        if match is None:
+            return
+        name = match.group(1).lower()
+        closing = tag.lstrip().startswith("/")
+        if self.skip_tag is not None:
+            if closing and name == self.skip_tag:
+                self.skip_tag = None
+            return
+        if not closing and name in SKIP_TAGS and not tag.rstrip().endswith("/"):
+            self.skip_tag = name
+        elif name in BLOCK_TAGS:
+            out.append("\n")
+        elif name in ('td', 'th'):
+            out.append(" ")
+
+
+def _main_document_lines(filing_path: str, form: str) -> Iterator[str]:
+    """
+    Streams the visible text lines of the filing's main document, skipping the SEC header,
+    exhibits, graphics and XBRL attachments.
+    """
+    stripper = None
+    in_document = False
+    in_text = False
+    is_main = False
+    found_main = False
+    partial = ""
+
+    with open(filing_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            marker = line.strip()
+            upper = marker.upper()
+            if upper == "<DOCUMENT>":
+                in_document, in_text, is_main = True, False, False
+                continue
+            if upper == "</DOCUMENT>":
+                in_document = in_text = False
+                if is_main:
+                    break
+                continue
+            if not in_document:
+                continue
+            if not in_text:
+                if upper.startswith("<TYPE>"):
+                    doc_type = marker[6:].strip().upper()
+                    is_main = not found_main and doc_type in (form.upper(), f"{form.upper()}/A")
+                    found_main = found_main or is_main
+                elif upper == "<TEXT>" and is_main:
+                    in_text = True
+                continue
+            if upper == "</TEXT>":
+                in_text = False
+                continue
+            if stripper is None:
+                if not marker:
+                    continue
+                stripper = _MarkupStripper(html_mode=marker.startswith("<"))
+
+            text = partial + stripper.feed(line)
+            *complete, partial = text.split("\n")
+            for raw in complete:
+                cleaned = WHITESPACE.sub(" ", raw).strip()
+                if cleaned:
+                    yield cleaned
+
+    cleaned = WHITESPACE.sub(" ", partial).strip()
+    if cleaned:
+        yield cleaned
+
+
+def _write_text(path: str, text: str) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _sections_dir(filing_path: str) -> str:
+    return os.path.join(os.path.dirname(filing_path), SECTIONS_DIRNAME)
+
+
+def extract_sections(filing_path: str, form: str) -> Dict[str, str]:
+    """
+    Splits a filing's main document into plain-text sections in a single streaming pass.
+
+    Args:
+        filing_path: Path to the SEC full-submission text file.
+        form: The filing's form type (e.g., '10-K', '8-K').
+
+    Returns:
+        Mapping of section name to text. Always contains 'body'; 10-K filings also contain
+        'risk_factors', 'legal_proceedings' and 'mdna' when those items were found.
+    """
+    body = []
+    best = {}
+    current_item = None
+    current_lines = []
+
+    def close_item():
+        if current_item in TEN_K_ITEMS and len(current_lines) > 1:
+            name = TEN_K_ITEMS[current_item]
+            text = "\n".join(current_lines)
+            # Table-of-contents entries repeat every heading; the real section is the longest
+            if len(text) > len(best.get(name, "")):
+                best[name] = text
+
+    track_items = form.upper().startswith("10-K")
+    for line in _main_document_lines(filing_path, form):
+        body.append(line)
+        if not track_items:
+            continue
+        match = ITEM_HEADING.match(line) if len(line) <= MAX_HEADING_LENGTH else None
+        if match:
+            close_item()
+            current_item = match.group(1).lower()
+            current_lines = []
+        current_lines.append(line)
+    if track_items:
+        close_item()
+
+    best[BODY_SECTION] = "\n".join(body)
+    return best
+
+
+def ingest_sections(filing_path: str, form: str) -> Dict[str, str]:
+    """
+    Extracts and indexes a filing's sections, caching them as plain text next to the filing.
+
+    Returns:
+        Mapping of section name to the cached section text path.
+    """
+    sections_dir = _sections_dir(filing_path)
+    os.makedirs(sections_dir, exist_ok=True)
+
+    paths = {}
+    for name, text in extract_sections(filing_path, form).items():
+        path = os.path.join(sections_dir, f"{name}.txt")
+        _write_text(path, text)
+        build_index(path)
+        paths[name] = path
+
+    _write_text(
+        os.path.join(sections_dir, MANIFEST_FILENAME),
+        json.dumps({'version': SECTIONS_VERSION, 'form': form, 'sections': sorted(paths)}),
+    )
+    return paths
+
+
+def load_sections(filing_path: str, form: str) -> Dict[str, str]:
+    """
+    Returns the cached section text paths for a filing, extracting them first if needed.
+    """
+    manifest = _read_manifest(filing_path)
+    if manifest is None:
+        return ingest_sections(filing_path, form)
+    sections_dir = _sections_dir(filing_path)
+    return {name: os.path.join(sections_dir, f"{name}.txt") for name in manifest['sections']}
+
+
+def _read_manifest(filing_path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(_sections_dir(filing_path), MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == SECTIONS_VERSION else None
+
+
+def search_targets(sections: Dict[str, str]) -> Dict[str, str]:
+    """
+    Picks the sections a risk search should look at: the risk-relevant 10-K items when present,
+    otherwise the whole main document.
+    """
+    targeted = {name: path for name, path in sections.items() if name in TEN_K_ITEMS.values()}
+    if targeted:
+        return targeted
+    return {BODY_SECTION: sections[BODY_SECTION]} if BODY_SECTION in sections else {}
@@ -0,0 +1,74 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+import threading
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical requests into one: the first caller for a key runs the request,
+    and every caller that arrives while it is in flight waits on the same future.
+
+    Streamlit sessions and concurrent agent runs share one process, so this covers them all.
+    Results are not cached once the request completes; callers keep their own caches for that.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, Hashable], Future] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, stat: str) -> None:
+        counters = self._stats.setdefault(namespace, {'calls': 0, 'executed': 0, 'coalesced': 0, 'errors': 0})
+        counters[stat] += 1
+
+    def do(self, namespace: str, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Runs `fn` unless an identical request is already in flight.
+
+        Args:
+            namespace: Data source label used for metrics (e.g., 'yfinance.info').
+            key: Identifies identical requests within the namespace.
+            fn: Performs the request.
+
+        Returns:
+            (result, shared): shared is True when this caller reused another caller's request.
+            If the request raised, every waiting caller gets the same exception.
+        """
+        flight_key = (namespace, key)
+        with self._lock:
+            self._count(namespace, 'calls')
+            future = self._inflight.get(flight_key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[flight_key] = future
+                self._count(namespace, 'executed')
+            else:
+                self._count(namespace, 'coalesced')
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+            with self._lock:
+                self._count(namespace, 'errors')
+        finally:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+        return future.result(), False
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-namespace counters: calls, executed (requests actually sent), coalesced, errors and coalesce_rate.
+        """
+        with self._lock:
+            return {
+                namespace: {**counters, 'coalesce_rate': counters['coalesced'] / counters['calls'] if counters['calls'] else 0.0}
+                for namespace, counters in self._stats.items()
+            }
+
+
+# Shared by the yfinance, Alpha Vantage and SEC tools in this process
+single_flight = SingleFlight()
@@ -0,0 +1,320 @@
+from agents import function_tool
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import math
+import os
+import re
+import numpy as np
+from tools.context_executor import ContextThreadPoolExecutor
+from tools.price_history_store import get_price_history
+
+TRADING_DAYS_PER_YEAR = 252
+MAX_INDICATOR_TICKERS = 100
+INDICATOR_WORKERS = int(os.getenv("INDICATOR_WORKERS", "8"))
+DEFAULT_INDICATORS = "sma50,sma200,ema20,rsi14,macd,atr14,bbands20,vol21"
+# Exponential recursions are evaluated in blocks; within a block the decay powers stay far from overflow
+EMA_BLOCK = 64
+
+INDICATOR_SPEC = re.compile(r"^([a-z]+)[\s_\-(]*((?:\d+(?:\.\d+)?[\s_,/:]*)*)\)?$")
+
+
+# --- Vectorized indicator math (1-D arrays in date order; NaN until enough history) ---
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if window <= 0 or len(values) < window:
+        return out
+    sums = np.cumsum(np.insert(values, 0, 0.0))
+    out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
+def rolling_std(values: np.ndarray, window: int, ddof: int = 0) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if window <= ddof or len(values) < window:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(values, window)
+    out[window - 1:] = windows.std(axis=1, ddof=ddof)
+    return out
+
+
+def exponential_smoothing(values: np.ndarray, alpha: float, seed: Optional[float] = None,
+                          start: int = 0) -> np.ndarray:
+    """
+    y[t] = alpha * x[t] + (1 - alpha) * y[t-1], starting at index `start` from `seed` (default x[start]).
+
+    The recursion is solved in closed form one block at a time, so a long series costs a few
+    dozen array operations instead of one Python step per day.
+    """
+    out = np.full(len(values), np.nan)
+    if start >= len(values):
+        return out
+    if alpha >= 1.0:
+        out[start:] = values[start:]
+        return out
+    decay = 1.0 - alpha
+    level = values[start] if seed is None else seed
+    out[start] = level
+    position = start + 1
+    while position < len(values):
+        block = values[position:position + EMA_BLOCK]
+        powers = decay ** np.arange(1, len(block) + 1)
+        # y[j] = decay^(j+1) * level + alpha * sum_{k<=j} decay^(j-k) * x[k]
+        weighted = np.cumsum(block / powers)
+        out[position:position + len(block)] = powers * (level + alpha * weighted)
+        level = out[position + len(block) - 1]
+        position += len(block)
+    return out
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """
+    Exponential moving average seeded with the first SMA of `span` days (the charting convention).
+    """
+    if span <= 0 or len(values) < span:
+        return np.full(len(values), np.nan)
+    return exponential_smoothing(values, 2.0 / (span + 1), seed=values[:span].mean(), start=span - 1)
+
+
+def wilder(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Wilder's smoothing (alpha = 1/window) seeded with the first window's mean, as used by RSI and ATR.
+    """
+    if window <= 0 or len(values) < window:
+        return np.full(len(values), np.nan)
+    return exponential_smoothing(values, 1.0 / window, seed=values[:window].mean(), start=window - 1)
+
+
+def rsi(closes: np.ndarray, window: int = 14) -> np.ndarray:
+    out = np.full(len(closes), np.nan)
+    if len(closes) <= window:
+        return out
+    change = np.diff(closes)
+    average_gain = wilder(np.clip(change, 0.0, None), window)
+    average_loss = wilder(np.clip(-change, 0.0, None), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100.0 - 100.0 / (1.0 + average_gain / average_loss)
+    value = np.where(average_loss == 0, 100.0, value)
+    out[1:] = np.where(np.isnan(average_gain), np.nan, value)
+    return out
+
+
+def macd(closes: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    line = ema(closes, fast) - ema(closes, slow)
+    signal_line = np.full(len(closes), np.nan)
+    valid = np.flatnonzero(~np.isnan(line))
+    if len(valid) >= signal:
+        signal_line[valid[0]:] = ema(line[valid[0]:], signal)
+    return line, signal_line, line - signal_line
+
+
+def atr(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, window: int = 14) -> np.ndarray:
+    out = np.full(len(closes), np.nan)
+    if len(closes) <= window:
+        return out
+    previous = closes[:-1]
+    true_range = np.maximum.reduce([highs[1:] - lows[1:], np.abs(highs[1:] - previous), np.abs(lows[1:] - previous)])
+    out[1:] = wilder(true_range, window)
+    return out
+
+
+def bollinger(closes: np.ndarray, window: int = 20, width: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    middle = sma(closes, window)
+    band = width * rolling_std(closes, window)
+    return middle - band, middle, middle + band
+
+
+def realized_volatility(closes: np.ndarray, window: int = 21) -> np.ndarray:
+    """
+    Annualized standard deviation of daily log returns over the trailing window.
+    """
+    out = np.full(len(closes), np.nan)
+    if len(closes) <= window:
+        return out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_returns = np.diff(np.log(closes))
+    out[1:] = rolling_std(log_returns, window, ddof=1) * math.sqrt(TRADING_DAYS_PER_YEAR)
+    return out
+
+
+# --- Indicator requests ---
+
+@dataclass(frozen=True)
+class IndicatorRequest:
+    kind: str
+    params: Tuple[float, ...]
+
+    @property
+    def lookback(self) -> int:
+        """Trading days of history needed for a settled value."""
+        if self.kind in ('ema', 'macd', 'rsi', 'atr'):
+            # Exponential averages need several spans before the seed stops mattering
+            return int(max(self.params[:2]) * 4) + 1
+        return int(self.params[0]) + 1
+
+    @property
+    def columns(self) -> List[str]:
+        p = [f"{v:g}" for v in self.params]
+        if self.kind == 'macd':
+            label = f"MACD({','.join(p)})"
+            return [label, f"{label} Signal", f"{label} Hist"]
+        if self.kind == 'bbands':
+            return [f"BB{p[0]} Lower", f"BB{p[0]} Upper", f"BB{p[0]} %B"]
+        if self.kind == 'vol':
+            return [f"Vol{p[0]} (ann.)"]
+        return [f"{self.kind.upper()}{p[0]}"]
+
+
+INDICATOR_ALIASES = {
+    'sma': 'sma', 'ma': 'sma', 'ema': 'ema', 'rsi': 'rsi', 'macd': 'macd', 'atr': 'atr',
+    'bbands': 'bbands', 'bb': 'bbands', 'bollinger': 'bbands',
+    'vol': 'vol', 'volatility': 'vol', 'realizedvol': 'vol',
+}
+DEFAULT_PARAMS = {
+    'sma': (50,), 'ema': (20,), 'rsi': (14,), 'macd': (12, 26, 9), 'atr': (14,), 'bbands': (20, 2), 'vol': (21,),
+}
+
+
+def parse_indicators(indicators: str) -> List[IndicatorRequest]:
+    """
+    Parses specs such as 'sma50, ema20, rsi14, macd, macd(5,35,5), atr14, bbands20, vol63'.
+
+    Raises:
+        ValueError: For unknown indicators or invalid windows.
+    """
+    requests = []
+    for spec in re.split(r",\s*(?=[a-zA-Z])|;|\n", indicators or DEFAULT_INDICATORS):
+        spec = spec.strip().lower()
+        if not spec:
+            continue
+        match = INDICATOR_SPEC.match(spec)
+        kind = INDICATOR_ALIASES.get(match.group(1)) if match else None
+        if kind is None:
+            raise ValueError(f"Unknown indicator '{spec}'. Options: {', '.join(DEFAULT_PARAMS)}.")
+        given = tuple(float(n) for n in re.findall(r"\d+(?:\.\d+)?", match.group(2)))
+        params = given + DEFAULT_PARAMS[kind][len(given):]
+        windows = params[:1] if kind == 'bbands' else params
+        if any(value <= 0 for value in params) or any(value != int(value) for value in windows):
+            raise ValueError(f"Invalid parameters for indicator '{spec}'.")
+        request = IndicatorRequest(kind, params[:len(DEFAULT_PARAMS[kind])])
+        if request not in requests:
+            requests.append(request)
+    if not requests:
+        raise ValueError("No indicators requested.")
+    return requests
+
+
+def compute_indicators(bars: np.ndarray, requests: List[IndicatorRequest]) -> Dict[str, float]:
+    """
+    Latest value of every requested indicator for one ticker's daily bars.
+    """
+    closes = np.asarray(bars['close'], dtype='f8')
+    values = {}
+    for request in requests:
+        p = request.params
+        if request.kind == 'sma':
+            series = [sma(closes, int(p[0]))]
+        elif request.kind == 'ema':
+            series = [ema(closes, int(p[0]))]
+        elif request.kind == 'rsi':
+            series = [rsi(closes, int(p[0]))]
+        elif request.kind == 'macd':
+            series = list(macd(closes, int(p[0]), int(p[1]), int(p[2])))
+        elif request.kind == 'atr':
+            series = [atr(np.asarray(bars['high'], dtype='f8'), np.asarray(bars['low'], dtype='f8'), closes, int(p[0]))]
+        elif request.kind == 'bbands':
+            lower, _, upper = bollinger(closes, int(p[0]), p[1])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                percent_b = (closes - lower) / (upper - lower)
+            series = [lower, upper, percent_b]
+        else:
+            series = [realized_volatility(closes, int(p[0]))]
+        for column, line in zip(request.columns, series):
+            values[column] = float(line[-1]) if len(line) else float('nan')
+    return values
+
+
+def history_start(requests: List[IndicatorRequest]) -> date:
+    """
+    First calendar date to load: the longest lookback in trading days, converted to calendar days, and at least a year.
+    """
+    trading_days = max(request.lookback for request in requests)
+    return date.today() - timedelta(days=max(400, int(trading_days * 1.5) + 10))
+
+
+def _format_value(column: str, value: float) -> str:
+    if math.isnan(value):
+        return "N/A"
+    if column.endswith("(ann.)") or column.endswith("%B"):
+        return f"{value * 100:.1f}%"
+    return f"{value:.2f}"
+
+
+def _technical_indicators_core(tickers: str, indicators: str = DEFAULT_INDICATORS) -> str:
+    ticker_list = list(dict.fromkeys(t.strip().upper() for t in tickers.split(',') if t.strip()))
+    if not ticker_list:
+        return "ERROR: Please provide at least 1 ticker separated by commas."
+    if len(ticker_list) > MAX_INDICATOR_TICKERS:
+        return f"ERROR: Maximum {MAX_INDICATOR_TICKERS} tickers allowed per request."
+    try:
+        requests = parse_indicators(indicators)
+    except ValueError as e:
+        return f"ERROR: {e}"
+
+    start = history_start(requests)
+
+    def load(ticker):
+        try:
+            bars = get_price_history(ticker, start)
+            if not len(bars):
+                raise ValueError("no price history")
+            return ticker, bars, None
+        except Exception as e:
+            return ticker, None, e
+
+    with ContextThreadPoolExecutor(max_workers=min(INDICATOR_WORKERS, len(ticker_list))) as pool:
+        loaded = list(pool.map(load, ticker_list))
+
+    columns = [column for request in requests for column in request.columns]
+    lines = [
+        "| Ticker | As Of | Close | " + " | ".join(columns) + " |",
+        "| :--- | :--- | ---: | " + " | ".join("---:" for _ in columns) + " |",
+    ]
+    errors = []
+    for ticker, bars, error in loaded:
+        if error is not None:
+            errors.append(f"{ticker} ({error})")
+            continue
+        values = compute_indicators(bars, requests)
+        lines.append(
+            f"| {ticker} | {bars['date'][-1]} | {bars['close'][-1]:.2f} | "
+            + " | ".join(_format_value(column, values[column]) for column in columns) + " |"
+        )
+
+    if len(errors) == len(ticker_list):
+        return f"ERROR: Could not retrieve price history for any of the tickers: {', '.join(errors)}"
+    result = f"Technical Indicators (daily bars) for {len(ticker_list) - len(errors)} tickers:\n\n" + "\n".join(lines)
+    if errors:
+        result += f"\n\nERROR: Could not retrieve data for: {', '.join(errors)}"
+    return result
+
+
+@function_tool
+def get_technical_indicators(tickers: str, indicators: str = DEFAULT_INDICATORS) -> str:
+    """
+    Computes technical indicators for several stocks in ONE call from locally stored daily prices
+    (no per-indicator API calls).
+
+    Args:
+        tickers: Comma-separated ticker symbols (e.g., 'AAPL,MSFT,KO').
+        indicators: Comma-separated indicators with optional windows, e.g. 'sma50, sma200, ema20, rsi14,
+                    macd (or macd(12,26,9)), atr14, bbands20 (or bbands(20,2)), vol21' (annualized realized volatility).
+
+    Returns:
+        A Markdown table with the latest value of each indicator per ticker.
+    """
+    try:
+        return _technical_indicators_core(tickers, indicators)
+    except Exception as e:
+        return f"ERROR: Failed to compute technical indicators. Reason: {e}"